@@ -11,12 +11,14 @@ async function loadAdminDashboard() {
             usersResponse,
             restaurantsResponse, 
             ordersResponse,
+            orderStatsResponse,
             deliveriesResponse,
             healthResponse
         ] = await Promise.all([
             apiCall('api/user-service/api/users'),
             apiCall('api/restaurant-service/api/restaurants'),
             apiCall('api/order-service/api/orders'),
+            apiCall('api/order-service/api/orders/stats'),
             apiCall('api/delivery-service/api/deliveries'),
             apiCall('health')
         ]);
@@ -28,7 +30,8 @@ async function loadAdminDashboard() {
             usersResponse,
             restaurantsResponse,
             ordersResponse,
-            deliveriesResponse
+            deliveriesResponse,
+            orderStatsResponse
         );
 
         // Update services health
@@ -43,7 +46,7 @@ async function loadAdminDashboard() {
     }
 }
 
-function updateStatistics(users, restaurants, orders, deliveries) {
+function updateStatistics(users, restaurants, orders, deliveries, orderStats) {
     // Users count
     if (users.success) {
         document.getElementById('users-count').textContent = users.count || users.data?.length || 0;
@@ -54,8 +57,10 @@ function updateStatistics(users, restaurants, orders, deliveries) {
         document.getElementById('restaurants-count').textContent = restaurants.count || restaurants.data?.length || 0;
     }
 
-    // Orders count
-    if (orders.success) {
+    // Orders count (served from order-service aggregates when available)
+    if (orderStats && orderStats.success) {
+        document.getElementById('orders-count').textContent = orderStats.data.total_orders;
+    } else if (orders.success) {
         document.getElementById('orders-count').textContent = orders.count || orders.data?.length || 0;
     }
 
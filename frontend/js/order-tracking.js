@@ -21,7 +21,9 @@ async function loadSingleOrder(orderId) {
         const orderResponse = await apiCall(`api/order-service/api/orders/${orderId}`);
         
         if (orderResponse.success) {
-            displaySingleOrder(orderResponse.data);
+            const order = orderResponse.data.order || orderResponse.data;
+            displaySingleOrder(order);
+            watchOrderEvents(order);
         } else {
             // Demo mode - create mock order data
             displaySingleOrder({
@@ -48,6 +50,24 @@ async function loadSingleOrder(orderId) {
     }
 }
 
+// Long-poll order-service for status changes instead of re-fetching everything
+async function watchOrderEvents(order, since = 0) {
+    const response = await apiCall(`api/order-service/api/orders/${order.id}/events?since=${since}`);
+
+    if (!response.success) {
+        return; // Stop watching, e.g. order deleted or service down
+    }
+
+    if (response.count > 0) {
+        order.status = response.data[response.data.length - 1].new_status;
+        displaySingleOrder(order);
+    }
+
+    if (order.status !== 'delivered' && order.status !== 'cancelled') {
+        watchOrderEvents(order, response.cursor);
+    }
+}
+
 async function loadOrderTrackingData() {
     try {
         showMessage('Memuat data pesanan...', 'info');
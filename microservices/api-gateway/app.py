@@ -1,6 +1,6 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from flask import send_from_directory, send_file
+from flask import send_from_directory, send_file, Response, stream_with_context
 from flask_restx import Api, Resource, fields, Namespace
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 import requests
@@ -33,6 +33,12 @@ SERVICES = {
     'payment-service': 'http://localhost:5005'
 }
 
+# Upstream response headers passed back to the client (conditional GET, idempotency replays)
+PASSTHROUGH_HEADERS = ('etag', 'last-modified', 'cache-control', 'idempotent-replayed')
+
+# Accept types of streamed responses (SSE order events, NDJSON exports)
+STREAM_MIMETYPES = ('text/event-stream', 'application/x-ndjson')
+
 # Demo user database (in production, use real database)
 USERS = [
     {
@@ -212,6 +218,9 @@ def forward_request(service_name, path):
     service_url = SERVICES[service_name]
     full_url = f"{service_url}/{path}"
 
+    if wants_stream():
+        return forward_stream(service_name, full_url)
+
     try:
         response = requests.request(
             method=request.method,
@@ -223,14 +232,24 @@ def forward_request(service_name, path):
             timeout=30
         )
 
+        headers = {key: value for key, value in response.headers.items() if key.lower() in PASSTHROUGH_HEADERS}
+        if response.status_code == 304:
+            return '', 304, headers
+
         # Return response as text/json string to avoid bytes serialization issue
         # This prevents Flask-RESTX from trying to serialize bytes to JSON
         if response.headers.get('content-type', '').startswith('application/json'):
             # Return as JSON response object
-            return response.json(), response.status_code
+            return response.json(), response.status_code, headers
         else:
-            # Return as text for non-JSON content
-            return response.text, response.status_code, {'Content-Type': response.headers.get('content-type', 'text/plain')}
+            # Relay other content (images, CSV, plain text) byte for byte as a ready Response,
+            # so neither text decoding nor Flask-RESTX's JSON output touches it
+            return Response(
+                response.content,
+                status=response.status_code,
+                headers=headers,
+                content_type=response.headers.get('content-type', 'application/octet-stream')
+            )
     except requests.exceptions.ConnectionError:
         logger.error(f"Service {service_name} unavailable")
         return jsonify({
@@ -253,6 +272,47 @@ def forward_request(service_name, path):
             "message": "An unexpected error occurred"
         }), 500
 
+def wants_stream():
+    """True for GET requests asking for a streamed response (same rules as the services)"""
+    if request.method != 'GET':
+        return False
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    accept = request.headers.get('Accept', '')
+    return any(mimetype in accept for mimetype in STREAM_MIMETYPES)
+
+def forward_stream(service_name, full_url):
+    """Proxy a streamed response (SSE or NDJSON export) chunk by chunk without buffering"""
+    try:
+        upstream = requests.get(
+            full_url,
+            headers={key: value for key, value in request.headers if key.lower() != 'host'},
+            params=request.args,
+            stream=True,
+            timeout=(5, None)  # connect timeout only, the stream stays open
+        )
+    except requests.exceptions.ConnectionError:
+        logger.error(f"Service {service_name} unavailable")
+        return jsonify({
+            "success": False,
+            "error": f"Service '{service_name}' is currently unavailable",
+            "message": "Please try again later"
+        }), 503
+
+    def generate():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+        finally:
+            upstream.close()
+
+    return Response(
+        stream_with_context(generate()),
+        status=upstream.status_code,
+        content_type=upstream.headers.get('content-type', 'text/event-stream'),
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # ========== AUTHENTICATED PROXY ROUTES ==========
 
 @api.route('/api/user-service/<path:path>')
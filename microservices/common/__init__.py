@@ -0,0 +1,5 @@
+"""Shared helpers for the Food Delivery System microservices.
+
+Services import this package by adding the `microservices/` directory to
+sys.path (see the top of each service's app.py).
+"""
@@ -0,0 +1,83 @@
+"""Cold storage for archived records.
+
+Each partition (e.g. a month, '2025-01') is its own small SQLite file holding
+zlib-compressed JSON documents keyed by record id. Dropping a partition is
+deleting its file, so purging old data never touches the hot database.
+"""
+import json
+import os
+import re
+import sqlite3
+import zlib
+from datetime import datetime
+
+PARTITION_PATTERN = re.compile(r'^[0-9]{4}-[0-9]{2}$')
+
+
+class ArchiveStore:
+    def __init__(self, directory, prefix):
+        self.directory = directory
+        self.prefix = prefix
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, partition):
+        if not PARTITION_PATTERN.match(partition):
+            raise ValueError(f"Invalid partition '{partition}', expected YYYY-MM")
+        return os.path.join(self.directory, f'{self.prefix}_{partition}.db')
+
+    def _connect(self, partition):
+        conn = sqlite3.connect(self._path(partition), timeout=10)
+        conn.execute('''CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY,
+            archived_at TEXT NOT NULL,
+            document BLOB NOT NULL
+        )''')
+        return conn
+
+    def put_many(self, partition, records):
+        """Store (record_id, document_dict) pairs; re-archiving a record overwrites it"""
+        now = datetime.utcnow().isoformat()
+        rows = [(record_id, now, zlib.compress(json.dumps(document).encode()))
+                for record_id, document in records]
+        with self._connect(partition) as conn:
+            conn.executemany('INSERT OR REPLACE INTO records (id, archived_at, document) VALUES (?, ?, ?)', rows)
+        return len(rows)
+
+    def get(self, partition, record_id):
+        if not os.path.exists(self._path(partition)):
+            return None
+        with self._connect(partition) as conn:
+            row = conn.execute('SELECT document FROM records WHERE id = ?', (record_id,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def iter_documents(self, partition):
+        """(record_id, document_dict) for every record of a partition"""
+        if not os.path.exists(self._path(partition)):
+            return
+        with self._connect(partition) as conn:
+            rows = conn.execute('SELECT id, document FROM records ORDER BY id').fetchall()
+        for record_id, document in rows:
+            yield record_id, json.loads(zlib.decompress(document))
+
+    def delete(self, partition, record_id):
+        if not os.path.exists(self._path(partition)):
+            return False
+        with self._connect(partition) as conn:
+            return conn.execute('DELETE FROM records WHERE id = ?', (record_id,)).rowcount > 0
+
+    def partitions(self):
+        names = []
+        for filename in os.listdir(self.directory):
+            if filename.startswith(self.prefix + '_') and filename.endswith('.db'):
+                partition = filename[len(self.prefix) + 1:-3]
+                if PARTITION_PATTERN.match(partition):
+                    names.append(partition)
+        return sorted(names)
+
+    def drop_partition(self, partition):
+        """Delete a whole partition file. Returns False when it did not exist."""
+        path = self._path(partition)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        return True
@@ -0,0 +1,185 @@
+"""In-memory availability bitmaps with write-behind persistence.
+
+One bitmap (a Python int) per group - e.g. a restaurant's menu - with one
+bit per member (set = available):
+
+    availability = AvailabilityMap(write=persist)   # persist({member: available}) in one transaction
+    availability.load(restaurant_id, {item_id: is_available, ...})
+    availability.set(item_id, False)                # True if it changed
+    availability.get(item_id)                       # None while the member's group is not loaded
+    availability.version(restaurant_id)             # bumped by every change (ETags, cached documents)
+    availability.latest_version()                   # newest version of any group
+
+A toggle flips a bit and queues the change. Queued changes are written in
+one batch AVAILABILITY_FLUSH_INTERVAL seconds (default 1) after the first
+one, or on flush(), so a burst of toggles costs one write instead of a
+row load and commit each. While loaded, the bitmap is what readers should
+trust; the database catches up at the next flush.
+
+Bitmaps are per process. With several workers, each one sees the others'
+toggles only through the database: a group counts as loaded for
+AVAILABILITY_TTL seconds (default 5), then loaded() is False and the
+caller reloads it, this process's queued toggles still winning. A toggle
+in another worker thus shows up within flush interval + TTL, and versions
+are only comparable within one process.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_TTL = 5.0
+
+
+def _now_us():
+    return time.time_ns() // 1000
+
+
+class AvailabilityMap:
+    def __init__(self, write, flush_interval=None, ttl=None):
+        self._write = write
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            float(os.environ.get('AVAILABILITY_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+        self.ttl = ttl if ttl is not None else float(os.environ.get('AVAILABILITY_TTL', DEFAULT_TTL))
+        self._lock = threading.RLock()
+        self._bits = {}  # group -> bitmap
+        self._slots = {}  # group -> {member: bit}
+        self._members = {}  # member -> (group, bit)
+        self._versions = {}  # group -> microsecond timestamp of the last change
+        self._loaded_at = {}  # group -> time.monotonic() of the last load
+        self._pending = {}  # member -> available, not yet written
+        self._flushing = {}  # member -> available, being written
+        self._timer = None
+
+    def loaded(self, group):
+        """True while the group's bitmap is loaded and younger than the TTL"""
+        loaded_at = self._loaded_at.get(group)
+        return loaded_at is not None and time.monotonic() - loaded_at < self.ttl
+
+    def _queued(self, member, default):
+        return self._pending.get(member, self._flushing.get(member, default))
+
+    def load(self, group, states):
+        """(Re)build a group's bitmap from {member: available}; queued toggles win over states"""
+        with self._lock:
+            slots, bits = {}, 0
+            for bit, (member, available) in enumerate(states.items()):
+                slots[member] = bit
+                if self._queued(member, available):
+                    bits |= 1 << bit
+            self._loaded_at[group] = time.monotonic()
+            if self._slots.get(group) == slots and self._bits.get(group) == bits:
+                return  # Unchanged: keep the version (ETags, cached documents)
+            for member in self._slots.get(group, ()):
+                self._members.pop(member, None)
+            for member, bit in slots.items():
+                self._members[member] = (group, bit)
+            self._slots[group], self._bits[group] = slots, bits
+            self._bump(group)
+
+    def forget(self, members=(), groups=()):
+        """Drop queued toggles of members and unload groups (after a direct database write)"""
+        with self._lock:
+            for member in members:
+                self._pending.pop(member, None)
+                self._flushing.pop(member, None)
+                entry = self._members.get(member)
+                if entry is not None:
+                    groups = (*groups, entry[0])
+            for group in groups:
+                for member in self._slots.pop(group, ()):
+                    self._members.pop(member, None)
+                self._loaded_at.pop(group, None)
+                if self._bits.pop(group, None) is not None:
+                    self._bump(group)
+
+    def _bump(self, group):
+        self._versions[group] = max(_now_us(), self._versions.get(group, 0) + 1)
+
+    def version(self, group):
+        return self._versions.get(group)
+
+    def latest_version(self):
+        """Newest version of any group - changes whenever any bitmap does"""
+        with self._lock:
+            return max(self._versions.values(), default=None)
+
+    def group_of(self, member):
+        entry = self._members.get(member)
+        return entry[0] if entry else None
+
+    def get(self, member):
+        """Availability from the bitmap; None unless queued or its group is loaded (and fresh)"""
+        with self._lock:
+            queued = self._queued(member, None)
+            if queued is not None:
+                return queued
+            entry = self._members.get(member)
+            if entry is None or not self.loaded(entry[0]):
+                return None
+            group, bit = entry
+            return bool(self._bits[group] >> bit & 1)
+
+    def states(self, group):
+        """{member: available} of a loaded group"""
+        with self._lock:
+            bits = self._bits[group]
+            return {member: bool(bits >> bit & 1) for member, bit in self._slots[group].items()}
+
+    def set(self, member, available):
+        """Toggle a loaded member; returns whether it changed. KeyError if its group is not loaded"""
+        with self._lock:
+            group, bit = self._members[member]
+            bits = self._bits[group]
+            new_bits = bits | 1 << bit if available else bits & ~(1 << bit)
+            if new_bits == bits:
+                return False
+            self._bits[group] = new_bits
+            self._bump(group)
+            self._pending[member] = bool(available)
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+            return True
+
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Write the queued toggles now; returns how many were written"""
+        with self._lock:
+            changes, self._pending = self._pending, {}
+            self._flushing = {**self._flushing, **changes}  # Reloads keep them until committed
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not changes:
+            return 0
+        try:
+            self._write(changes)
+        except Exception:
+            with self._lock:
+                for member, available in changes.items():
+                    self._pending.setdefault(member, available)  # Newer toggles win
+            raise
+        finally:
+            with self._lock:
+                for member, available in changes.items():
+                    if self._flushing.get(member) is available:
+                        del self._flushing[member]
+        return len(changes)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Availability flush failed, retrying: {e}")
+            with self._lock:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                    self._timer.daemon = True
+                    self._timer.start()
@@ -0,0 +1,79 @@
+"""Streaming record readers for bulk import endpoints.
+
+    for row_number, record, error in iter_records(request):   # record is a dict, or None with an error
+        ...
+
+The body format follows the Content-Type:
+- application/x-ndjson (or application/jsonl): one JSON object per line
+- text/csv: a header row, then one record per row (empty cells are left out)
+- application/json: {"items": [...]} or a bare list (parsed whole)
+
+NDJSON and CSV bodies are read line by line from request.stream, so a
+large catalogue is never held in memory as a whole; a malformed line is
+reported for its row and the import carries on.
+"""
+import csv
+import io
+import json
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+CSV_TYPES = ('text/csv', 'application/csv')
+JSON_TYPES = ('application/json',)
+SUPPORTED_TYPES = NDJSON_TYPES + CSV_TYPES + JSON_TYPES
+
+
+def _text_stream(request):
+    return io.TextIOWrapper(request.stream, encoding=request.mimetype_params.get('charset', 'utf-8-sig'), newline='')
+
+
+def _ndjson_records(request):
+    for number, line in enumerate(_text_stream(request), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(record, dict):
+            yield number, record, None
+        else:
+            yield number, None, "Each line must be a JSON object"
+
+
+def _csv_records(request):
+    reader = csv.DictReader(_text_stream(request))
+    for number, row in enumerate(reader, 1):
+        if None in row:
+            yield number, None, "Row has more cells than the header"
+            continue
+        yield number, {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip()}, None
+
+
+def _json_records(data):
+    for number, record in enumerate(data, 1):
+        if isinstance(record, dict):
+            yield number, record, None
+        else:
+            yield number, None, "Each item must be a JSON object"
+
+
+def iter_records(request):
+    """(row number, record dict or None, error message or None) for each row of the body.
+
+    Raises ValueError for an unsupported Content-Type or a malformed JSON body.
+    """
+    mimetype = request.mimetype
+    if mimetype in NDJSON_TYPES:
+        return _ndjson_records(request)
+    if mimetype in CSV_TYPES:
+        return _csv_records(request)
+    if mimetype in JSON_TYPES:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('items')
+        if not isinstance(data, list):
+            raise ValueError('JSON body must be a list of items or {"items": [...]}')
+        return _json_records(data)
+    raise ValueError(f"Unsupported Content-Type {mimetype or '(none)'}; use one of {', '.join(SUPPORTED_TYPES)}")
+
@@ -0,0 +1,97 @@
+"""Conditional GET (ETag / Last-Modified) from updated_at.
+
+Validators are computed with a one-column query before the full rows are
+loaded, so a matching If-None-Match / If-Modified-Since returns 304
+without fetching or serializing anything:
+
+    cached = not_modified(entity_validators(Order, id))
+    if cached is not None:
+        return cached
+
+For lists the version is (row count, max(updated_at)) of the filtered
+query - inserts, updates, soft deletes and hard deletes all change it.
+When the request is not answered with 304 the validators are attached to
+the eventual 200 response, together with Cache-Control: no-cache so
+browsers always revalidate instead of guessing freshness.
+
+ETags are weak (the body varies with ?fields= and JSON formatting) and
+include the request path and query string, so each URL variant has
+its own tag.
+"""
+import hashlib
+from datetime import datetime
+
+from flask import Response, after_this_request, request
+from sqlalchemy import func
+
+
+def _etag(*parts):
+    raw = ':'.join(str(p) for p in parts) + '@' + request.full_path
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+
+def entity_validators(model, id):
+    """(etag, last_modified) for one row, or None when it does not exist"""
+    updated_at = model.query.with_entities(model.updated_at).filter(model.id == id).scalar()
+    if updated_at is None:
+        return None
+    return _etag('row', model.__tablename__, id, updated_at.isoformat()), updated_at
+
+
+def list_validators(query, model):
+    """(etag, last_modified) for the rows matched by a filtered list query"""
+    count, updated_at = query.with_entities(func.count(model.id), func.max(model.updated_at)) \
+        .order_by(None).first()
+    return _etag('list', model.__tablename__, count, updated_at.isoformat() if updated_at else ''), updated_at
+
+
+def version_validators(kind, key, version):
+    """(etag, last_modified) for a cached document with a microsecond-timestamp version"""
+    return _etag('version', kind, key, version), datetime.utcfromtimestamp(version / 1_000_000)
+
+
+def merge_validators(*validators):
+    """Combine validators of documents built from several sources"""
+    validators = [v for v in validators if v is not None]
+    if not validators:
+        return None
+    etag = hashlib.sha1(':'.join(v[0] for v in validators).encode()).hexdigest()[:24]
+    dates = [v[1] for v in validators if v[1] is not None]
+    return etag, max(dates) if dates else None
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(microsecond=0)
+    response.headers.setdefault('Cache-Control', 'no-cache')
+    return response
+
+
+def _matches(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def not_modified(validators):
+    """Return a 304 response when the request's validators still match.
+
+    Otherwise return None and arrange for ETag / Last-Modified to be added
+    to the 200 response the view goes on to build.
+    """
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    if _matches(etag, last_modified):
+        return _set_validators(Response(status=304), etag, last_modified)
+
+    @after_this_request
+    def add_validators(response):
+        if response.status_code == 200 and 'ETag' not in response.headers:
+            _set_validators(response, etag, last_modified)
+        return response
+
+    return None
@@ -0,0 +1,315 @@
+"""Reusable CRUD engine for soft-deletable models.
+
+Registers the standard read / create / update / soft delete / hard delete
+/ restore / bulk routes of the service template for any model that has
+id, is_active, updated_at and deleted_at columns and a ModelSerializer:
+
+    menu_items = CrudEngine(db, MenuItem, label='Menu item')
+    app.register_blueprint(menu_items.blueprint('/api/menu-items',
+                                                routes=('soft_delete', 'restore', 'bulk_delete')))
+
+Differences from the hand-written handlers:
+- bulk delete / restore are one UPDATE ... WHERE id IN (...) statement
+  instead of loading and modifying every row
+- GET list is paginated (?page=, ?per_page=, default 50, max 500)
+- GET list / one support ?fields= projection and conditional GET (304)
+- PUT / PATCH only write the declared writable_fields
+
+Services whose deletes have side effects (courier release, payment
+history, order stats) keep their own handlers for those routes and can
+still use bulk_soft_delete() / bulk_restore() directly.
+
+on_change(ids) is called before every write, while the rows still exist,
+and may return a callable that is run after the commit - e.g. look up the
+cached documents the rows belong to, then invalidate them once the change
+is visible to readers.
+"""
+from datetime import datetime
+
+from flask import Blueprint, jsonify, request
+
+from .conditional import entity_validators, list_validators, not_modified
+
+ALL_ROUTES = ('list', 'get', 'create', 'update', 'patch', 'soft_delete',
+              'hard_delete', 'restore', 'bulk_delete', 'bulk_restore')
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+
+class CrudEngine:
+    """CRUD operations and routes for one model"""
+
+    def __init__(self, db, model, label='Resource', plural=None, required_fields=(), writable_fields=None,
+                 on_change=None):
+        self.db = db
+        self.on_change = on_change
+        self.model = model
+        self.label = label
+        self.plural = plural or f"{label.lower()}s"
+        self.required_fields = tuple(required_fields)
+        if writable_fields is None:
+            writable_fields = [c for c in model.__table__.columns.keys()
+                               if c not in ('id', 'created_at', 'updated_at', 'deleted_at')]
+        self.writable_fields = tuple(writable_fields)
+
+    # ----- set-based operations -----
+
+    def _state_values(self, deleted_at, is_active):
+        values = {self.model.deleted_at: deleted_at, self.model.updated_at: datetime.utcnow()}
+        if hasattr(self.model, 'is_active'):
+            values[self.model.is_active] = is_active
+        return values
+
+    def bulk_soft_delete(self, ids):
+        """Soft delete every non-deleted row in ids with one UPDATE; returns the count"""
+        now = datetime.utcnow()
+        return self.model.query.filter(self.model.id.in_(ids), self.model.deleted_at.is_(None)) \
+            .update(self._state_values(now, False), synchronize_session=False)
+
+    def bulk_restore(self, ids):
+        """Restore every soft deleted row in ids with one UPDATE; returns the count"""
+        return self.model.query.filter(self.model.id.in_(ids), self.model.deleted_at.isnot(None)) \
+            .update(self._state_values(None, True), synchronize_session=False)
+
+    def _commit(self, after_commit):
+        self.db.session.commit()
+        if after_commit is not None:
+            after_commit()
+
+    def _before_change(self, ids):
+        return self.on_change(ids) if self.on_change is not None else None
+
+    # ----- handlers -----
+
+    def _not_found(self):
+        return jsonify({"success": False, "error": f"{self.label} not found"}), 404
+
+    def _parse_fields(self):
+        return self.model.serializer.parse_fields(request.args.get('fields'))
+
+    def list(self):
+        """READ ALL - Paginated list (?page=, ?per_page=, ?fields=, ?include_deleted=)"""
+        try:
+            try:
+                fields = self._parse_fields()
+                page = max(int(request.args.get('page', 1)), 1)
+                per_page = min(max(int(request.args.get('per_page', DEFAULT_PER_PAGE)), 1), MAX_PER_PAGE)
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+            include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
+
+            query = self.model.serializer.project(self.model.query, fields)
+            if not include_deleted:
+                query = query.filter_by(deleted_at=None)
+
+            cached = not_modified(list_validators(query, self.model))
+            if cached is not None:
+                return cached
+            result = query.order_by(self.model.id).paginate(page=page, per_page=per_page, error_out=False)
+
+            return jsonify({
+                "success": True,
+                "data": self.model.serializer.many(result.items, fields),
+                "count": len(result.items),
+                "include_deleted": include_deleted,
+                "pagination": {
+                    "page": page,
+                    "per_page": per_page,
+                    "total": result.total,
+                    "pages": result.pages,
+                    "has_next": result.has_next,
+                    "has_prev": result.has_prev
+                }
+            })
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+
+    def get(self, id):
+        """READ BY ID - Single row (?fields=, ?include_deleted=)"""
+        try:
+            try:
+                fields = self._parse_fields()
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+            cached = not_modified(entity_validators(self.model, id))
+            if cached is not None:
+                return cached
+            resource = self.model.serializer.project(self.model.query, fields).get(id)
+            if not resource:
+                return self._not_found()
+            if resource.deleted_at and not request.args.get('include_deleted', 'false').lower() == 'true':
+                return self._not_found()
+
+            return jsonify({
+                "success": True,
+                "data": self.model.serializer(resource, fields)
+            })
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+
+    def create(self):
+        """CREATE - New row from the writable fields in the JSON body"""
+        try:
+            data = request.get_json()
+            for field in self.required_fields:
+                if not data or not data.get(field):
+                    return jsonify({"success": False, "error": f"{field.replace('_', ' ').capitalize()} is required"}), 400
+
+            resource = self.model(**{f: data[f] for f in self.writable_fields if data and f in data})
+            self.db.session.add(resource)
+            self.db.session.flush()
+            self._commit(self._before_change([resource.id]))
+
+            return jsonify({
+                "success": True,
+                "data": resource.to_dict(),
+                "message": f"{self.label} created successfully"
+            }), 201
+        except Exception as e:
+            self.db.session.rollback()
+            return jsonify({"success": False, "error": str(e)}), 500
+
+    def update(self, id):
+        """UPDATE / PARTIAL UPDATE - Write the writable fields present in the body"""
+        try:
+            resource = self.model.query.get(id)
+            if not resource:
+                return self._not_found()
+            if resource.deleted_at:
+                return jsonify({"success": False, "error": f"Cannot update deleted {self.label.lower()}"}), 400
+
+            data = request.get_json()
+            if not data:
+                return jsonify({"success": False, "error": "No data provided"}), 400
+
+            after_commit = self._before_change([id])
+            for field in self.writable_fields:
+                if field in data:
+                    setattr(resource, field, data[field])
+            resource.updated_at = datetime.utcnow()
+            self._commit(after_commit)
+
+            return jsonify({
+                "success": True,
+                "data": resource.to_dict(),
+                "message": f"{self.label} updated successfully"
+            })
+        except Exception as e:
+            self.db.session.rollback()
+            return jsonify({"success": False, "error": str(e)}), 500
+
+    def soft_delete(self, id):
+        """SOFT DELETE - Mark as deleted without removing from database"""
+        try:
+            resource = self.model.query.get(id)
+            if not resource:
+                return self._not_found()
+            if resource.deleted_at:
+                return jsonify({"success": False, "error": f"{self.label} already deleted"}), 400
+
+            after_commit = self._before_change([id])
+            self.bulk_soft_delete([id])
+            self._commit(after_commit)
+            self.db.session.refresh(resource)
+
+            return jsonify({
+                "success": True,
+                "data": resource.to_dict(),
+                "message": f"{self.label} soft deleted successfully"
+            })
+        except Exception as e:
+            self.db.session.rollback()
+            return jsonify({"success": False, "error": str(e)}), 500
+
+    def hard_delete(self, id):
+        """HARD DELETE - Permanently remove from database"""
+        try:
+            after_commit = self._before_change([id])
+            deleted = self.model.query.filter(self.model.id == id).delete(synchronize_session=False)
+            if not deleted:
+                return self._not_found()
+            self._commit(after_commit)
+
+            return jsonify({
+                "success": True,
+                "message": f"{self.label} permanently deleted"
+            })
+        except Exception as e:
+            self.db.session.rollback()
+            return jsonify({"success": False, "error": str(e)}), 500
+
+    def restore(self, id):
+        """RESTORE - Restore soft deleted row"""
+        try:
+            resource = self.model.query.get(id)
+            if not resource:
+                return self._not_found()
+            if not resource.deleted_at:
+                return jsonify({"success": False, "error": f"{self.label} is not deleted"}), 400
+
+            after_commit = self._before_change([id])
+            self.bulk_restore([id])
+            self._commit(after_commit)
+            self.db.session.refresh(resource)
+
+            return jsonify({
+                "success": True,
+                "data": resource.to_dict(),
+                "message": f"{self.label} restored successfully"
+            })
+        except Exception as e:
+            self.db.session.rollback()
+            return jsonify({"success": False, "error": str(e)}), 500
+
+    def _bulk(self, operation, verb, count_key):
+        try:
+            data = request.get_json()
+            if not data or not data.get('ids'):
+                return jsonify({"success": False, "error": "IDs array is required"}), 400
+
+            after_commit = self._before_change(data['ids'])
+            count = operation(data['ids'])
+            self._commit(after_commit)
+
+            return jsonify({
+                "success": True,
+                "message": f"{count} {self.plural} {verb} successfully",
+                count_key: count
+            })
+        except Exception as e:
+            self.db.session.rollback()
+            return jsonify({"success": False, "error": str(e)}), 500
+
+    def bulk_delete(self):
+        """BULK SOFT DELETE - One UPDATE for all ids"""
+        return self._bulk(self.bulk_soft_delete, 'soft deleted', 'deleted_count')
+
+    def bulk_restore_route(self):
+        """BULK RESTORE - One UPDATE for all ids"""
+        return self._bulk(self.bulk_restore, 'restored', 'restored_count')
+
+    # ----- registration -----
+
+    def blueprint(self, url_prefix, routes=ALL_ROUTES):
+        """Blueprint with the selected routes mounted under url_prefix"""
+        unknown = set(routes) - set(ALL_ROUTES)
+        if unknown:
+            raise ValueError(f"Unknown CRUD routes: {', '.join(sorted(unknown))}")
+
+        bp = Blueprint(f"{self.model.__tablename__}_crud", __name__, url_prefix=url_prefix)
+        rules = {
+            'list': ('', 'list', self.list, ['GET']),
+            'get': ('/<int:id>', 'get', self.get, ['GET']),
+            'create': ('', 'create', self.create, ['POST']),
+            'update': ('/<int:id>', 'update', self.update, ['PUT']),
+            'patch': ('/<int:id>', 'patch', self.update, ['PATCH']),
+            'soft_delete': ('/<int:id>/soft-delete', 'soft_delete', self.soft_delete, ['DELETE']),
+            'hard_delete': ('/<int:id>', 'hard_delete', self.hard_delete, ['DELETE']),
+            'restore': ('/<int:id>/restore', 'restore', self.restore, ['POST']),
+            'bulk_delete': ('/bulk-delete', 'bulk_delete', self.bulk_delete, ['DELETE']),
+            'bulk_restore': ('/bulk-restore', 'bulk_restore', self.bulk_restore_route, ['POST']),
+        }
+        for route in routes:
+            rule, endpoint, view, methods = rules[route]
+            bp.add_url_rule(rule, endpoint, view, methods=methods, strict_slashes=False)
+        return bp
@@ -0,0 +1,104 @@
+"""Database configuration shared by all services.
+
+Every service calls configure_database(app, '<name>') before creating its
+SQLAlchemy object. Settings come from the environment:
+
+    <NAME>_DATABASE_URL   full SQLAlchemy URI (default: sqlite:///<name>.db)
+    DB_POOL_SIZE          server DBs: pooled connections (default 10)
+    DB_MAX_OVERFLOW       server DBs: extra connections under burst (default 20)
+    DB_POOL_TIMEOUT       server DBs: seconds to wait for a connection (default 30)
+    DB_POOL_RECYCLE       server DBs: recycle connections after N seconds (default 1800)
+    DB_POOL_PRE_PING      ping connections before use (default true)
+    DB_ECHO               log SQL statements (default false)
+    SQLITE_WAL            SQLite: use WAL journal mode (default true)
+    SQLITE_BUSY_TIMEOUT   SQLite: ms to wait on a locked database (default 5000)
+    SQLITE_SYNCHRONOUS    SQLite: synchronous pragma (default NORMAL)
+
+WAL lets readers run alongside the single writer and, with busy_timeout,
+turns "database is locked" errors into short waits.
+"""
+import os
+import sqlite3
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+
+SQLITE_SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def database_uri(name):
+    return os.environ.get(f'{name.upper()}_DATABASE_URL', f'sqlite:///{name}.db')
+
+
+def engine_options(uri):
+    """SQLAlchemy create_engine options for the given URI"""
+    options = {
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+        'echo': _env_bool('DB_ECHO', False),
+    }
+    if uri.startswith('sqlite'):
+        return options
+    options.update({
+        'pool_size': _env_int('DB_POOL_SIZE', 10),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+    })
+    return options
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply WAL / busy_timeout / synchronous to every new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    synchronous = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        synchronous = 'NORMAL'
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={_env_int('SQLITE_BUSY_TIMEOUT', 5000)}")
+    if _env_bool('SQLITE_WAL', True):
+        cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA synchronous={synchronous}')
+    cursor.close()
+
+
+def configure_database(app, name):
+    """Fill the Flask-SQLAlchemy settings of app for the service database `name`"""
+    uri = database_uri(name)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+    return uri
+
+
+def add_missing_columns(db, model):
+    """Add the model's columns (and indexes) that an existing table lacks.
+
+    create_all() only creates missing tables; this covers columns added to
+    a model later. New columns must be nullable or have a server_default.
+    Returns the names of the added columns.
+    """
+    table = model.__table__
+    dialect = db.engine.dialect
+    existing = {c['name'] for c in inspect(db.engine).get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name not in existing:
+            ddl = CreateColumn(column).compile(dialect=dialect)
+            db.session.execute(text(f'ALTER TABLE {dialect.identifier_preparer.format_table(table)} ADD COLUMN {ddl}'))
+            added.append(column.name)
+    db.session.commit()
+    if added:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    return added
@@ -0,0 +1,180 @@
+"""Versioned document cache for precomputed read models.
+
+Each key (e.g. a restaurant id) has a version number. Writers bump it with
+invalidate(key) after committing; readers take the version *before*
+building a document and store the result under it, so a document built
+from data that changed mid-build is never served:
+
+    version = menu_cache.version(restaurant_id)
+    entry = menu_cache.get(restaurant_id, version)
+    if entry is None:
+        entry = menu_cache.put(restaurant_id, version, build_menu(restaurant_id))
+
+Documents live in a bounded in-process LRU (<NAME>_CACHE_MAX_ENTRIES,
+default 1024) with a TTL (<NAME>_CACHE_TTL seconds, default 300) that
+bounds staleness when several processes run without a shared store.
+
+Setting <NAME>_CACHE_PATH enables the shared stand-in: versions and
+encoded documents are kept in a SQLite file that every process opens, so
+an invalidation in one worker is seen by all of them.
+
+Versions are microsecond timestamps (always increasing, also across
+restarts), which makes them usable as ETag and Last-Modified values.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .serialization import dumps
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 300
+
+
+def _now_us():
+    return time.time_ns() // 1000
+
+
+class CacheEntry:
+    __slots__ = ('version', 'document', 'body', 'expires_at')
+
+    def __init__(self, version, document, body, expires_at):
+        self.version = version
+        self.document = document
+        self.body = body  # Pre-encoded JSON of document
+        self.expires_at = expires_at
+
+
+class SharedCacheStore:
+    """SQLite-file stand-in for a shared cache server (Redis, memcached)"""
+
+    def __init__(self, path, namespace):
+        self.path = path
+        self.namespace = namespace
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS cache_documents (
+                namespace TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                body TEXT,
+                PRIMARY KEY (namespace, cache_key)
+            )''')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA busy_timeout=10000')
+        return conn
+
+    def version(self, key):
+        with self._connect() as conn:
+            conn.execute('INSERT OR IGNORE INTO cache_documents (namespace, cache_key, version) VALUES (?, ?, ?)',
+                         (self.namespace, str(key), _now_us()))
+            return conn.execute('SELECT version FROM cache_documents WHERE namespace = ? AND cache_key = ?',
+                                (self.namespace, str(key))).fetchone()[0]
+
+    def get(self, key, version):
+        with self._connect() as conn:
+            row = conn.execute('SELECT body FROM cache_documents WHERE namespace = ? AND cache_key = ? AND version = ?',
+                               (self.namespace, str(key), version)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, version, body):
+        with self._connect() as conn:
+            conn.execute('UPDATE cache_documents SET body = ? WHERE namespace = ? AND cache_key = ? AND version = ?',
+                         (body, self.namespace, str(key), version))
+
+    def invalidate(self, key):
+        with self._connect() as conn:
+            conn.execute('''INSERT INTO cache_documents (namespace, cache_key, version) VALUES (?, ?, ?)
+                ON CONFLICT (namespace, cache_key) DO UPDATE
+                SET version = MAX(excluded.version, version + 1), body = NULL''',
+                         (self.namespace, str(key), _now_us()))
+
+
+class DocumentCache:
+    """Bounded, versioned document cache with an optional shared store"""
+
+    def __init__(self, name, max_entries=None, ttl=None, shared_path=None):
+        prefix = name.upper()
+        self.max_entries = max_entries or int(os.environ.get(f'{prefix}_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        self.ttl = ttl if ttl is not None else float(os.environ.get(f'{prefix}_CACHE_TTL', DEFAULT_TTL))
+        shared_path = shared_path or os.environ.get(f'{prefix}_CACHE_PATH')
+        self.shared = SharedCacheStore(shared_path, name) if shared_path else None
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._base_version = _now_us()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, key):
+        """Current version of key"""
+        if self.shared is not None:
+            return self.shared.version(key)
+        with self._lock:
+            return self._versions.get(key, self._base_version)
+
+    def get(self, key, version):
+        """CacheEntry for key at version, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version and entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        if self.shared is not None:
+            body = self.shared.get(key, version)
+            if body is not None:
+                entry = self._store(key, version, json.loads(body), body)
+                with self._lock:
+                    self.hits += 1
+                return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, version, document, local_only=False):
+        """Cache document under the version read before it was built; returns the entry.
+
+        local_only keeps it out of the shared store (per-process variants of a document).
+        """
+        body = dumps(document, sort_keys=True)
+        if self.shared is not None and not local_only:
+            self.shared.put(key, version, body)
+        return self._store(key, version, document, body)
+
+    def _store(self, key, version, document, body):
+        entry = CacheEntry(version, document, body, time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *keys):
+        """Bump the version of each key and drop its cached document"""
+        for key in keys:
+            if key is None:
+                continue
+            if self.shared is not None:
+                self.shared.invalidate(key)
+            with self._lock:
+                current = self._versions.get(key, self._base_version)
+                self._versions[key] = max(_now_us(), current + 1)
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared is not None
+            }
@@ -0,0 +1,140 @@
+"""Local message broker stand-in shared by all services.
+
+Events are appended to a topic log in a SQLite file (WAL mode) that every
+service on the machine can open. Consumers keep their own offset, so each
+consumer sees every event at least once. Handlers must be idempotent.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'instance', 'event_bus.db')
+
+
+class EventBus:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('EVENT_BUS_PATH', DEFAULT_BUS_PATH)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                event_key TEXT,
+                payload TEXT NOT NULL,
+                source TEXT,
+                created_at TEXT NOT NULL
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_events_topic_id ON events (topic, id)')
+            conn.execute('''CREATE TABLE IF NOT EXISTS consumer_offsets (
+                consumer TEXT PRIMARY KEY,
+                last_event_id INTEGER NOT NULL DEFAULT 0
+            )''')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA busy_timeout=10000')
+        return conn
+
+    def publish_many(self, events, source=None):
+        """Append events to the log in one transaction.
+
+        events: iterable of (topic, key, payload_dict) tuples.
+        """
+        now = datetime.utcnow().isoformat()
+        rows = [(topic, str(key) if key is not None else None, json.dumps(payload), source, now)
+                for topic, key, payload in events]
+        if not rows:
+            return 0
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT INTO events (topic, event_key, payload, source, created_at) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+        return len(rows)
+
+    def publish(self, topic, payload, key=None, source=None):
+        return self.publish_many([(topic, key, payload)], source=source)
+
+    def poll(self, consumer, topics, limit=100):
+        """Events on the given topics after the consumer's committed offset"""
+        placeholders = ','.join('?' for _ in topics)
+        with self._connect() as conn:
+            row = conn.execute('SELECT last_event_id FROM consumer_offsets WHERE consumer = ?',
+                               (consumer,)).fetchone()
+            offset = row[0] if row else 0
+            rows = conn.execute(
+                f'SELECT id, topic, event_key, payload, created_at FROM events '
+                f'WHERE id > ? AND topic IN ({placeholders}) ORDER BY id LIMIT ?',
+                (offset, *topics, limit)
+            ).fetchall()
+        return [
+            {'id': r[0], 'topic': r[1], 'key': r[2], 'payload': json.loads(r[3]), 'created_at': r[4]}
+            for r in rows
+        ]
+
+    def ack(self, consumer, event_id):
+        """Commit the consumer offset up to and including event_id"""
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO consumer_offsets (consumer, last_event_id) VALUES (?, ?) '
+                'ON CONFLICT(consumer) DO UPDATE SET last_event_id = MAX(last_event_id, excluded.last_event_id)',
+                (consumer, event_id)
+            )
+
+    def consume_once(self, consumer, handlers, limit=100):
+        """Dispatch pending events to handlers ({topic: fn(payload)}), acking each one"""
+        events = self.poll(consumer, list(handlers), limit=limit)
+        for event in events:
+            handlers[event['topic']](event['payload'])
+            self.ack(consumer, event['id'])
+        return len(events)
+
+    def start_consumer(self, consumer, handlers, interval=1.0):
+        """Run consume_once in a daemon thread. A failing handler is retried next tick."""
+        def loop():
+            while True:
+                try:
+                    if self.consume_once(consumer, handlers):
+                        continue
+                except Exception as e:
+                    logger.error(f"Consumer {consumer} failed: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, name=f'consumer-{consumer}', daemon=True)
+        thread.start()
+        return thread
+
+
+def start_workers_once(app, start):
+    """Run start() once in the process that serves app; returns the starter.
+
+    Registered as a before_request hook, so any server (flask run, gunicorn,
+    waitress, ...) starts the workers with its first request; `python app.py`
+    calls the returned starter right away in the reloader's serving process.
+    The reloader's watcher process never serves, so it never starts them.
+    EVENT_WORKERS=false disables the workers (one-off scripts, tests).
+    """
+    lock = threading.Lock()
+    started = []
+
+    def ensure_started():
+        if started:
+            return
+        with lock:
+            if started:
+                return
+            started.append(True)
+            if os.environ.get('EVENT_WORKERS', 'true').lower() == 'false':
+                logger.warning(f"EVENT_WORKERS=false: {app.name} is not publishing or consuming events")
+                return
+            start()
+
+    app.before_request(ensure_started)
+    return ensure_started
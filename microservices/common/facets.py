@@ -0,0 +1,100 @@
+"""Facet counts for filtered list endpoints, computed in one aggregate query.
+
+    facets = FacetCounter(
+        group_by=('category', MenuItem.category),
+        flags={'is_vegetarian': MenuItem.is_vegetarian, 'is_spicy': MenuItem.is_spicy},
+        ranges={'price': (MenuItem.price, [20000, 50000, 100000])},
+    )
+    counts = facets.counts(filtered_query, signature)   # {"total": .., "category": {..}, ..}
+
+The filtered query is grouped by the `group_by` column; flag and range
+counts are conditional SUMs in the same SELECT, and the total is the sum
+of the groups - so one statement gives the exact total and every facet,
+and the items page needs no separate COUNT(*).
+
+Counts describe the current filtered set (every filter applies to every
+facet). They are cached per filter signature in a bounded LRU until
+invalidate() is called or FACET_CACHE_TTL seconds pass.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import and_, case, func
+
+DEFAULT_TTL = 30
+MAX_CACHED_SIGNATURES = 512
+
+
+class FacetCounter:
+    def __init__(self, group_by, flags=None, ranges=None, ttl=None, max_entries=MAX_CACHED_SIGNATURES):
+        self.group_name, self.group_column = group_by
+        self.flags = dict(flags or {})
+        self.ranges = {name: (column, list(edges)) for name, (column, edges) in (ranges or {}).items()}
+        self.ttl = ttl if ttl is not None else float(os.environ.get('FACET_CACHE_TTL', DEFAULT_TTL))
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _buckets(edges):
+        bounds = [None] + edges + [None]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _range_condition(self, column, low, high):
+        if low is None:
+            return column < high
+        if high is None:
+            return column >= low
+        return and_(column >= low, column < high)
+
+    def _compute(self, query):
+        columns = [self.group_column, func.count()]
+        for column in self.flags.values():
+            columns.append(func.sum(case((column.is_(True), 1), else_=0)))
+        for column, edges in self.ranges.values():
+            for low, high in self._buckets(edges):
+                columns.append(func.sum(case((self._range_condition(column, low, high), 1), else_=0)))
+        rows = query.with_entities(*columns).group_by(self.group_column).order_by(None).all()
+
+        total = sum(row[1] for row in rows)
+        result = {
+            "total": total,
+            self.group_name: {(row[0] if row[0] is not None else 'uncategorized'): row[1] for row in rows}
+        }
+        i = 2
+        for name in self.flags:
+            true_count = sum(row[i] or 0 for row in rows)
+            result[name] = {"true": true_count, "false": total - true_count}
+            i += 1
+        for name, (column, edges) in self.ranges.items():
+            result[name] = []
+            for low, high in self._buckets(edges):
+                result[name].append({"min": low, "max": high, "count": sum(row[i] or 0 for row in rows)})
+                i += 1
+        return result
+
+    def counts(self, query, signature):
+        """Facet counts of the filtered query, cached under signature (a hashable filter description)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(signature)
+            if entry is not None and entry[0] == self._generation and entry[1] > now:
+                self._cache.move_to_end(signature)
+                return entry[2]
+            generation = self._generation
+        result = self._compute(query)
+        with self._lock:
+            if generation == self._generation:  # Not invalidated while counting
+                self._cache[signature] = (generation, now + self.ttl, result)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return result
+
+    def invalidate(self):
+        """Drop every cached count (call after the underlying rows change)"""
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
@@ -0,0 +1,105 @@
+"""Geo helpers: haversine distance and geohash cells for proximity queries.
+
+Rows store a geohash (GEOHASH_PRECISION characters, ~5 m) in an indexed
+column. A radius query is answered in SQL:
+
+    cells = covering_cells(lat, lng, radius_km)        # a handful of prefixes
+    query.filter(or_(*geohash_prefix_filters(Model.geohash, cells)))   # index range scans
+         .filter(bounding box).order_by(approx_distance_sq(...))
+
+Each prefix is a range scan on the index (geohash >= 'qqgu' AND geohash <
+'qqgu~'), the bounding box trims the cells' corners, and the ordering uses
+an equirectangular distance (plain arithmetic, no trig in SQL). Callers
+compute the exact haversine distance only for the rows they return.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371
+GEOHASH_PRECISION = 9
+MAX_COVERING_CELLS = 16
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calculate distance between two points using Haversine formula"""
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def validate_coordinates(lat, lng):
+    """Raise ValueError unless lat/lng are valid WGS84 degrees"""
+    if lat is None or lng is None:
+        raise ValueError("latitude and longitude are required")
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        raise ValueError("latitude must be within [-90, 90] and longitude within [-180, 180]")
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def _cell_size(precision):
+    """(height, width) of a geohash cell in degrees"""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def bounding_box(lat, lng, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing the circle"""
+    dlat = radius_km / _KM_PER_DEGREE
+    dlng = radius_km / (_KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return max(lat - dlat, -90), min(lat + dlat, 90), max(lng - dlng, -180), min(lng + dlng, 180)
+
+
+def covering_cells(lat, lng, radius_km):
+    """The finest set of at most MAX_COVERING_CELLS geohash prefixes covering the circle's bounding box"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        rows = math.ceil((max_lat - min_lat) / height) + 1
+        cols = math.ceil((max_lng - min_lng) / width) + 1
+        if rows * cols <= MAX_COVERING_CELLS:
+            break
+    lats = [min(min_lat + i * height, max_lat) for i in range(rows)] + [max_lat]
+    lngs = [min(min_lng + j * width, max_lng) for j in range(cols)] + [max_lng]
+    return sorted({geohash_encode(a, b, precision) for a in lats for b in lngs})
+
+
+def geohash_prefix_filters(column, cells):
+    """Index-friendly range conditions matching any of the geohash prefixes"""
+    return [column.between(cell, cell + '~') for cell in cells]
+
+
+def approx_distance_sq(lat_column, lng_column, lat, lng):
+    """SQL expression for the squared equirectangular distance in km² (ordering / pre-filtering)"""
+    scale = math.cos(math.radians(lat))
+    dy = (lat_column - lat) * _KM_PER_DEGREE
+    dx = (lng_column - lng) * (_KM_PER_DEGREE * scale)
+    return dy * dy + dx * dx
@@ -0,0 +1,106 @@
+"""Idempotency-Key support for POST endpoints.
+
+The first request with a given key claims it (INSERT on the primary key),
+runs the handler and stores the response. Retries with the same key get
+the stored response back without running the handler again. A concurrent
+duplicate waits briefly for the first request to finish instead of
+inserting twice. Keys expire after a TTL and are evicted in batches.
+
+Each service defines its own key model (see IdempotencyKey in the service
+app.py) with the columns used here.
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, request, Response
+from sqlalchemy.exc import IntegrityError
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+DEFAULT_TTL = timedelta(hours=24)
+PROCESSING_TIMEOUT = timedelta(seconds=60)  # a claim older than this is considered abandoned
+WAIT_TIMEOUT = 5.0  # seconds a concurrent duplicate waits for the first request
+WAIT_INTERVAL = 0.05
+EVICT_INTERVAL = 60  # seconds between expired-key sweeps per process
+
+_last_eviction = [0.0]
+
+
+def _error(message, status):
+    return {"success": False, "error": message}, status
+
+
+def evict_expired_keys(db, model):
+    """Delete expired keys, at most once per EVICT_INTERVAL per process"""
+    now = time.monotonic()
+    if now - _last_eviction[0] < EVICT_INTERVAL:
+        return 0
+    _last_eviction[0] = now
+    count = model.query.filter(model.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def _replay(entry):
+    response = Response(entry.response_body, status=entry.response_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(db, model, scope, ttl=DEFAULT_TTL):
+    """Decorator honouring the Idempotency-Key header on a route"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return f(*args, **kwargs)
+            if len(key) > 255:
+                return _error(f"{IDEMPOTENCY_HEADER} must be at most 255 characters", 400)
+
+            request_hash = hashlib.sha256(request.get_data()).hexdigest()
+            evict_expired_keys(db, model)
+
+            # Claim the key; the primary key serializes concurrent duplicates
+            now = datetime.utcnow()
+            db.session.add(model(scope=scope, key=key, request_hash=request_hash, status='processing',
+                                 created_at=now, expires_at=now + ttl))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                deadline = time.monotonic() + WAIT_TIMEOUT
+                while True:
+                    entry = db.session.get(model, (scope, key))
+                    if entry is None:
+                        # Previous attempt failed and released the key
+                        return wrapper(*args, **kwargs)
+                    if entry.request_hash != request_hash:
+                        return _error(f"{IDEMPOTENCY_HEADER} was already used with a different request body", 422)
+                    if entry.status == 'completed':
+                        return _replay(entry)
+                    if datetime.utcnow() - entry.created_at > PROCESSING_TIMEOUT:
+                        db.session.delete(entry)
+                        db.session.commit()
+                        return wrapper(*args, **kwargs)
+                    if time.monotonic() >= deadline:
+                        return _error("A request with this Idempotency-Key is still being processed", 409)
+                    db.session.rollback()  # end the read transaction to see the other request's commit
+                    time.sleep(WAIT_INTERVAL)
+
+            response = current_app.make_response(f(*args, **kwargs))
+
+            entry = db.session.get(model, (scope, key))
+            if response.status_code >= 500:
+                # Let the client retry the failed request
+                if entry:
+                    db.session.delete(entry)
+            elif entry:
+                entry.status = 'completed'
+                entry.response_code = response.status_code
+                entry.response_body = response.get_data(as_text=True)
+            db.session.commit()
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,59 @@
+"""Sorted in-memory leaderboard for top-N endpoints.
+
+    board = Leaderboard()
+    board.load({restaurant_id: score, ...})   # rebuild from an aggregate table
+    board.set(7, 4.6)                         # or board.increment(7, 1)
+    board.top(10)                             # [(member, score)] best first
+
+Entries are kept in a list sorted by (-score, member), so an update is a
+bisect plus a list shift and top(n) is a slice - no sorting per request.
+Ties rank the lower member first.
+"""
+import bisect
+import threading
+
+
+class Leaderboard:
+    def __init__(self, scores=None):
+        self._lock = threading.RLock()
+        self.load(scores or {})
+
+    def load(self, scores):
+        """Replace every entry ({member: score})"""
+        with self._lock:
+            self._scores = dict(scores)
+            self._ranked = sorted((-score, member) for member, score in self._scores.items())
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, member):
+        return member in self._scores
+
+    def score(self, member):
+        return self._scores.get(member)
+
+    def set(self, member, score):
+        with self._lock:
+            self._discard(member)
+            self._scores[member] = score
+            bisect.insort(self._ranked, (-score, member))
+
+    def increment(self, member, delta):
+        with self._lock:
+            self.set(member, self._scores.get(member, 0) + delta)
+
+    def remove(self, member):
+        with self._lock:
+            self._discard(member)
+            self._scores.pop(member, None)
+
+    def _discard(self, member):
+        old = self._scores.get(member)
+        if old is not None:
+            del self._ranked[bisect.bisect_left(self._ranked, (-old, member))]
+
+    def top(self, n):
+        """[(member, score)] for the n best entries"""
+        with self._lock:
+            return [(member, -negated) for negated, member in self._ranked[:n]]
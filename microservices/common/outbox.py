@@ -0,0 +1,47 @@
+"""Transactional outbox relay.
+
+Services write OutboxEvent rows in the same commit as their state change;
+the relay publishes unpublished rows to the EventBus and marks them as
+published. Publishing happens off the request path, at least once.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def relay_outbox(db, outbox_model, bus, source=None, batch_size=100):
+    """Publish one batch of unpublished outbox rows. Returns how many were sent."""
+    rows = outbox_model.query.filter(outbox_model.published_at.is_(None)) \
+        .order_by(outbox_model.id).limit(batch_size).all()
+    if not rows:
+        return 0
+
+    bus.publish_many([(row.topic, row.aggregate_id, json.loads(row.payload)) for row in rows], source=source)
+
+    now = datetime.utcnow()
+    for row in rows:
+        row.published_at = now
+    db.session.commit()
+    return len(rows)
+
+
+def start_outbox_relay(app, db, outbox_model, bus, source=None, interval=1.0):
+    """Run relay_outbox in a daemon thread"""
+    def loop():
+        while True:
+            with app.app_context():
+                try:
+                    if relay_outbox(db, outbox_model, bus, source=source):
+                        continue
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Outbox relay failed: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name='outbox-relay', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,46 @@
+"""Count the SQL statements a block of code issues - for query budgets.
+
+    with assert_max_queries(db.engine, 2):
+        client.get('/api/menu-items')
+
+Fails with the list of statements when the budget is exceeded, which
+makes N+1 regressions (one lazy load per row) easy to spot.
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class QueryLog:
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def __str__(self):
+        return '\n'.join(f"  {i + 1}. {' '.join(s.split())}" for i, s in enumerate(self.statements))
+
+
+@contextmanager
+def count_queries(engine):
+    """Collect every statement executed on engine inside the block"""
+    log = QueryLog()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        log.statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield log
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+@contextmanager
+def assert_max_queries(engine, limit):
+    """Raise AssertionError when the block issues more than limit statements"""
+    with count_queries(engine) as log:
+        yield log
+    if len(log) > limit:
+        raise AssertionError(f"Expected at most {limit} queries, got {len(log)}:\n{log}")
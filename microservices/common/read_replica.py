@@ -0,0 +1,218 @@
+"""Read-replica routing for Flask-SQLAlchemy sessions.
+
+GET/HEAD requests read from a replica engine, everything else (and any
+flush or INSERT/UPDATE/DELETE) goes to the primary. Usage in a service:
+
+    db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+    init_read_replica(app, db, '<name>')
+
+The replica is <NAME>_REPLICA_URL when set. Otherwise, for a SQLite
+primary, it is a local snapshot (<db>.replica.db) refreshed every
+DB_REPLICA_SNAPSHOT_INTERVAL seconds (default 2). DB_READ_REPLICA=false
+turns routing off.
+
+Read-your-writes: after a commit that wrote anything, reads stay on the
+primary until the replica has caught up - for a snapshot, until the next
+snapshot taken after the write; for an external replica, for
+DB_REPLICA_STICKY_SECONDS (default 5) after the write.
+"""
+import contextlib
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+
+from .db_config import engine_options
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+class ReadReplica:
+    """Replica engine plus the freshness bookkeeping used for routing"""
+
+    def __init__(self, uri=None, source_path=None, snapshot_interval=2.0, sticky_seconds=5.0):
+        self.uri = uri
+        self.source_path = source_path
+        self.snapshot_interval = snapshot_interval
+        self.sticky_seconds = sticky_seconds
+        self.last_write_at = 0.0
+        self.synced_at = None if source_path else 0.0
+        self._engine = None
+        self._lock = threading.Lock()
+        self._worker = None
+
+    @property
+    def is_snapshot(self):
+        return self.source_path is not None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = sa.create_engine(self.uri, **engine_options(self.uri))
+        return self._engine
+
+    def mark_write(self):
+        self.last_write_at = time.time()
+
+    def is_fresh(self):
+        """True when reads from the replica would see this process's last write"""
+        if self.is_snapshot:
+            self._ensure_worker()
+            return self.synced_at is not None and self.synced_at > self.last_write_at
+        return time.time() - self.last_write_at > self.sticky_seconds
+
+    # ----- local SQLite snapshot -----
+
+    def _source_changed(self):
+        if self.synced_at is None or self.last_write_at >= self.synced_at:
+            return True
+        for path in (self.source_path, self.source_path + '-wal'):
+            try:
+                if os.path.getmtime(path) >= self.synced_at:
+                    return True
+            except OSError:
+                pass
+        return False
+
+    def snapshot(self):
+        """Copy the primary into the replica file with the SQLite backup API"""
+        if not os.path.exists(self.source_path):
+            return False
+        started = time.time()
+        src = sqlite3.connect(self.source_path, timeout=30)
+        dst = sqlite3.connect(self.uri[len('sqlite:///'):], timeout=30)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        self.synced_at = started
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self._source_changed():
+                    self.snapshot()
+            except sqlite3.Error as e:
+                logger.warning(f"Replica snapshot failed: {e}")
+            time.sleep(self.snapshot_interval)
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='replica-snapshot', daemon=True)
+                    self._worker.start()
+
+
+def _current_replica():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('read_replica')
+
+
+class RoutingSession(Session):
+    """Session that sends reads made while serving GET/HEAD requests to the replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            return current_app.extensions['read_replica'].engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if self._flushing or self.new or self.dirty or self.deleted:
+            return False
+        if isinstance(clause, UpdateBase):
+            return False
+        if not has_request_context() or request.method not in READ_METHODS:
+            return False
+        if g.get('db_use_primary'):
+            return False
+        replica = _current_replica()
+        return replica is not None and replica.is_fresh()
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flag_flush(session, flush_context):
+    session.info['db_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _flag_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['db_wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _record_write(session):
+    if session.info.pop('db_wrote', False):
+        replica = _current_replica()
+        if replica is not None:
+            replica.mark_write()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _clear_write_flag(session):
+    session.info.pop('db_wrote', None)
+
+
+def use_primary(f):
+    """Pin a GET route to the primary (e.g. reads that must never lag)"""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        g.db_use_primary = True
+        return f(*args, **kwargs)
+    return wrapper
+
+
+@contextlib.contextmanager
+def primary_reads():
+    """Read from the primary inside the block - for results that outlive the
+    request (shared caches, in-memory state), which must never be built from
+    a lagging replica"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('db_use_primary')
+    g.db_use_primary = True
+    try:
+        yield
+    finally:
+        g.db_use_primary = previous
+
+
+def init_read_replica(app, db, name):
+    """Attach a ReadReplica for the service database `name` to app, if enabled"""
+    if os.environ.get('DB_READ_REPLICA', 'true').lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    uri = os.environ.get(f'{name.upper()}_REPLICA_URL')
+    source_path = None
+    if uri is None:
+        with app.app_context():
+            primary = db.engine.url
+        if primary.get_backend_name() != 'sqlite' or primary.database in (None, '', ':memory:'):
+            return None
+        source_path = primary.database
+        root, ext = os.path.splitext(source_path)
+        uri = f'sqlite:///{root}.replica{ext or ".db"}'
+    replica = ReadReplica(
+        uri=uri,
+        source_path=source_path,
+        snapshot_interval=float(os.environ.get('DB_REPLICA_SNAPSHOT_INTERVAL', 2)),
+        sticky_seconds=float(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5)),
+    )
+    app.extensions['read_replica'] = replica
+    return replica
@@ -0,0 +1,199 @@
+"""In-process inverted index for full-text search with prefix matching.
+
+Documents are (kind, id) keys with weighted text fields and a small
+payload returned with each hit:
+
+    index.add(('menu_item', 7), {'name': ('Nasi Goreng', 3), 'description': ('...', 1)},
+              payload={'name': 'Nasi Goreng', 'price': 25000})
+    index.search('nasi gor', limit=20)   # the last token may be a prefix
+
+Every query token must match (AND). The last token also matches terms it
+is a prefix of (the word being typed; exact matches score higher). Scores
+are tf-idf weighted by field.
+
+- single-token queries read each matching term's postings in tf order
+  (sorted lazily, cached per term) and stop after `limit` entries
+- multi-token queries intersect the tokens' candidate sets with C set
+  operations and score only the documents that match every token; a
+  token with a much larger candidate set is checked per document instead
+- results are cached per query until the next write
+
+Writers and searches that miss the result cache hold `lock`, so a search
+never walks postings that a concurrent add/remove is changing; a cached
+result is returned without it.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MIN_PREFIX = 2  # Shorter tokens only match whole terms
+PREFIX_WEIGHT = 0.5
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class SearchIndex:
+    MAX_CACHED_QUERIES = 1024
+
+    def __init__(self):
+        self.clear()
+        self.lock = threading.RLock()
+
+    def clear(self):
+        self.postings = {}  # term -> {doc number: weighted term frequency}
+        self.doc_terms = {}  # doc number -> {term: weighted term frequency}
+        self.terms = []  # Sorted vocabulary for prefix lookups
+        self._numbers = {}  # key -> doc number (ints hash and intersect faster than tuples)
+        self._docs = {}  # doc number -> (key, payload)
+        self._next_number = 0
+        self._ranked_cache = {}
+        self._results = {}
+        self.generation = getattr(self, 'generation', 0) + 1  # Bumped on every write; invalidates cached results
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def __contains__(self, key):
+        return key in self._numbers
+
+    def add(self, key, fields, payload=None):
+        """Index (or re-index) a document. fields: {name: (text, weight)}"""
+        with self.lock:
+            self.remove(key)
+            weights = {}
+            for text, weight in fields.values():
+                for term in tokenize(text):
+                    weights[term] = weights.get(term, 0) + weight
+            number = self._numbers[key] = self._next_number
+            self._next_number += 1
+            for term, weight in weights.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = {}
+                    bisect.insort(self.terms, term)
+                posting[number] = weight
+                self._ranked_cache.pop(term, None)
+            self.doc_terms[number] = weights
+            self._docs[number] = (key, payload or {})
+            self.generation += 1
+
+    def remove(self, key):
+        with self.lock:
+            number = self._numbers.pop(key, None)
+            if number is None:
+                return
+            del self._docs[number]
+            for term in self.doc_terms.pop(number):
+                posting = self.postings[term]
+                del posting[number]
+                self._ranked_cache.pop(term, None)
+                if not posting:
+                    del self.postings[term]
+                    del self.terms[bisect.bisect_left(self.terms, term)]
+            self.generation += 1
+
+    def _expand(self, token, prefix):
+        """{indexed term: weight} for the terms a query token matches"""
+        n = len(self.doc_terms)
+        matches = {}
+        if token in self.postings:
+            matches[token] = math.log(1 + n / len(self.postings[token]))
+        if not prefix:
+            return matches
+        i = bisect.bisect_right(self.terms, token)
+        while i < len(self.terms) and self.terms[i].startswith(token):
+            term = self.terms[i]
+            factor = PREFIX_WEIGHT + PREFIX_WEIGHT * len(token) / len(term)
+            matches[term] = factor * math.log(1 + n / len(self.postings[term]))
+            i += 1
+        return matches
+
+    def _ranked(self, term):
+        """Postings of term as [(tf, doc number)] best first, cached until the term changes"""
+        ranked = self._ranked_cache.get(term)
+        if ranked is None:
+            ranked = self._ranked_cache[term] = sorted(((tf, number) for number, tf in self.postings[term].items()),
+                                                       reverse=True)
+        return ranked
+
+    def _matching(self, expansion):
+        postings = [self.postings[term].keys() for term in expansion]
+        return set(postings[0]).union(*postings[1:]) if len(postings) > 1 else set(postings[0])
+
+    def search(self, query, limit=20, kinds=None):
+        """[(score, key, payload)] best first, limited to kinds when given"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self.doc_terms:
+            return []
+        cache_key = (tuple(tokens), limit, kinds and tuple(sorted(kinds)))
+        cached = self._results.get(cache_key)
+        if cached is not None and cached[0] == self.generation:
+            return cached[1]
+        with self.lock:
+            results = self._search(tokens, limit, kinds)
+            if len(self._results) >= self.MAX_CACHED_QUERIES:
+                self._results.clear()
+            self._results[cache_key] = (self.generation, results)
+        return results
+
+    def _search(self, tokens, limit, kinds):
+        # Only the last token is a prefix (the word being typed), from MIN_PREFIX characters on
+        expansions = [self._expand(t, i == len(tokens) - 1 and len(t) >= MIN_PREFIX) for i, t in enumerate(tokens)]
+        if len(tokens) > 1 and not expansions[-1] and len(tokens[-1]) < MIN_PREFIX:
+            tokens, expansions = tokens[:-1], expansions[:-1]  # Ignore a stray first letter
+        if not all(expansions):
+            return []
+        docs = self._docs
+
+        scores = {}
+        if len(tokens) == 1:
+            # Single token: each term's best postings are enough for the top `limit`
+            for term, weight in expansions[0].items():
+                taken = 0
+                for tf, number in self._ranked(term):
+                    if kinds is not None and docs[number][0][0] not in kinds:
+                        continue
+                    score = tf * weight
+                    if score > scores.get(number, 0):
+                        scores[number] = score
+                    taken += 1
+                    if taken == limit:
+                        break
+        else:
+            # Several tokens: intersect candidate sets in C, then score only the survivors
+            # Tokens with far larger posting lists are checked per candidate instead
+            sizes = [sum(len(self.postings[term]) for term in e) for e in expansions]
+            cheapest = min(sizes)
+            candidates = sorted((self._matching(e) for e, size in zip(expansions, sizes)
+                                 if size <= 4 * cheapest), key=len)
+            plans = [(list(e.items()), e, len(e)) for e in expansions]
+            for number in candidates[0].intersection(*candidates[1:]):
+                if kinds is not None and docs[number][0][0] not in kinds:
+                    continue
+                doc = self.doc_terms[number]
+                total = 0
+                for items, expansion, size in plans:
+                    best = 0
+                    if size < len(doc):
+                        for term, weight in items:
+                            tf = doc.get(term)
+                            if tf is not None and tf * weight > best:
+                                best = tf * weight
+                    else:
+                        for term, tf in doc.items():
+                            weight = expansion.get(term)
+                            if weight is not None and tf * weight > best:
+                                best = tf * weight
+                    if not best:
+                        break
+                    total += best
+                else:
+                    scores[number] = total
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
+        return [(score, *docs[number]) for number, score in top]
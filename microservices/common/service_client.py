@@ -0,0 +1,45 @@
+"""Pooled HTTP client for calls between services.
+
+    restaurants = ServiceClient(os.environ.get('RESTAURANT_SERVICE_URL', 'http://localhost:5002'))
+    body = restaurants.post_json('/api/menu-items/lookup', {'ids': [1, 2]})
+
+One requests.Session per client keeps up to SERVICE_POOL_SIZE (default 10)
+keep-alive connections to the service, so a call costs no TCP handshake.
+Timeouts are short (SERVICE_CONNECT_TIMEOUT / SERVICE_READ_TIMEOUT seconds)
+and a refused connection is retried once. Any failure to get a JSON
+answer raises ServiceUnavailable.
+"""
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class ServiceClient:
+    def __init__(self, base_url, pool_size=None, timeout=None, retries=1):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout or (float(os.environ.get('SERVICE_CONNECT_TIMEOUT', 1)),
+                                   float(os.environ.get('SERVICE_READ_TIMEOUT', 3)))
+        pool_size = pool_size or int(os.environ.get('SERVICE_POOL_SIZE', 10))
+        self.session = requests.Session()
+        # POST is never retried after the request was sent, only when connecting fails
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post_json(self, path, payload):
+        """POST payload as JSON and return the decoded JSON answer (4xx answers included)"""
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise ServiceUnavailable(f"{self.base_url} unreachable: {e}")
+        if response.status_code >= 500:
+            raise ServiceUnavailable(f"{self.base_url}{path} answered HTTP {response.status_code}")
+        try:
+            return response.json()
+        except ValueError:
+            raise ServiceUnavailable(f"{self.base_url}{path} answered non-JSON (HTTP {response.status_code})")
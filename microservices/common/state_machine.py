@@ -0,0 +1,109 @@
+"""Declarative state machine for status columns (orders, deliveries, payments).
+
+The transition table is compiled once into frozensets (allowed targets per
+state and allowed sources per target), so checking a transition is a single
+set lookup. Guards can veto a transition, effects run after the status is
+set (e.g. stamping actual_delivery_time). bulk_transition() applies one
+transition to many rows with a single UPDATE.
+"""
+from datetime import datetime
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+class StateMachine:
+    def __init__(self, name, transitions, attribute='status'):
+        """transitions: {from_state: [to_state, ...]}; terminal states map to []"""
+        self.name = name
+        self.attribute = attribute
+        self.states = frozenset(transitions) | frozenset(t for targets in transitions.values() for t in targets)
+        self._targets = {state: frozenset(transitions.get(state, ())) for state in self.states}
+        sources = {state: set() for state in self.states}
+        for source, targets in transitions.items():
+            for target in targets:
+                sources[target].add(source)
+        self._sources = {state: frozenset(s) for state, s in sources.items()}
+        self._guards = []   # (from_state or None, to_state or None, fn)
+        self._effects = []  # (from_state or None, to_state or None, fn)
+
+    # ----- registration -----
+    def guard(self, to_state=None, from_state=None):
+        """Register fn(obj, old, new, **context) returning an error message to veto"""
+        def decorator(fn):
+            self._guards.append((from_state, to_state, fn))
+            return fn
+        return decorator
+
+    def on_enter(self, to_state=None, from_state=None):
+        """Register fn(obj, old, new, **context) run after the status changes"""
+        def decorator(fn):
+            self._effects.append((from_state, to_state, fn))
+            return fn
+        return decorator
+
+    # ----- queries -----
+    def can(self, from_state, to_state):
+        return to_state in self._targets.get(from_state, ())
+
+    def targets(self, from_state):
+        return self._targets.get(from_state, frozenset())
+
+    def sources(self, to_state):
+        return self._sources.get(to_state, frozenset())
+
+    def is_terminal(self, state):
+        return not self._targets.get(state)
+
+    @staticmethod
+    def _matching(hooks, old, new):
+        return [fn for from_state, to_state, fn in hooks
+                if (from_state is None or from_state == old) and (to_state is None or to_state == new)]
+
+    def check(self, obj, new_state, **context):
+        """Raise InvalidTransition when obj cannot move to new_state"""
+        old_state = getattr(obj, self.attribute)
+        if new_state not in self.states:
+            raise InvalidTransition(
+                f"Invalid {self.name} status '{new_state}'. Must be one of: {', '.join(sorted(self.states))}")
+        if not self.can(old_state, new_state):
+            allowed = ', '.join(sorted(self.targets(old_state))) or 'none (final status)'
+            raise InvalidTransition(
+                f"Cannot change {self.name} status from '{old_state}' to '{new_state}'. Allowed: {allowed}")
+        for guard in self._matching(self._guards, old_state, new_state):
+            error = guard(obj, old_state, new_state, **context)
+            if error:
+                raise InvalidTransition(error)
+        return old_state
+
+    # ----- transitions -----
+    def transition(self, obj, new_state, **context):
+        """Validate, set the status and run effects. Returns the old status."""
+        old_state = self.check(obj, new_state, **context)
+        setattr(obj, self.attribute, new_state)
+        if hasattr(obj, 'updated_at'):
+            obj.updated_at = datetime.utcnow()
+        for effect in self._matching(self._effects, old_state, new_state):
+            effect(obj, old_state, new_state, **context)
+        return old_state
+
+    def bulk_transition(self, session, model, ids, new_state, values=None):
+        """Move every row in ids that is allowed to reach new_state with one UPDATE.
+
+        Rows in a state that cannot reach new_state are left untouched.
+        Per-row guards and effects do not run; pass extra column values instead.
+        Instances already loaded in the session are updated in place.
+        Returns the number of updated rows.
+        """
+        if new_state not in self.states:
+            raise InvalidTransition(f"Invalid {self.name} status '{new_state}'")
+        sources = self.sources(new_state)
+        if not ids or not sources:
+            return 0
+        column = getattr(model, self.attribute)
+        update_values = {self.attribute: new_state, **(values or {})}
+        if hasattr(model, 'updated_at') and 'updated_at' not in update_values:
+            update_values['updated_at'] = datetime.utcnow()
+        return session.query(model).filter(model.id.in_(ids), column.in_(sources)) \
+            .update(update_values, synchronize_session='evaluate')
@@ -0,0 +1,48 @@
+"""Streaming NDJSON responses for full-table exports.
+
+A list endpoint switches to streaming when the client sends
+`Accept: application/x-ndjson` or `?stream=1`:
+
+    if wants_ndjson():
+        return ndjson_response(query, Order.serializer, fields)
+
+Rows are fetched with yield_per() and written one JSON document per line
+as they are produced, so memory stays flat however large the table is.
+The last line is a {"count": N} trailer so clients can tell a complete
+export from a truncated one.
+"""
+from flask import Response, request, stream_with_context
+
+from .serialization import dumps
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 1000
+
+
+def wants_ndjson():
+    """True when the request asks for a streamed NDJSON response"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return NDJSON_MIMETYPE in request.headers.get('Accept', '')
+
+
+def ndjson_response(query, serializer, fields=None, batch_size=STREAM_BATCH_SIZE):
+    """Stream query results as NDJSON, batch_size rows per database round trip"""
+    def generate():
+        count = 0
+        buffer = []
+        for row in query.yield_per(batch_size):
+            buffer.append(dumps(serializer(row, fields)))
+            count += 1
+            if len(buffer) == batch_size:
+                yield '\n'.join(buffer) + '\n'
+                buffer = []
+        if buffer:
+            yield '\n'.join(buffer) + '\n'
+        yield dumps({"count": count}) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=NDJSON_MIMETYPE,
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,189 @@
+"""Locally served, content-addressed image thumbnails.
+
+    store = ThumbnailStore('/srv/thumbnails', widths=(320, 640), local_root='/srv/catalogue')
+    content_hash, variants = store.ingest('https://cdn.example/nasi.jpg')   # {320: '<sha256>-320.webp', ...}
+
+ingest() fetches a source image once - over http(s), or from a file under
+local_root (file:// URLs or relative paths; disabled without local_root) -
+keeps the original under its SHA-256 and writes one resized variant per
+width. Image URLs come from API clients, so http(s) fetches only connect
+to public addresses (checked on the address actually connected to, for
+every redirect too) and, when allowed_hosts is given, only to those hosts
+and their subdomains. Filenames derive from the image bytes, so a given file never
+changes and can be served with an immutable, year-long Cache-Control; the
+same image behind two URLs is stored once.
+
+Needs Pillow; without it `available` is False and callers keep the
+original URLs.
+"""
+import hashlib
+import io
+import ipaddress
+import os
+import re
+import socket
+import urllib.parse
+import urllib.request
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional: without Pillow images are served from their original URLs
+    Image = ImageOps = None
+
+DEFAULT_WIDTHS = (320, 640)
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+FILENAME_RE = re.compile(r'^[0-9a-f]{64}(-[0-9]+)?\.[a-z0-9]{2,5}$')
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def is_public_address(ip):
+    """False for loopback, private, link-local, shared, reserved and multicast addresses"""
+    address = ipaddress.ip_address(ip.split('%')[0])
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+class _GuardedConnections:
+    """urllib handler mixin: every connection is opened through `self.connect`"""
+    connect = None
+
+    def do_open(self, http_class, req, **kwargs):
+        def connection(host, **conn_kwargs):
+            conn = http_class(host, **conn_kwargs)
+            conn._create_connection = self.connect
+            return conn
+        return super().do_open(connection, req, **kwargs)
+
+
+class _GuardedHTTPHandler(_GuardedConnections, urllib.request.HTTPHandler):
+    pass
+
+
+class _GuardedHTTPSHandler(_GuardedConnections, urllib.request.HTTPSHandler):
+    pass
+
+
+class ThumbnailStore:
+    def __init__(self, root, widths=DEFAULT_WIDTHS, local_root=None, fetch_timeout=5,
+                 max_bytes=MAX_SOURCE_BYTES, image_format='webp', allowed_hosts=None):
+        self.root = os.path.abspath(root)
+        self.widths = tuple(sorted(widths))
+        self.local_root = os.path.realpath(local_root) if local_root else None
+        self.fetch_timeout = fetch_timeout
+        self.max_bytes = max_bytes
+        self.image_format = image_format
+        self.allowed_hosts = tuple(h.strip().lower().rstrip('.') for h in allowed_hosts or () if h.strip())
+        os.makedirs(self.root, exist_ok=True)
+
+        # Only http(s) with guarded connections: no proxies, no ftp:// or file:// redirects
+        self._opener = urllib.request.OpenerDirector()
+        for handler in (_GuardedHTTPHandler(), _GuardedHTTPSHandler(), urllib.request.HTTPRedirectHandler(),
+                        urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()):
+            if isinstance(handler, _GuardedConnections):
+                handler.connect = self._connect
+            self._opener.add_handler(handler)
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def _local_path(self, url, parsed):
+        if not self.local_root:
+            raise ThumbnailError("Local image files are disabled (set THUMBNAIL_LOCAL_ROOT)")
+        if parsed.scheme == 'file':
+            path = urllib.request.url2pathname(parsed.path)
+        else:
+            path = os.path.join(self.local_root, url.lstrip('/'))
+        path = os.path.realpath(path)
+        if os.path.commonpath([path, self.local_root]) != self.local_root:
+            raise ThumbnailError("Image path is outside THUMBNAIL_LOCAL_ROOT")
+        return path
+
+    def host_allowed(self, host):
+        host = host.lower().rstrip('.')
+        return not self.allowed_hosts or any(host == allowed or host.endswith('.' + allowed)
+                                             for allowed in self.allowed_hosts)
+
+    def _connect(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        """socket.create_connection() limited to allowed hosts and public addresses.
+
+        The host is resolved once and the checked address itself is connected
+        to, so DNS cannot answer differently between the check and the connect.
+        """
+        host, port = address
+        if not self.host_allowed(host):
+            raise ThumbnailError(f"Image host '{host}' is not in THUMBNAIL_ALLOWED_HOSTS")
+        resolved = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        for *_, sockaddr in resolved:
+            if not is_public_address(sockaddr[0]):
+                raise ThumbnailError(f"Image host '{host}' resolves to a non-public address ({sockaddr[0]})")
+        error = None
+        for *_, sockaddr in resolved:
+            try:
+                return socket.create_connection(sockaddr[:2], timeout, source_address)
+            except OSError as e:
+                error = e
+        raise error or OSError(f"Cannot resolve {host}")
+
+    def fetch(self, url):
+        """Bytes of the source image (ThumbnailError if it cannot be read, is too large or not allowed)"""
+        parsed = urllib.parse.urlparse(url)
+        try:
+            if parsed.scheme in ('http', 'https'):
+                request = urllib.request.Request(url, headers={'User-Agent': 'restaurant-service-thumbnailer'})
+                with self._opener.open(request, timeout=self.fetch_timeout) as response:
+                    data = response.read(self.max_bytes + 1)
+            elif parsed.scheme in ('file', ''):
+                with open(self._local_path(url, parsed), 'rb') as f:
+                    data = f.read(self.max_bytes + 1)
+            else:
+                raise ThumbnailError(f"Unsupported image URL scheme '{parsed.scheme}'")
+        except OSError as e:
+            raise ThumbnailError(f"Cannot fetch image: {e}")
+        if len(data) > self.max_bytes:
+            raise ThumbnailError(f"Image is larger than {self.max_bytes} bytes")
+        return data
+
+    def path(self, filename):
+        return os.path.join(self.root, filename)
+
+    def _write(self, filename, write):
+        path = self.path(filename)
+        if os.path.exists(path):
+            return  # Content-addressed: already stored
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+
+    def ingest(self, url):
+        """(content hash, {width: filename}) for the image at url, generated on first use"""
+        if not self.available:
+            raise ThumbnailError("Pillow is not installed")
+        data = self.fetch(url)
+        content_hash = hashlib.sha256(data).hexdigest()
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception as e:  # Pillow raises several types for bad or oversized images
+            raise ThumbnailError(f"Not a decodable image: {e}")
+
+        self._write(f"{content_hash}.{(image.format or 'bin').lower()}", lambda f: f.write(data))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+        variants = {}
+        for width in self.widths:
+            filename = f"{content_hash}-{width}.{self.image_format}"
+            if width < image.width:
+                resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            else:
+                resized = image  # Never upscale
+            self._write(filename, lambda f: resized.save(f, format=self.image_format.upper(), quality=80))
+            variants[width] = filename
+        return content_hash, variants
@@ -2,17 +2,36 @@ from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
 import os
+import sys
 import random
 import math
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.db_config import configure_database
+from common.read_replica import RoutingSession, init_read_replica
+from common.serialization import FastJSONProvider, ModelSerializer, computed, is_deleted
+from common.conditional import entity_validators, list_validators, not_modified
+from common.streaming import ndjson_response, wants_ndjson
+from common.event_bus import EventBus, start_workers_once
+from common.state_machine import StateMachine, InvalidTransition
+from common.geo import calculate_distance  # Haversine, shared with restaurant-service
+
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///delivery_service.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+configure_database(app, 'delivery_service')  # URI & pool options from env, SQLite WAL pragmas
+app.json = FastJSONProvider(app)  # orjson-backed jsonify
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+init_read_replica(app, db, 'delivery_service')  # GET requests read from the replica
 
 # ========================
 #  DELIVERY SERVICE MODELS
 # ========================
+@computed('current_latitude', 'current_longitude')
+def current_location(obj):
+    """Serialized current_location of a Delivery or Courier"""
+    if obj.current_latitude and obj.current_longitude:
+        return {'latitude': obj.current_latitude, 'longitude': obj.current_longitude}
+    return None
+
 class Delivery(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, nullable=False, unique=True)
@@ -35,32 +54,13 @@ class Delivery(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)  # Soft delete timestamp
 
+    serializer = ModelSerializer(exclude=['current_latitude', 'current_longitude'], extra={
+        'current_location': current_location,
+        'is_deleted': is_deleted,
+    })
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'order_id': self.order_id,
-            'courier_id': self.courier_id,
-            'courier_name': self.courier_name,
-            'courier_phone': self.courier_phone,
-            'status': self.status,
-            'pickup_address': self.pickup_address,
-            'delivery_address': self.delivery_address,
-            'estimated_pickup_time': self.estimated_pickup_time.isoformat() if self.estimated_pickup_time else None,
-            'actual_pickup_time': self.actual_pickup_time.isoformat() if self.actual_pickup_time else None,
-            'estimated_delivery_time': self.estimated_delivery_time.isoformat() if self.estimated_delivery_time else None,
-            'actual_delivery_time': self.actual_delivery_time.isoformat() if self.actual_delivery_time else None,
-            'current_location': {
-                'latitude': self.current_latitude,
-                'longitude': self.current_longitude
-            } if self.current_latitude and self.current_longitude else None,
-            'delivery_fee': self.delivery_fee,
-            'notes': self.notes,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return Delivery.serializer.to_dict(self)
 
 class Courier(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -80,28 +80,13 @@ class Courier(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)
 
+    serializer = ModelSerializer(exclude=['current_latitude', 'current_longitude'], extra={
+        'current_location': current_location,
+        'is_deleted': is_deleted,
+    })
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'phone': self.phone,
-            'email': self.email,
-            'vehicle_type': self.vehicle_type,
-            'vehicle_number': self.vehicle_number,
-            'license_number': self.license_number,
-            'current_location': {
-                'latitude': self.current_latitude,
-                'longitude': self.current_longitude
-            } if self.current_latitude and self.current_longitude else None,
-            'status': self.status,
-            'rating': self.rating,
-            'total_deliveries': self.total_deliveries,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return Courier.serializer.to_dict(self)
 
 class DeliveryLocationHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -113,17 +98,10 @@ class DeliveryLocationHistory(db.Model):
     notes = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    serializer = ModelSerializer()
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'delivery_id': self.delivery_id,
-            'courier_id': self.courier_id,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'status': self.status,
-            'notes': self.notes,
-            'timestamp': self.timestamp.isoformat()
-        }
+        return DeliveryLocationHistory.serializer.to_dict(self)
 
 def create_tables():
     with app.app_context():
@@ -143,23 +121,39 @@ def create_tables():
             db.session.commit()
             print("✅ Sample couriers created")
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    distance = R * c
-    return distance
+# ========== DELIVERY STATE MACHINE ==========
+delivery_state_machine = StateMachine('delivery', {
+    'pending': ['assigned', 'failed'],
+    'assigned': ['assigned', 'picked_up', 'failed'],  # assigned -> assigned when re-assigning a courier
+    'picked_up': ['in_transit', 'delivered', 'failed'],
+    'in_transit': ['delivered', 'failed'],
+    'delivered': [],
+    'failed': ['pending']
+})
+
+@delivery_state_machine.guard()
+def _delivery_not_deleted(delivery, old_status, new_status, **context):
+    if delivery.deleted_at:
+        return "Cannot update deleted delivery"
+
+@delivery_state_machine.on_enter('picked_up')
+def _stamp_pickup_time(delivery, old_status, new_status, **context):
+    delivery.actual_pickup_time = datetime.utcnow()
+
+@delivery_state_machine.on_enter('delivered')
+def _stamp_delivery_time(delivery, old_status, new_status, **context):
+    delivery.actual_delivery_time = datetime.utcnow()
+
+@delivery_state_machine.on_enter('delivered')
+@delivery_state_machine.on_enter('failed')
+def _release_courier(delivery, old_status, new_status, **context):
+    if not delivery.courier_id:
+        return
+    courier = Courier.query.get(delivery.courier_id)
+    if courier and courier.status == 'busy':
+        courier.status = 'available'
+        if new_status == 'delivered':
+            courier.total_deliveries = (courier.total_deliveries or 0) + 1
 
 def generate_random_coordinates(center_lat=-6.2088, center_lng=106.8456, radius_km=10):
     """Generate random coordinates within a radius (Jakarta area)"""
@@ -231,22 +225,29 @@ def health_check():
 # ========== COURIER ENDPOINTS ==========
 @app.route('/api/couriers', methods=['GET'])
 def get_all_couriers():
-    """READ ALL - Get all couriers"""
+    """READ ALL - Get all couriers (?fields=id,name,status for a sparse list)"""
     try:
+        try:
+            fields = Courier.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         status_filter = request.args.get('status')
         include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
         
-        query = Courier.query
+        query = Courier.serializer.project(Courier.query, fields)
         if not include_deleted:
             query = query.filter_by(deleted_at=None)
         if status_filter:
             query = query.filter_by(status=status_filter)
             
+        cached = not_modified(list_validators(query, Courier))
+        if cached is not None:
+            return cached
         couriers = query.order_by(Courier.name).all()
         
         return jsonify({
             "success": True,
-            "data": [c.to_dict() for c in couriers],
+            "data": Courier.serializer.many(couriers, fields),
             "count": len(couriers)
         })
     except Exception as e:
@@ -254,15 +255,22 @@ def get_all_couriers():
 
 @app.route('/api/couriers/<int:id>', methods=['GET'])
 def get_courier(id):
-    """READ BY ID - Get single courier"""
+    """READ BY ID - Get single courier (optional ?fields=)"""
     try:
-        courier = Courier.query.get(id)
+        try:
+            fields = Courier.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        cached = not_modified(entity_validators(Courier, id))
+        if cached is not None:
+            return cached
+        courier = Courier.serializer.project(Courier.query, fields).get(id)
         if not courier or courier.deleted_at:
             return jsonify({"success": False, "error": "Courier not found"}), 404
             
         return jsonify({
             "success": True,
-            "data": courier.to_dict()
+            "data": Courier.serializer(courier, fields)
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -303,13 +311,21 @@ def create_courier():
 # ========== DELIVERY ENDPOINTS ==========
 @app.route('/api/deliveries', methods=['GET'])
 def get_all_deliveries():
-    """READ ALL - Get all deliveries"""
+    """READ ALL - Get all deliveries
+
+    ?fields=id,status,... returns a sparse list; ?stream=1 or
+    Accept: application/x-ndjson streams every row as NDJSON.
+    """
     try:
+        try:
+            fields = Delivery.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {"success": False, "error": str(e)}, 400
         include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
         status_filter = request.args.get('status')
         courier_filter = request.args.get('courier_id')
 
-        query = Delivery.query
+        query = Delivery.serializer.project(Delivery.query, fields)
         if not include_deleted:
             query = query.filter_by(deleted_at=None)
         if status_filter:
@@ -317,11 +333,18 @@ def get_all_deliveries():
         if courier_filter:
             query = query.filter_by(courier_id=courier_filter)
 
-        deliveries = query.order_by(Delivery.created_at.desc()).all()
+        query = query.order_by(Delivery.created_at.desc())
+        if wants_ndjson():
+            return ndjson_response(query, Delivery.serializer, fields)
+
+        cached = not_modified(list_validators(query, Delivery))
+        if cached is not None:
+            return cached
+        deliveries = query.all()
 
         return {
             "success": True,
-            "data": [d.to_dict() for d in deliveries],
+            "data": Delivery.serializer.many(deliveries, fields),
             "count": len(deliveries),
             "filters": {
                 "include_deleted": include_deleted,
@@ -334,9 +357,16 @@ def get_all_deliveries():
 
 @app.route('/api/deliveries/<int:id>', methods=['GET'])
 def get_delivery(id):
-    """READ BY ID - Get single delivery"""
+    """READ BY ID - Get single delivery (?fields= selects delivery fields)"""
     try:
-        delivery = Delivery.query.get(id)
+        try:
+            fields = Delivery.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {"success": False, "error": str(e)}, 400
+        cached = not_modified(entity_validators(Delivery, id))
+        if cached is not None:
+            return cached
+        delivery = Delivery.serializer.project(Delivery.query, fields).get(id)
         if not delivery:
             return {"success": False, "error": "Delivery not found"}, 404
 
@@ -349,8 +379,8 @@ def get_delivery(id):
         return {
             "success": True,
             "data": {
-                "delivery": delivery.to_dict(),
-                "location_history": [loc.to_dict() for loc in location_history]
+                "delivery": Delivery.serializer(delivery, fields),
+                "location_history": DeliveryLocationHistory.serializer.many(location_history)
             }
         }, 200
     except Exception as e:
@@ -421,13 +451,17 @@ def assign_courier(id):
         if courier.status == 'busy':
             return {"success": False, "error": "Courier is currently busy"}, 400
 
+        try:
+            delivery_state_machine.check(delivery, 'assigned')
+        except InvalidTransition as e:
+            return {"success": False, "error": str(e)}, 400
+
         # Update delivery
         delivery.courier_id = courier_id
         delivery.courier_name = courier.name
         delivery.courier_phone = courier.phone
-        delivery.status = 'assigned'
+        delivery_state_machine.transition(delivery, 'assigned')
         delivery.estimated_pickup_time = datetime.utcnow() + timedelta(minutes=15)
-        delivery.updated_at = datetime.utcnow()
 
         # Update courier status
         courier.status = 'busy'
@@ -474,11 +508,16 @@ def update_delivery_location(id):
         status = data.get('status')
         notes = data.get('notes', '')
 
+        # Status changes go through the state machine; repeating the current status is a plain location ping
+        if status and status != delivery.status:
+            try:
+                delivery_state_machine.transition(delivery, status)
+            except InvalidTransition as e:
+                return {"success": False, "error": str(e)}, 400
+
         # Update delivery location
         delivery.current_latitude = latitude
         delivery.current_longitude = longitude
-        if status:
-            delivery.status = status
         delivery.updated_at = datetime.utcnow()
 
         # Update courier location if courier is assigned
@@ -533,7 +572,7 @@ def track_delivery(order_id):
             "data": {
                 "delivery": delivery.to_dict(),
                 "courier": courier_info,
-                "tracking_history": [loc.to_dict() for loc in location_history],
+                "tracking_history": DeliveryLocationHistory.serializer.many(location_history),
                 "estimated_delivery_time": delivery.estimated_delivery_time.isoformat() if delivery.estimated_delivery_time else None
             }
         }, 200
@@ -599,6 +638,34 @@ def restore_delivery(id):
         db.session.rollback()
         return {"success": False, "error": str(e)}, 500
 
+# ========== EVENT BUS CONSUMERS ==========
+def handle_order_confirmed(payload):
+    """order.confirmed -> create the delivery for the order (idempotent)"""
+    with app.app_context():
+        if Delivery.query.filter_by(order_id=payload['order_id']).first():
+            return
+
+        estimated_delivery_time = None
+        if payload.get('estimated_delivery_time'):
+            estimated_delivery_time = datetime.fromisoformat(payload['estimated_delivery_time'])
+
+        db.session.add(Delivery(
+            order_id=payload['order_id'],
+            status='pending',
+            pickup_address=payload.get('pickup_address') or f"Restaurant #{payload.get('restaurant_id')}",
+            delivery_address=payload.get('delivery_address'),
+            estimated_delivery_time=estimated_delivery_time,
+            delivery_fee=payload.get('delivery_fee', 0.0),
+            notes=f"Auto-created from order {payload.get('order_number')}"
+        ))
+        db.session.commit()
+
+def start_event_workers():
+    """Consume order events from the event bus"""
+    EventBus().start_consumer('delivery-service', {'order.confirmed': handle_order_confirmed})
+
+ensure_event_workers = start_workers_once(app, start_event_workers)
+
 if __name__ == '__main__':
     create_tables()
     PORT = 5004  # aydin's Delivery Service
@@ -606,6 +673,7 @@ if __name__ == '__main__':
     print(f"📋 Available endpoints:")
     print(f"   POST   /api/deliveries               - Create new delivery")
     print(f"   GET    /api/deliveries               - Read all deliveries")
+    print(f"   GET    /api/deliveries?stream=1      - NDJSON export of all deliveries")
     print(f"   GET    /api/deliveries/<id>          - Read by ID with tracking")
     print(f"   POST   /api/deliveries/<id>/assign-courier - Assign courier")
     print(f"   POST   /api/deliveries/<id>/location - Update location")
@@ -614,4 +682,6 @@ if __name__ == '__main__':
     print(f"   POST   /api/couriers                 - Create courier")
     print(f"   DELETE /api/deliveries/<id>/soft-delete - Soft delete")
     print(f"   POST   /api/deliveries/<id>/restore  - Restore")
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':  # Start now in the reloader's serving process
+        ensure_event_workers()
     app.run(host='127.0.0.1', port=PORT, debug=True)
\ No newline at end of file
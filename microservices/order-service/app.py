@@ -1,17 +1,46 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, load_only
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 import os
+import sys
+import json
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.db_config import configure_database
+from common.read_replica import RoutingSession, init_read_replica
+from common.serialization import FastJSONProvider, ModelSerializer, is_deleted
+from common.conditional import entity_validators, list_validators, not_modified
+from common.streaming import ndjson_response, wants_ndjson
+from common.event_bus import EventBus, start_workers_once
+from common.outbox import start_outbox_relay
+from common.idempotency import idempotent
+from common.archive import ArchiveStore
+from common.state_machine import StateMachine, InvalidTransition
+from common.service_client import ServiceClient, ServiceUnavailable
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///order_service.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+configure_database(app, 'order_service')  # URI & pool options from env, SQLite WAL pragmas
+app.json = FastJSONProvider(app)  # orjson-backed jsonify
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+init_read_replica(app, db, 'order_service')  # GET requests read from the replica
+
+# Cold storage for delivered/cancelled and soft deleted orders past retention
+ORDER_ARCHIVE_RETENTION_DAYS = int(os.environ.get('ORDER_ARCHIVE_RETENTION_DAYS', 90))
+order_archive = ArchiveStore(os.environ.get('ORDER_ARCHIVE_DIR', os.path.join(app.instance_path, 'archive')), 'orders')
 
 # ========================
 #  ORDER SERVICE MODELS
 # ========================
 class Order(db.Model):
+    # Archived orders are deleted from this table; AUTOINCREMENT keeps SQLite
+    # from handing their ids (max(id) + 1) to new orders.
+    __table_args__ = {'sqlite_autoincrement': True}
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False)
     restaurant_id = db.Column(db.Integer, nullable=False)
@@ -28,27 +57,26 @@ class Order(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)  # Soft delete timestamp
 
+    # Read-only relationships used by the order detail endpoint (eager loaded in one query)
+    active_items = db.relationship(
+        'OrderItem',
+        primaryjoin='and_(Order.id == OrderItem.order_id, OrderItem.deleted_at.is_(None))',
+        viewonly=True
+    )
+    status_history = db.relationship(
+        'OrderStatusHistory',
+        order_by='OrderStatusHistory.created_at.desc()',
+        viewonly=True
+    )
+
+    serializer = ModelSerializer(extra={'is_deleted': is_deleted})
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'restaurant_id': self.restaurant_id,
-            'order_number': self.order_number,
-            'status': self.status,
-            'total_amount': self.total_amount,
-            'delivery_address': self.delivery_address,
-            'delivery_fee': self.delivery_fee,
-            'special_instructions': self.special_instructions,
-            'estimated_delivery_time': self.estimated_delivery_time.isoformat() if self.estimated_delivery_time else None,
-            'actual_delivery_time': self.actual_delivery_time.isoformat() if self.actual_delivery_time else None,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return Order.serializer.to_dict(self)
 
 class OrderItem(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}  # archived rows are deleted, see Order
+
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
     menu_item_id = db.Column(db.Integer, nullable=False)
@@ -61,23 +89,14 @@ class OrderItem(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)
 
+    serializer = ModelSerializer(extra={'is_deleted': is_deleted})
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'order_id': self.order_id,
-            'menu_item_id': self.menu_item_id,
-            'menu_item_name': self.menu_item_name,
-            'quantity': self.quantity,
-            'unit_price': self.unit_price,
-            'total_price': self.total_price,
-            'special_requests': self.special_requests,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return OrderItem.serializer.to_dict(self)
 
 class OrderStatusHistory(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}  # archived rows are deleted, see Order
+
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
     old_status = db.Column(db.String(20), nullable=True)
@@ -86,22 +105,509 @@ class OrderStatusHistory(db.Model):
     updated_by = db.Column(db.Integer, nullable=True)  # User ID who made the change
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    serializer = ModelSerializer()
+
+    def to_dict(self):
+        return OrderStatusHistory.serializer.to_dict(self)
+
+class OutboxEvent(db.Model):
+    """Transactional outbox - written in the same commit as the order change"""
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(50), nullable=False)  # order.created, order.confirmed, order.status_changed, ...
+    aggregate_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON string
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    published_at = db.Column(db.DateTime, nullable=True, index=True)
+
+class ArchivedOrder(db.Model):
+    """Hot-side index of archived orders: which archive partition holds each order"""
+    order_id = db.Column(db.Integer, primary_key=True)
+    order_number = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    partition = db.Column(db.String(7), nullable=False, index=True)  # YYYY-MM of order creation
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
     def to_dict(self):
         return {
-            'id': self.id,
             'order_id': self.order_id,
-            'old_status': self.old_status,
-            'new_status': self.new_status,
-            'notes': self.notes,
-            'updated_by': self.updated_by,
-            'created_at': self.created_at.isoformat()
+            'order_number': self.order_number,
+            'user_id': self.user_id,
+            'restaurant_id': self.restaurant_id,
+            'status': self.status,
+            'partition': self.partition,
+            'archived_at': self.archived_at.isoformat()
         }
 
+class IdempotencyKey(db.Model):
+    """Stored responses for requests sent with an Idempotency-Key header"""
+    scope = db.Column(db.String(50), primary_key=True)  # e.g. 'POST /api/orders'
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)  # sha256 of the request body
+    status = db.Column(db.String(20), default='processing')  # processing, completed
+    response_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# ========== MATERIALIZED ORDER STATS ==========
+class OrderStatusCount(db.Model):
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class RestaurantDailyRevenue(db.Model):
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    def to_dict(self):
+        return {
+            'restaurant_id': self.restaurant_id,
+            'day': self.day.isoformat(),
+            'order_count': self.order_count,
+            'revenue': self.revenue
+        }
+
+class OrderDeliveryStats(db.Model):
+    id = db.Column(db.Integer, primary_key=True)  # Single row (id=1)
+    delivered_count = db.Column(db.Integer, nullable=False, default=0)
+    total_prep_to_delivery_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
 def create_tables():
     with app.app_context():
         db.create_all()
         print("✅ Order Service tables created")
 
+# Sections of the order detail document that can be requested with ?fields=
+ORDER_DETAIL_SECTIONS = ('items', 'status_history')
+
+def parse_order_detail_fields(fields_param):
+    """Split ?fields= into order fields and detail sections.
+
+    Returns (columns, sections). columns is None when the full order is wanted.
+    Raises ValueError for unknown field names.
+    """
+    if not fields_param:
+        return None, set(ORDER_DETAIL_SECTIONS)
+
+    names = [f.strip() for f in fields_param.split(',') if f.strip()]
+    sections = {name for name in names if name in ORDER_DETAIL_SECTIONS}
+    columns = [name for name in names if name not in ORDER_DETAIL_SECTIONS]
+    if not columns:
+        return None, sections
+    return Order.serializer.parse_fields(','.join(columns)), sections
+
+def _bump_stats_row(model, key, **deltas):
+    """Add deltas to an aggregate row, creating it when missing.
+
+    Uses `UPDATE ... SET col = col + delta` so concurrent transactions
+    never overwrite each other's increments. The INSERT for a missing row
+    runs in a savepoint: when another transaction created the same row
+    first (the unique key fails), the UPDATE is retried against it.
+    """
+    increment = db.update(model).filter_by(**key).values(
+        {column: getattr(model, column) + delta for column, delta in deltas.items()}
+    )
+    if db.session.execute(increment).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**key, **deltas))
+    except IntegrityError:
+        db.session.execute(increment)
+
+def prep_to_delivery_seconds(order, prep_started_at=None):
+    """Seconds between an order entering 'preparing' (or creation) and delivery
+
+    prep_started_at: optional {order_id: datetime} preloaded for bulk updates.
+    """
+    if not order.actual_delivery_time:
+        return None
+    if prep_started_at is not None:
+        started = prep_started_at.get(order.id)
+    else:
+        started = db.session.query(db.func.min(OrderStatusHistory.created_at)).filter(
+            OrderStatusHistory.order_id == order.id,
+            OrderStatusHistory.new_status == 'preparing'
+        ).scalar()
+    return (order.actual_delivery_time - (started or order.created_at)).total_seconds()
+
+def order_stats_deltas(order, sign=1, prep_started_at=None):
+    """(model, key, deltas) rows for adding (sign=1) or removing (sign=-1) an
+    order's contribution to the stats tables. Soft deleted orders do not contribute.
+    """
+    if order.deleted_at:
+        return []
+
+    rows = [(OrderStatusCount, {'status': order.status}, {'count': sign})]
+
+    if order.status != 'cancelled':
+        created_at = order.created_at or datetime.utcnow()
+        rows.append((
+            RestaurantDailyRevenue,
+            {'restaurant_id': order.restaurant_id, 'day': created_at.date()},
+            {'order_count': sign, 'revenue': sign * order.total_amount}
+        ))
+
+    if order.status == 'delivered':
+        seconds = prep_to_delivery_seconds(order, prep_started_at)
+        if seconds is not None:
+            rows.append((
+                OrderDeliveryStats, {'id': 1},
+                {'delivered_count': sign, 'total_prep_to_delivery_seconds': sign * seconds}
+            ))
+    return rows
+
+def apply_stats_deltas(rows):
+    """Merge delta rows per aggregate key and write each key once"""
+    merged = {}
+    for model, key, deltas in rows:
+        _, _, total = merged.setdefault((model, tuple(sorted(key.items()))), (model, key, {}))
+        for column, delta in deltas.items():
+            total[column] = total.get(column, 0) + delta
+    for model, key, deltas in merged.values():
+        if any(deltas.values()):
+            _bump_stats_row(model, key, **deltas)
+
+def apply_order_stats(order, sign=1):
+    """Add (sign=1) or remove (sign=-1) an order's contribution to the stats tables.
+
+    Must be called in the same session/transaction as the order change:
+    remove the old contribution, mutate the order, then add the new one.
+    """
+    apply_stats_deltas(order_stats_deltas(order, sign))
+
+def archived_order_stats_deltas(document, sign=1):
+    """order_stats_deltas() for an archived order document ({order, items, status_history})"""
+    data = document['order']
+    values = {}
+    for column in Order.__table__.columns:
+        value = data.get(column.key)
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        values[column.key] = value
+    order = SimpleNamespace(**values)
+    started = min((datetime.fromisoformat(h['created_at']) for h in document.get('status_history', [])
+                   if h.get('new_status') == 'preparing' and h.get('created_at')), default=None)
+    return order_stats_deltas(order, sign, prep_started_at={order.id: started})
+
+def rebuild_order_stats():
+    """Recompute all aggregate tables from the orders (hot and archived) and their status history"""
+    OrderStatusCount.query.delete()
+    RestaurantDailyRevenue.query.delete()
+    OrderDeliveryStats.query.delete()
+    db.session.flush()
+
+    for order in Order.query.filter_by(deleted_at=None).yield_per(500):
+        apply_order_stats(order)
+        db.session.flush()
+
+    # Archived orders keep counting; only ids in the ArchivedOrder index are
+    # archived for good (a crashed run may have left copies of hot orders)
+    for partition in order_archive.partitions():
+        archived_ids = {order_id for (order_id,) in
+                        db.session.query(ArchivedOrder.order_id).filter_by(partition=partition)}
+        rows = []
+        for order_id, document in order_archive.iter_documents(partition):
+            if order_id in archived_ids:
+                rows.extend(archived_order_stats_deltas(document))
+        apply_stats_deltas(rows)
+        db.session.flush()
+
+    db.session.commit()
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute order stats from history: flask --app app rebuild-stats"""
+    rebuild_order_stats()
+    print("✅ Order stats rebuilt")
+
+def add_outbox_event(topic, order, **extra):
+    """Queue an event for the outbox relay in the current transaction"""
+    payload = {
+        'order_id': order.id,
+        'order_number': order.order_number,
+        'user_id': order.user_id,
+        'restaurant_id': order.restaurant_id,
+        'status': order.status,
+        'total_amount': order.total_amount,
+        'delivery_address': order.delivery_address,
+        'delivery_fee': order.delivery_fee,
+        'estimated_delivery_time': order.estimated_delivery_time.isoformat() if order.estimated_delivery_time else None,
+        'actual_delivery_time': order.actual_delivery_time.isoformat() if order.actual_delivery_time else None,
+        **extra
+    }
+    db.session.add(OutboxEvent(topic=topic, aggregate_id=order.id, payload=json.dumps(payload)))
+
+# ========== ORDER STATE MACHINE ==========
+order_state_machine = StateMachine('order', {
+    'pending': ['confirmed', 'cancelled'],
+    'confirmed': ['preparing', 'cancelled'],
+    'preparing': ['ready', 'cancelled'],
+    'ready': ['delivered', 'cancelled'],
+    'delivered': [],
+    'cancelled': []
+})
+
+@order_state_machine.guard()
+def _order_not_deleted(order, old_status, new_status, **context):
+    if order.deleted_at:
+        return "Cannot update deleted order"
+
+@order_state_machine.on_enter('delivered')
+def _stamp_actual_delivery_time(order, old_status, new_status, **context):
+    order.actual_delivery_time = datetime.utcnow()
+
+def add_status_events(order, old_status, new_status):
+    """Outbox events published for one status transition"""
+    add_outbox_event('order.status_changed', order, old_status=old_status)
+    if new_status in ('confirmed', 'delivered', 'cancelled'):
+        add_outbox_event(f'order.{new_status}', order, old_status=old_status)
+
+def change_order_status(order, new_status, notes='', updated_by=None):
+    """Move an order to new_status with history, stats and outbox events (no commit).
+
+    Raises InvalidTransition when the state machine does not allow it.
+    """
+    order_state_machine.check(order, new_status)
+    stats_rows = order_stats_deltas(order, -1)
+
+    old_status = order_state_machine.transition(order, new_status)
+
+    # Create status history
+    status_history = OrderStatusHistory(
+        order_id=order.id,
+        old_status=old_status,
+        new_status=new_status,
+        notes=notes,
+        updated_by=updated_by
+    )
+    db.session.add(status_history)
+
+    apply_stats_deltas(stats_rows + order_stats_deltas(order))
+    add_status_events(order, old_status, new_status)
+
+    return old_status
+
+def bulk_change_order_status(ids, new_status, notes='', updated_by=None):
+    """Apply one transition to many orders with a single UPDATE (no commit).
+
+    Orders that are deleted or cannot reach new_status are skipped.
+    Returns the list of orders that changed.
+    """
+    if new_status not in order_state_machine.states:
+        raise InvalidTransition(f"Invalid order status '{new_status}'")
+
+    orders = Order.query.filter(
+        Order.id.in_(ids),
+        Order.status.in_(order_state_machine.sources(new_status)),
+        Order.deleted_at.is_(None)
+    ).with_for_update().all()
+    if not orders:
+        return []
+
+    old_statuses = {order.id: order.status for order in orders}
+    stats_rows = [row for order in orders for row in order_stats_deltas(order, -1)]
+
+    now = datetime.utcnow()
+    values = {'updated_at': now}
+    if new_status == 'delivered':
+        values['actual_delivery_time'] = now
+    order_state_machine.bulk_transition(db.session, Order, list(old_statuses), new_status, values)
+
+    prep_started_at = None
+    if new_status == 'delivered':
+        prep_started_at = dict(db.session.query(OrderStatusHistory.order_id, db.func.min(OrderStatusHistory.created_at))
+                               .filter(OrderStatusHistory.order_id.in_(list(old_statuses)),
+                                       OrderStatusHistory.new_status == 'preparing')
+                               .group_by(OrderStatusHistory.order_id).all())
+
+    db.session.add_all([
+        OrderStatusHistory(order_id=order.id, old_status=old_statuses[order.id], new_status=new_status,
+                           notes=notes, updated_by=updated_by)
+        for order in orders
+    ])
+    for order in orders:
+        stats_rows.extend(order_stats_deltas(order, 1, prep_started_at))
+        add_status_events(order, old_statuses[order.id], new_status)
+    apply_stats_deltas(stats_rows)
+
+    return orders
+
+# ========== ORDER ARCHIVE (COLD STORAGE) ==========
+def archive_orders(retention_days=None, batch_size=500):
+    """Move finished or soft deleted orders older than the retention age to the archive.
+
+    Each order is stored with its items and status history as one document
+    in the archive partition of the month it was created. The hot rows are
+    removed afterwards, so a crash in between only leaves a duplicate that
+    the next run overwrites. Archived orders keep their place in the stats.
+    """
+    retention_days = ORDER_ARCHIVE_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    archived = 0
+
+    while True:
+        orders = Order.query.filter(db.or_(
+            Order.deleted_at < cutoff,
+            db.and_(Order.status.in_(['delivered', 'cancelled']), Order.updated_at < cutoff)
+        )).order_by(Order.id).limit(batch_size).all()
+        if not orders:
+            break
+
+        order_ids = [order.id for order in orders]
+        items_by_order, history_by_order = {}, {}
+        for item in OrderItem.query.filter(OrderItem.order_id.in_(order_ids)):
+            items_by_order.setdefault(item.order_id, []).append(item.to_dict())
+        for history in OrderStatusHistory.query.filter(OrderStatusHistory.order_id.in_(order_ids)) \
+                .order_by(OrderStatusHistory.created_at.desc()):
+            history_by_order.setdefault(history.order_id, []).append(history.to_dict())
+
+        documents_by_partition = {}
+        for order in orders:
+            partition = order.created_at.strftime('%Y-%m')
+            documents_by_partition.setdefault(partition, []).append((order.id, {
+                "order": order.to_dict(),
+                "items": items_by_order.get(order.id, []),
+                "status_history": history_by_order.get(order.id, [])
+            }))
+            db.session.merge(ArchivedOrder(
+                order_id=order.id,
+                order_number=order.order_number,
+                user_id=order.user_id,
+                restaurant_id=order.restaurant_id,
+                status=order.status,
+                partition=partition
+            ))
+
+        for partition, documents in documents_by_partition.items():
+            order_archive.put_many(partition, documents)
+
+        OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+        OrderStatusHistory.query.filter(OrderStatusHistory.order_id.in_(order_ids)).delete(synchronize_session=False)
+        Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        archived += len(orders)
+
+    return archived
+
+def get_archived_order(order_id):
+    """Archived order document ({order, items, status_history}) or None"""
+    entry = db.session.get(ArchivedOrder, order_id)
+    if not entry:
+        return None
+    return order_archive.get(entry.partition, order_id)
+
+def drop_archive_partition(partition):
+    """Permanently delete a whole archive partition (cheap file removal)"""
+    dropped = order_archive.drop_partition(partition)
+    count = ArchivedOrder.query.filter_by(partition=partition).delete()
+    db.session.commit()
+    return dropped, count
+
+@app.cli.command('archive-orders')
+def archive_orders_command():
+    """Archive old orders: flask --app app archive-orders"""
+    count = archive_orders()
+    print(f"✅ {count} orders archived")
+
+# ========== ORDER EVENTS (LONG-POLL / SSE) ==========
+# Status transitions are already stored in OrderStatusHistory; the history id
+# doubles as the event cursor. Writers notify waiting requests in this process,
+# other workers pick the change up on the next poll tick.
+ORDER_EVENTS_MAX_WAIT = 25  # seconds, below the gateway's 30s proxy timeout
+ORDER_EVENTS_POLL_INTERVAL = 1.0
+order_events_condition = threading.Condition()
+
+def notify_order_events():
+    """Wake up requests waiting for order status events"""
+    with order_events_condition:
+        order_events_condition.notify_all()
+
+def fetch_order_events(order_id, since):
+    """Status history rows for an order newer than the `since` cursor"""
+    return OrderStatusHistory.query.filter(
+        OrderStatusHistory.order_id == order_id,
+        OrderStatusHistory.id > since
+    ).order_by(OrderStatusHistory.id.asc()).all()
+
+def wait_for_order_events(order_id, since, timeout):
+    """Block until new events exist for the order or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    while True:
+        events = fetch_order_events(order_id, since)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            return events
+        # End the read transaction so the next poll sees new commits
+        db.session.rollback()
+        with order_events_condition:
+            order_events_condition.wait(min(ORDER_EVENTS_POLL_INTERVAL, remaining))
+
+# ========== MENU PRICE CHECK ==========
+# Orders are priced from restaurant-service, never from the client: one
+# batched lookup per order over a pooled connection, with a short-lived
+# local cache of available items (MENU_PRICE_CACHE_TTL seconds).
+ORDER_PRICE_CHECK = os.environ.get('ORDER_PRICE_CHECK', 'true').lower() == 'true'
+MENU_PRICE_CACHE_TTL = float(os.environ.get('MENU_PRICE_CACHE_TTL', 5))
+MENU_PRICE_CACHE_MAX_ENTRIES = 10000
+restaurant_service = ServiceClient(os.environ.get('RESTAURANT_SERVICE_URL', 'http://localhost:5002'))
+_menu_price_cache = {}  # menu item id -> (expires_at, item)
+_menu_price_cache_lock = threading.Lock()
+
+class MenuItemUnavailable(ValueError):
+    pass
+
+def lookup_menu_items(ids):
+    """{id: {restaurant_id, name, price, is_available, is_active}}; cache misses cost one lookup call"""
+    now = time.monotonic()
+    found, missing = {}, []
+    for id in dict.fromkeys(ids):
+        cached = _menu_price_cache.get(id)
+        if cached is not None and cached[0] > now:
+            found[id] = cached[1]
+        else:
+            missing.append(id)
+    if not missing:
+        return found
+
+    body = restaurant_service.post_json('/api/menu-items/lookup', {'ids': missing})
+    if not body.get('success'):
+        raise ValueError(body.get('error') or "Menu lookup failed")
+    expires_at = now + MENU_PRICE_CACHE_TTL
+    with _menu_price_cache_lock:
+        if len(_menu_price_cache) + len(body['data']) > MENU_PRICE_CACHE_MAX_ENTRIES:
+            _menu_price_cache.clear()
+        for item in body['data']:
+            found[item['id']] = item
+            if item['is_available'] is not False and item['is_active'] is not False:
+                _menu_price_cache[item['id']] = (expires_at, item)  # Unavailable items are re-checked
+    return found
+
+def price_order_items(restaurant_id, items):
+    """Set menu_item_name and unit_price of each order item from restaurant-service.
+
+    Raises ValueError for unknown items or items of another restaurant,
+    MenuItemUnavailable, or ServiceUnavailable when the lookup fails.
+    """
+    try:
+        restaurant_id = int(restaurant_id)
+        ids = [int(item['menu_item_id']) for item in items]
+    except (TypeError, ValueError):
+        raise ValueError("restaurant_id and menu_item_id must be integers")
+    menu = lookup_menu_items(ids)
+    for id, item in zip(ids, items):
+        menu_item = menu.get(id)
+        if menu_item is None or menu_item['restaurant_id'] != restaurant_id:
+            raise ValueError(f"Menu item {id} not found in restaurant {restaurant_id}")
+        if menu_item['is_available'] is False or menu_item['is_active'] is False:
+            raise MenuItemUnavailable(f"{menu_item['name']} is not available")
+        item['menu_item_id'] = id
+        item['menu_item_name'] = menu_item['name']
+        item['unit_price'] = menu_item['price']
+
 def generate_order_number():
     """Generate unique order number"""
     timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
@@ -124,12 +630,17 @@ def home():
             "api": "/api/orders",
             "items": "/api/order-items",
             "status": "/api/status-history",
+            "stats": "GET /api/orders/stats",
+            "events": "GET /api/orders/<id>/events?since=<event_id>",
+            "archive": "GET|POST /api/orders/archive",
+            "drop_archive_partition": "DELETE /api/orders/archive/<YYYY-MM>",
             "create": "POST /api/orders",
             "read_all": "GET /api/orders",
             "read_one": "GET /api/orders/<id>",
             "update": "PUT /api/orders/<id>",
             "patch": "PATCH /api/orders/<id>",
             "status_update": "PATCH /api/orders/<id>/status",
+            "bulk_status": "PATCH /api/orders/bulk-status",
             "soft_delete": "DELETE /api/orders/<id>/soft-delete",
             "hard_delete": "DELETE /api/orders/<id>",
             "restore": "POST /api/orders/<id>/restore",
@@ -149,14 +660,22 @@ def health_check():
 # ========== ORDER ENDPOINTS ==========
 @app.route('/api/orders', methods=['GET'])
 def get_all_orders():
-    """READ ALL - Get all orders"""
+    """READ ALL - Get all orders
+
+    ?fields=id,status,total_amount returns a sparse list; ?stream=1 or
+    Accept: application/x-ndjson streams every row as NDJSON.
+    """
     try:
+        try:
+            fields = Order.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {"success": False, "error": str(e)}, 400
         include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
         status_filter = request.args.get('status')
         user_filter = request.args.get('user_id')
         restaurant_filter = request.args.get('restaurant_id')
 
-        query = Order.query
+        query = Order.serializer.project(Order.query, fields)
         if not include_deleted:
             query = query.filter_by(deleted_at=None)
 
@@ -167,11 +686,18 @@ def get_all_orders():
         if restaurant_filter:
             query = query.filter_by(restaurant_id=restaurant_filter)
 
-        orders = query.order_by(Order.created_at.desc()).all()
+        query = query.order_by(Order.created_at.desc())
+        if wants_ndjson():
+            return ndjson_response(query, Order.serializer, fields)
+
+        cached = not_modified(list_validators(query, Order))
+        if cached is not None:
+            return cached
+        orders = query.all()
 
         return {
             "success": True,
-            "data": [o.to_dict() for o in orders],
+            "data": Order.serializer.many(orders, fields),
             "count": len(orders),
             "filters": {
                 "include_deleted": include_deleted,
@@ -183,35 +709,147 @@ def get_all_orders():
     except Exception as e:
         return {"success": False, "error": str(e)}, 500
 
+@app.route('/api/orders/stats', methods=['GET'])
+def get_order_stats():
+    """STATS - Dashboard aggregates maintained on every order write"""
+    try:
+        days = request.args.get('days', 7, type=int)
+        restaurant_filter = request.args.get('restaurant_id', type=int)
+
+        status_counts = {row.status: row.count for row in OrderStatusCount.query.all() if row.count}
+
+        revenue_query = RestaurantDailyRevenue.query.filter(
+            RestaurantDailyRevenue.day >= (datetime.utcnow() - timedelta(days=days)).date()
+        )
+        if restaurant_filter:
+            revenue_query = revenue_query.filter_by(restaurant_id=restaurant_filter)
+        revenue = revenue_query.order_by(RestaurantDailyRevenue.day.desc(),
+                                         RestaurantDailyRevenue.restaurant_id).all()
+
+        delivery_stats = db.session.get(OrderDeliveryStats, 1)
+        avg_prep_to_delivery = None
+        if delivery_stats and delivery_stats.delivered_count:
+            avg_prep_to_delivery = delivery_stats.total_prep_to_delivery_seconds / delivery_stats.delivered_count
+
+        return {
+            "success": True,
+            "data": {
+                "total_orders": sum(status_counts.values()),
+                "status_counts": status_counts,
+                "revenue_by_restaurant_day": [r.to_dict() for r in revenue],
+                "avg_prep_to_delivery_seconds": avg_prep_to_delivery
+            },
+            "filters": {
+                "days": days,
+                "restaurant_id": restaurant_filter
+            }
+        }, 200
+    except Exception as e:
+        return {"success": False, "error": str(e)}, 500
+
 @app.route('/api/orders/<int:id>', methods=['GET'])
 def get_order(id):
-    """READ BY ID - Get single order"""
+    """READ BY ID - Get single order with items & history in one query
+
+    Optional ?fields= selects order columns and/or the 'items' and
+    'status_history' sections, e.g. ?fields=status skips items and history.
+    """
     try:
-        order = Order.query.get(id)
+        try:
+            columns, sections = parse_order_detail_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {"success": False, "error": str(e)}, 400
+
+        cached = not_modified(entity_validators(Order, id))
+        if cached is not None:
+            return cached
+        query = Order.serializer.project(Order.query, columns)
+        if 'items' in sections:
+            query = query.options(joinedload(Order.active_items))
+        if 'status_history' in sections:
+            query = query.options(joinedload(Order.status_history))
+
+        order = query.filter(Order.id == id).first()
         if not order:
-            return {"success": False, "error": "Order not found"}, 404
+            # Fall through to cold storage
+            document = get_archived_order(id)
+            if not document:
+                return {"success": False, "error": "Order not found"}, 404
+            order_data = document["order"]
+            if order_data.get("deleted_at") and not request.args.get('include_deleted', 'false').lower() == 'true':
+                return {"success": False, "error": "Order not found"}, 404
+            result = {
+                "order": order_data if columns is None else {c: order_data.get(c) for c in columns}
+            }
+            for section in sections:
+                result[section] = document[section]
+            return {
+                "success": True,
+                "data": result,
+                "archived": True
+            }, 200
 
         if order.deleted_at and not request.args.get('include_deleted', 'false').lower() == 'true':
             return {"success": False, "error": "Order not found"}, 404
 
-        # Get order items
-        order_items = OrderItem.query.filter_by(order_id=id, deleted_at=None).all()
+        result = {
+            "order": Order.serializer(order, columns)
+        }
+        if 'items' in sections:
+            result["items"] = OrderItem.serializer.many(order.active_items)
+        if 'status_history' in sections:
+            result["status_history"] = OrderStatusHistory.serializer.many(order.status_history)
+
+        return {
+            "success": True,
+            "data": result
+        }, 200
+    except Exception as e:
+        return {"success": False, "error": str(e)}, 500
+
+@app.route('/api/orders/<int:id>/events', methods=['GET'])
+def get_order_events(id):
+    """EVENTS - Long-poll (or SSE) stream of status changes after ?since=<event id>
+
+    Returns immediately when newer events exist, otherwise waits up to
+    ?timeout= seconds. Send `Accept: text/event-stream` for an SSE stream.
+    """
+    try:
+        since = request.args.get('since', 0, type=int)
+        timeout = min(request.args.get('timeout', ORDER_EVENTS_MAX_WAIT, type=float), ORDER_EVENTS_MAX_WAIT)
 
-        # Get status history
-        status_history = OrderStatusHistory.query.filter_by(order_id=id).order_by(OrderStatusHistory.created_at.desc()).all()
+        order = db.session.get(Order, id, options=[load_only(Order.id, Order.status, Order.deleted_at)])
+        if not order or order.deleted_at:
+            return {"success": False, "error": "Order not found"}, 404
 
+        if request.accept_mimetypes.best == 'text/event-stream':
+            @stream_with_context
+            def event_stream():
+                cursor = since
+                while True:
+                    events = wait_for_order_events(id, cursor, ORDER_EVENTS_MAX_WAIT)
+                    if not events:
+                        yield ": keep-alive\n\n"
+                        continue
+                    for event in events:
+                        cursor = event.id
+                        yield f"id: {event.id}\nevent: status\ndata: {json.dumps(event.to_dict())}\n\n"
+
+            return Response(event_stream(), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        events = wait_for_order_events(id, since, max(timeout, 0))
         return {
             "success": True,
-            "data": {
-                "order": order.to_dict(),
-                "items": [item.to_dict() for item in order_items],
-                "status_history": [history.to_dict() for history in status_history]
-            }
+            "data": OrderStatusHistory.serializer.many(events),
+            "count": len(events),
+            "cursor": events[-1].id if events else since
         }, 200
     except Exception as e:
         return {"success": False, "error": str(e)}, 500
 
 @app.route('/api/orders', methods=['POST'])
+@idempotent(db, IdempotencyKey, 'POST /api/orders')
 def create_order():
     """CREATE - Create new order"""
     try:
@@ -232,11 +870,27 @@ def create_order():
         if not items:
             return {"success": False, "error": "At least one item is required"}, 400
 
+        for item in items:
+            quantity = item.get('quantity')
+            if not item.get('menu_item_id') or isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+                return {"success": False, "error": "Each item requires menu_item_id and a positive integer quantity"}, 400
+            if not ORDER_PRICE_CHECK and not item.get('unit_price'):
+                return {"success": False, "error": "Each item requires menu_item_id, quantity, and unit_price"}, 400
+
+        # Prices and names come from restaurant-service (client values are ignored)
+        if ORDER_PRICE_CHECK:
+            try:
+                price_order_items(restaurant_id, items)
+            except MenuItemUnavailable as e:
+                return {"success": False, "error": str(e)}, 409
+            except ValueError as e:
+                return {"success": False, "error": str(e)}, 400
+            except ServiceUnavailable as e:
+                return {"success": False, "error": f"Cannot verify menu prices: {e}"}, 503
+
         # Calculate total amount
         total_amount = 0
         for item in items:
-            if not item.get('menu_item_id') or not item.get('quantity') or not item.get('unit_price'):
-                return {"success": False, "error": "Each item requires menu_item_id, quantity, and unit_price"}, 400
             total_amount += item.get('quantity') * item.get('unit_price')
 
         # Calculate delivery fee (simple logic: free delivery for orders > 50000)
@@ -284,7 +938,11 @@ def create_order():
         )
         db.session.add(status_history)
 
+        apply_order_stats(new_order)
+        add_outbox_event('order.created', new_order)
+
         db.session.commit()
+        notify_order_events()
 
         return {
             "success": True,
@@ -314,34 +972,95 @@ def update_order_status(id):
         notes = data.get('notes', '')
         updated_by = data.get('updated_by')
 
-        valid_statuses = ['pending', 'confirmed', 'preparing', 'ready', 'delivered', 'cancelled']
-        if new_status not in valid_statuses:
-            return {"success": False, "error": f"Invalid status. Must be one of: {', '.join(valid_statuses)}"}, 400
+        try:
+            old_status = change_order_status(order, new_status, notes, updated_by)
+        except InvalidTransition as e:
+            return {"success": False, "error": str(e)}, 400
 
-        old_status = order.status
-        order.status = new_status
-        order.updated_at = datetime.utcnow()
+        db.session.commit()
+        notify_order_events()
 
-        # Set actual delivery time when status becomes 'delivered'
-        if new_status == 'delivered':
-            order.actual_delivery_time = datetime.utcnow()
+        return {
+            "success": True,
+            "data": order.to_dict(),
+            "message": f"Order status updated from '{old_status}' to '{new_status}'"
+        }, 200
+    except Exception as e:
+        db.session.rollback()
+        return {"success": False, "error": str(e)}, 500
 
-        # Create status history
-        status_history = OrderStatusHistory(
-            order_id=order.id,
-            old_status=old_status,
-            new_status=new_status,
-            notes=notes,
-            updated_by=updated_by
-        )
-        db.session.add(status_history)
+# ========== ARCHIVE OPERATIONS ==========
+@app.route('/api/orders/archive', methods=['GET'])
+def get_archive_partitions():
+    """ARCHIVE - List archive partitions with their order counts"""
+    try:
+        counts = dict(db.session.query(ArchivedOrder.partition, db.func.count(ArchivedOrder.order_id))
+                      .group_by(ArchivedOrder.partition).all())
+        return {
+            "success": True,
+            "data": [{"partition": p, "count": counts.get(p, 0)} for p in order_archive.partitions()],
+            "retention_days": ORDER_ARCHIVE_RETENTION_DAYS
+        }, 200
+    except Exception as e:
+        return {"success": False, "error": str(e)}, 500
+
+@app.route('/api/orders/archive', methods=['POST'])
+def run_order_archive():
+    """ARCHIVE - Move orders past the retention age into cold storage"""
+    try:
+        data = request.get_json(silent=True) or {}
+        count = archive_orders(data.get('retention_days'))
+        return {
+            "success": True,
+            "archived_count": count,
+            "message": f"{count} orders archived"
+        }, 200
+    except Exception as e:
+        db.session.rollback()
+        return {"success": False, "error": str(e)}, 500
+
+@app.route('/api/orders/archive/<partition>', methods=['DELETE'])
+def drop_order_archive_partition(partition):
+    """ARCHIVE - Permanently drop a whole archive partition (YYYY-MM)"""
+    try:
+        dropped, count = drop_archive_partition(partition)
+        if not dropped and not count:
+            return {"success": False, "error": "Archive partition not found"}, 404
+        return {
+            "success": True,
+            "deleted_count": count,
+            "message": f"Archive partition {partition} dropped"
+        }, 200
+    except ValueError as e:
+        return {"success": False, "error": str(e)}, 400
+    except Exception as e:
+        db.session.rollback()
+        return {"success": False, "error": str(e)}, 500
+
+@app.route('/api/orders/bulk-status', methods=['PATCH'])
+def bulk_update_order_status():
+    """BULK STATUS - Apply one status transition to many orders"""
+    try:
+        data = request.get_json()
+        if not data or not data.get('ids') or not data.get('status'):
+            return {"success": False, "error": "IDs array and status are required"}, 400
+
+        ids = data['ids']
+        try:
+            orders = bulk_change_order_status(ids, data['status'], data.get('notes', ''), data.get('updated_by'))
+        except InvalidTransition as e:
+            return {"success": False, "error": str(e)}, 400
 
         db.session.commit()
+        notify_order_events()
 
+        updated_ids = [order.id for order in orders]
         return {
             "success": True,
-            "data": order.to_dict(),
-            "message": f"Order status updated from '{old_status}' to '{new_status}'"
+            "message": f"{len(updated_ids)} orders updated to '{data['status']}'",
+            "updated_count": len(updated_ids),
+            "updated_ids": updated_ids,
+            "skipped_ids": [i for i in ids if i not in set(updated_ids)]
         }, 200
     except Exception as e:
         db.session.rollback()
@@ -359,6 +1078,7 @@ def soft_delete_order(id):
         if order.deleted_at:
             return {"success": False, "error": "Order already deleted"}, 400
 
+        apply_order_stats(order, -1)
         order.deleted_at = datetime.utcnow()
         order.is_active = False
         order.updated_at = datetime.utcnow()
@@ -385,7 +1105,21 @@ def hard_delete_order(id):
     try:
         order = Order.query.get(id)
         if not order:
-            return {"success": False, "error": "Order not found"}, 404
+            entry = db.session.get(ArchivedOrder, id)
+            if not entry:
+                return {"success": False, "error": "Order not found"}, 404
+            document = order_archive.get(entry.partition, id)
+            if document:
+                apply_stats_deltas(archived_order_stats_deltas(document, -1))
+            order_archive.delete(entry.partition, id)
+            db.session.delete(entry)
+            db.session.commit()
+            return {
+                "success": True,
+                "message": "Archived order permanently deleted"
+            }, 200
+
+        apply_order_stats(order, -1)
 
         # Delete associated items and status history
         OrderItem.query.filter_by(order_id=id).delete()
@@ -416,6 +1150,7 @@ def restore_order(id):
         order.deleted_at = None
         order.is_active = True
         order.updated_at = datetime.utcnow()
+        apply_order_stats(order)
 
         # Restore all order items
         order_items = OrderItem.query.filter_by(order_id=id).all()
@@ -447,6 +1182,7 @@ def bulk_soft_delete_orders():
         deleted_count = 0
         for order in orders:
             if not order.deleted_at:
+                apply_order_stats(order, -1)
                 order.deleted_at = datetime.utcnow()
                 order.is_active = False
                 order.updated_at = datetime.utcnow()
@@ -486,6 +1222,7 @@ def bulk_restore_orders():
                 order.deleted_at = None
                 order.is_active = True
                 order.updated_at = datetime.utcnow()
+                apply_order_stats(order)
 
                 # Restore order items
                 order_items = OrderItem.query.filter_by(order_id=order.id).all()
@@ -505,20 +1242,47 @@ def bulk_restore_orders():
         db.session.rollback()
         return {"success": False, "error": str(e)}, 500
 
+# ========== EVENT BUS WORKERS ==========
+def handle_payment_completed(payload):
+    """payment.completed -> confirm the pending order (idempotent)"""
+    with app.app_context():
+        order = db.session.get(Order, payload['order_id'])
+        if not order or order.deleted_at or not order_state_machine.can(order.status, 'confirmed'):
+            return
+        change_order_status(order, 'confirmed', notes=f"Payment {payload.get('transaction_id')} completed")
+        db.session.commit()
+        notify_order_events()
+
+def start_event_workers():
+    """Start the outbox relay and the payment event consumer"""
+    bus = EventBus()
+    start_outbox_relay(app, db, OutboxEvent, bus, source='order-service')
+    bus.start_consumer('order-service', {'payment.completed': handle_payment_completed})
+
+ensure_event_workers = start_workers_once(app, start_event_workers)
+
 if __name__ == '__main__':
     create_tables()
     PORT = 5003  # Nadia's Order Service
     print(f"📦 Order Service starting on port {PORT}")
     print(f"📋 Available endpoints:")
-    print(f"   POST   /api/orders               - Create new order")
+    print(f"   POST   /api/orders               - Create new order (priced via restaurant-service lookup)")
     print(f"   GET    /api/orders               - Read all orders")
-    print(f"   GET    /api/orders/<id>          - Read by ID with items & history")
+    print(f"   GET    /api/orders?stream=1      - NDJSON export of all orders")
+    print(f"   GET    /api/orders/stats         - Dashboard aggregates")
+    print(f"   GET    /api/orders/<id>          - Read by ID with items & history (?fields=)")
     print(f"   PATCH  /api/orders/<id>/status   - Update order status")
+    print(f"   PATCH  /api/orders/bulk-status   - Bulk status transition")
+    print(f"   GET    /api/orders/<id>/events   - Long-poll/SSE status events")
     print(f"   DELETE /api/orders/<id>/soft-delete - Soft delete")
     print(f"   DELETE /api/orders/<id>          - Hard delete")
     print(f"   POST   /api/orders/<id>/restore  - Restore")
     print(f"   DELETE /api/orders/bulk-delete   - Bulk soft delete")
     print(f"   POST   /api/orders/bulk-restore  - Bulk restore")
+    print(f"   POST   /api/orders/archive       - Archive old orders")
+    print(f"   DELETE /api/orders/archive/<YYYY-MM> - Drop archive partition")
     print(f"   GET    /api/order-items          - Read all order items")
     print(f"   GET    /api/status-history       - Read status history")
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':  # Start now in the reloader's serving process
+        ensure_event_workers()
     app.run(host='127.0.0.1', port=PORT, debug=True)
\ No newline at end of file
@@ -2,13 +2,27 @@ from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
 import os
+import sys
+import json
 import random
 import uuid
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.db_config import configure_database
+from common.read_replica import RoutingSession, init_read_replica
+from common.serialization import FastJSONProvider, ModelSerializer, computed, is_deleted
+from common.conditional import entity_validators, list_validators, not_modified
+from common.streaming import ndjson_response, wants_ndjson
+from common.event_bus import EventBus, start_workers_once
+from common.outbox import start_outbox_relay
+from common.idempotency import idempotent
+from common.state_machine import StateMachine, InvalidTransition
+
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///payment_service.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+configure_database(app, 'payment_service')  # URI & pool options from env, SQLite WAL pragmas
+app.json = FastJSONProvider(app)  # orjson-backed jsonify
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+init_read_replica(app, db, 'payment_service')  # GET requests read from the replica
 
 # ========================
 #  PAYMENT SERVICE MODELS
@@ -31,26 +45,10 @@ class Payment(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)  # Soft delete timestamp
 
+    serializer = ModelSerializer(extra={'is_deleted': is_deleted})
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'order_id': self.order_id,
-            'user_id': self.user_id,
-            'transaction_id': self.transaction_id,
-            'payment_method': self.payment_method,
-            'amount': self.amount,
-            'currency': self.currency,
-            'status': self.status,
-            'payment_date': self.payment_date.isoformat() if self.payment_date else None,
-            'expiry_date': self.expiry_date.isoformat() if self.expiry_date else None,
-            'gateway_response': self.gateway_response,
-            'notes': self.notes,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return Payment.serializer.to_dict(self)
 
 class PaymentMethod(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -68,23 +66,13 @@ class PaymentMethod(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)
 
+    serializer = ModelSerializer(exclude=['card_number_hash', 'cvv_hash'], extra={
+        'card_number_masked': computed('card_number_hash')(lambda method: method._mask_card_number()),
+        'is_deleted': is_deleted,
+    })
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'name': self.name,
-            'card_number_masked': self._mask_card_number(),
-            'card_holder_name': self.card_holder_name,
-            'expiry_month': self.expiry_month,
-            'expiry_year': self.expiry_year,
-            'provider': self.provider,
-            'is_default': self.is_default,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return PaymentMethod.serializer.to_dict(self)
     
     def _mask_card_number(self):
         """Return masked card number for security"""
@@ -106,20 +94,10 @@ class PaymentHistory(db.Model):
     created_by = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    serializer = ModelSerializer()
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'payment_id': self.payment_id,
-            'action': self.action,
-            'status_before': self.status_before,
-            'status_after': self.status_after,
-            'amount_before': self.amount_before,
-            'amount_after': self.amount_after,
-            'notes': self.notes,
-            'gateway_data': self.gateway_data,
-            'created_by': self.created_by,
-            'created_at': self.created_at.isoformat()
-        }
+        return PaymentHistory.serializer.to_dict(self)
 
 class Refund(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -136,22 +114,30 @@ class Refund(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    serializer = ModelSerializer()
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'payment_id': self.payment_id,
-            'order_id': self.order_id,
-            'user_id': self.user_id,
-            'refund_amount': self.refund_amount,
-            'reason': self.reason,
-            'status': self.status,
-            'processed_date': self.processed_date.isoformat() if self.processed_date else None,
-            'refund_transaction_id': self.refund_transaction_id,
-            'notes': self.notes,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return Refund.serializer.to_dict(self)
+
+class OutboxEvent(db.Model):
+    """Transactional outbox - written in the same commit as the payment change"""
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(50), nullable=False)  # payment.created, payment.completed, payment.failed, payment.refunded
+    aggregate_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON string
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    published_at = db.Column(db.DateTime, nullable=True, index=True)
+
+class IdempotencyKey(db.Model):
+    """Stored responses for requests sent with an Idempotency-Key header"""
+    scope = db.Column(db.String(50), primary_key=True)  # e.g. 'POST /api/payments'
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)  # sha256 of the request body
+    status = db.Column(db.String(20), default='processing')  # processing, completed
+    response_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
 
 def create_tables():
     with app.app_context():
@@ -164,6 +150,40 @@ def generate_transaction_id():
     random_part = str(random.randint(100000, 999999))
     return f"TXN{timestamp}{random_part}"
 
+# ========== PAYMENT STATE MACHINE ==========
+payment_state_machine = StateMachine('payment', {
+    'pending': ['processing', 'completed', 'failed', 'cancelled'],
+    'processing': ['completed', 'failed'],
+    'failed': ['completed', 'failed', 'cancelled'],  # failed -> failed when a retry is declined again
+    'completed': ['refunded'],
+    'refunded': [],
+    'cancelled': []
+})
+
+@payment_state_machine.guard()
+def _payment_not_deleted(payment, old_status, new_status, **context):
+    if payment.deleted_at:
+        return "Cannot update deleted payment"
+
+@payment_state_machine.on_enter('completed')
+def _stamp_payment_date(payment, old_status, new_status, **context):
+    payment.payment_date = datetime.utcnow()
+
+def add_outbox_event(topic, payment, **extra):
+    """Queue an event for the outbox relay in the current transaction"""
+    payload = {
+        'payment_id': payment.id,
+        'order_id': payment.order_id,
+        'user_id': payment.user_id,
+        'transaction_id': payment.transaction_id,
+        'payment_method': payment.payment_method,
+        'amount': payment.amount,
+        'currency': payment.currency,
+        'status': payment.status,
+        **extra
+    }
+    db.session.add(OutboxEvent(topic=topic, aggregate_id=payment.id, payload=json.dumps(payload)))
+
 def hash_sensitive_data(data):
     """Simple hashing for sensitive data - in production use proper encryption"""
     import hashlib
@@ -245,14 +265,22 @@ def health_check():
 # ========== PAYMENT ENDPOINTS ==========
 @app.route('/api/payments', methods=['GET'])
 def get_all_payments():
-    """READ ALL - Get all payments"""
+    """READ ALL - Get all payments
+
+    ?fields=id,status,amount returns a sparse list; ?stream=1 or
+    Accept: application/x-ndjson streams every row as NDJSON.
+    """
     try:
+        try:
+            fields = Payment.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {"success": False, "error": str(e)}, 400
         include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
         status_filter = request.args.get('status')
         user_filter = request.args.get('user_id')
         order_filter = request.args.get('order_id')
 
-        query = Payment.query
+        query = Payment.serializer.project(Payment.query, fields)
         if not include_deleted:
             query = query.filter_by(deleted_at=None)
         if status_filter:
@@ -262,11 +290,18 @@ def get_all_payments():
         if order_filter:
             query = query.filter_by(order_id=order_filter)
 
-        payments = query.order_by(Payment.created_at.desc()).all()
+        query = query.order_by(Payment.created_at.desc())
+        if wants_ndjson():
+            return ndjson_response(query, Payment.serializer, fields)
+
+        cached = not_modified(list_validators(query, Payment))
+        if cached is not None:
+            return cached
+        payments = query.all()
 
         return {
             "success": True,
-            "data": [p.to_dict() for p in payments],
+            "data": Payment.serializer.many(payments, fields),
             "count": len(payments),
             "filters": {
                 "include_deleted": include_deleted,
@@ -280,9 +315,16 @@ def get_all_payments():
 
 @app.route('/api/payments/<int:id>', methods=['GET'])
 def get_payment(id):
-    """READ BY ID - Get single payment"""
+    """READ BY ID - Get single payment (?fields= selects payment fields)"""
     try:
-        payment = Payment.query.get(id)
+        try:
+            fields = Payment.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {"success": False, "error": str(e)}, 400
+        cached = not_modified(entity_validators(Payment, id))
+        if cached is not None:
+            return cached
+        payment = Payment.serializer.project(Payment.query, fields).get(id)
         if not payment:
             return {"success": False, "error": "Payment not found"}, 404
 
@@ -295,14 +337,15 @@ def get_payment(id):
         return {
             "success": True,
             "data": {
-                "payment": payment.to_dict(),
-                "history": [h.to_dict() for h in history]
+                "payment": Payment.serializer(payment, fields),
+                "history": PaymentHistory.serializer.many(history)
             }
         }, 200
     except Exception as e:
         return {"success": False, "error": str(e)}, 500
 
 @app.route('/api/payments', methods=['POST'])
+@idempotent(db, IdempotencyKey, 'POST /api/payments')
 def create_payment():
     """CREATE - Create new payment"""
     try:
@@ -357,6 +400,7 @@ def create_payment():
             created_by=user_id
         )
         db.session.add(history_entry)
+        add_outbox_event('payment.created', new_payment)
 
         db.session.commit()
 
@@ -380,7 +424,7 @@ def process_payment(id):
         if payment.deleted_at:
             return jsonify({"success": False, "error": "Cannot process deleted payment"}), 400
             
-        if payment.status not in ['pending', 'failed']:
+        if not payment_state_machine.can(payment.status, 'completed'):
             return jsonify({"success": False, "error": f"Cannot process payment with status: {payment.status}"}), 400
         
         data = request.get_json() or {}
@@ -399,13 +443,13 @@ def process_payment(id):
 
         payment.gateway_response = str(gateway_response)
 
-        if gateway_response["status"] == "completed":
-            payment.status = "completed"
-            payment.payment_date = datetime.utcnow()
-        else:
-            payment.status = "failed"
-
-        payment.updated_at = datetime.utcnow()
+        try:
+            payment_state_machine.transition(
+                payment, "completed" if gateway_response["status"] == "completed" else "failed"
+            )
+        except InvalidTransition as e:
+            db.session.rollback()
+            return {"success": False, "error": str(e)}, 400
 
         # Create history entry
         history_entry = PaymentHistory(
@@ -420,6 +464,8 @@ def process_payment(id):
             created_by=payment.user_id
         )
         db.session.add(history_entry)
+        add_outbox_event(f'payment.{payment.status}', payment,
+                         gateway_transaction_id=gateway_response.get('gateway_transaction_id'))
 
         db.session.commit()
 
@@ -454,6 +500,12 @@ def create_refund(id):
         if refund_amount > payment.amount:
             return {"success": False, "error": "Refund amount cannot exceed payment amount"}, 400
 
+        if refund_amount >= payment.amount:
+            try:
+                payment_state_machine.check(payment, 'refunded')
+            except InvalidTransition as e:
+                return {"success": False, "error": str(e)}, 400
+
         # Create refund record
         refund = Refund(
             payment_id=payment.id,
@@ -475,7 +527,7 @@ def create_refund(id):
 
             # Update payment status if fully refunded
             if refund_amount >= payment.amount:
-                payment.status = 'refunded'
+                payment_state_machine.transition(payment, 'refunded')
         else:
             refund.status = 'failed'
 
@@ -493,6 +545,11 @@ def create_refund(id):
             created_by=payment.user_id
         )
         db.session.add(history_entry)
+        # A partial refund leaves the payment row untouched; bump it so the
+        # GET /api/payments/<id> ETag (which covers the history) changes.
+        payment.updated_at = datetime.utcnow()
+        if refund.status == 'completed':
+            add_outbox_event('payment.refunded', payment, refund_amount=refund_amount, reason=reason)
 
         db.session.commit()
 
@@ -511,17 +568,26 @@ def create_refund(id):
 # ========== PAYMENT METHOD ENDPOINTS ==========
 @app.route('/api/payment-methods', methods=['GET'])
 def get_payment_methods():
-    """READ ALL - Get all payment methods for user"""
+    """READ ALL - Get all payment methods for user (optional ?fields=)"""
     try:
         user_id = request.args.get('user_id')
         if not user_id:
             return jsonify({"success": False, "error": "user_id parameter is required"}), 400
-        
-        methods = PaymentMethod.query.filter_by(user_id=user_id, deleted_at=None).all()
+        try:
+            fields = PaymentMethod.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        query = PaymentMethod.serializer.project(PaymentMethod.query, fields) \
+            .filter_by(user_id=user_id, deleted_at=None)
+        cached = not_modified(list_validators(query, PaymentMethod))
+        if cached is not None:
+            return cached
+        methods = query.all()
         
         return jsonify({
             "success": True,
-            "data": [m.to_dict() for m in methods],
+            "data": PaymentMethod.serializer.many(methods, fields),
             "count": len(methods)
         })
     except Exception as e:
@@ -651,6 +717,12 @@ def restore_payment(id):
         db.session.rollback()
         return {"success": False, "error": str(e)}, 500
 
+def start_event_workers():
+    """Start the outbox relay publishing payment events"""
+    start_outbox_relay(app, db, OutboxEvent, EventBus(), source='payment-service')
+
+ensure_event_workers = start_workers_once(app, start_event_workers)
+
 if __name__ == '__main__':
     create_tables()
     PORT = 5005  # Reza's Payment Service
@@ -658,6 +730,7 @@ if __name__ == '__main__':
     print(f"📋 Available endpoints:")
     print(f"   POST   /api/payments               - Create new payment")
     print(f"   GET    /api/payments               - Read all payments")
+    print(f"   GET    /api/payments?stream=1      - NDJSON export of all payments")
     print(f"   GET    /api/payments/<id>          - Read by ID with history")
     print(f"   POST   /api/payments/<id>/process  - Process payment")
     print(f"   POST   /api/payments/<id>/refund   - Create refund")
@@ -666,4 +739,6 @@ if __name__ == '__main__':
     print(f"   DELETE /api/payments/<id>/soft-delete - Soft delete")
     print(f"   POST   /api/payments/<id>/restore  - Restore")
     print(f"   GET    /api/refunds                - Read all refunds")
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':  # Start now in the reloader's serving process
+        ensure_event_workers()
     app.run(host='127.0.0.1', port=PORT, debug=True)
\ No newline at end of file
@@ -1,11 +1,40 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import event, insert, inspect, or_, text, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import ast
+import atexit
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.db_config import add_missing_columns, configure_database
+from common.read_replica import RoutingSession, init_read_replica, primary_reads
+from common.serialization import FastJSONProvider, ModelSerializer, computed, is_deleted
+from common.conditional import entity_validators, list_validators, merge_validators, not_modified, version_validators
+from common.crud import CrudEngine
+from common.doc_cache import DocumentCache
+from common.search_index import SearchIndex
+from common.facets import FacetCounter
+from common.bulk_import import iter_records
+from common.event_bus import EventBus, start_workers_once
+from common.leaderboard import Leaderboard
+from common.availability import AvailabilityMap
+from common.thumbnails import FILENAME_RE as THUMBNAIL_FILENAME_RE, ThumbnailError, ThumbnailStore
+from common.geo import (approx_distance_sq, bounding_box, calculate_distance, covering_cells,
+                        geohash_encode, geohash_prefix_filters, validate_coordinates)
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///restaurant.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+configure_database(app, 'restaurant')  # URI & pool options from env, SQLite WAL pragmas
+app.json = FastJSONProvider(app)  # orjson-backed jsonify
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+init_read_replica(app, db, 'restaurant')  # GET requests read from the replica
 
 # ========== RESTAURANT MODEL ==========
 class Restaurant(db.Model):
@@ -15,27 +44,35 @@ class Restaurant(db.Model):
     address = db.Column(db.String(200))
     phone = db.Column(db.String(20))
     email = db.Column(db.String(100))
-    rating = db.Column(db.Float, default=0.0)
+    rating = db.Column(db.Float, default=0.0)  # Average of the submitted ratings once there are any
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_total = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
     is_active = db.Column(db.Boolean, default=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)  # Spatial index for /nearby
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)
 
+    serializer = ModelSerializer(exclude=['geohash', 'rating_total'], extra={'is_deleted': is_deleted})
+
+    def set_location(self, latitude, longitude):
+        """Set coordinates (ValueError if invalid) and keep the geohash in sync"""
+        if latitude is None and longitude is None:
+            self.latitude = self.longitude = self.geohash = None
+            return
+        try:
+            latitude = float(latitude) if latitude is not None else None
+            longitude = float(longitude) if longitude is not None else None
+        except (TypeError, ValueError):
+            raise ValueError("latitude and longitude must be numbers")
+        validate_coordinates(latitude, longitude)
+        self.latitude, self.longitude = latitude, longitude
+        self.geohash = geohash_encode(latitude, longitude)
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'address': self.address,
-            'phone': self.phone,
-            'email': self.email,
-            'rating': self.rating,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return Restaurant.serializer.to_dict(self)
 
 # ========== MENU ITEM MODEL (FULL CRUD) ==========
 class MenuItem(db.Model):
@@ -51,7 +88,7 @@ class MenuItem(db.Model):
     is_spicy = db.Column(db.Boolean, default=False)
     preparation_time = db.Column(db.Integer)  # minutes
     calories = db.Column(db.Integer)
-    allergens = db.Column(db.Text)  # JSON string of allergens
+    allergen_mask = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # Bit (Allergen.id - 1) per allergen
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -60,49 +97,512 @@ class MenuItem(db.Model):
     # Relationship
     restaurant = db.relationship('Restaurant', backref=db.backref('menu_items', lazy=True))
 
+    serializer = ModelSerializer(exclude=['allergen_mask'], extra={
+        'restaurant_name': computed('restaurant_id', related=['restaurant'])(
+            lambda item: item.restaurant.name if item.restaurant else None),
+        'allergens': computed('allergen_mask')(lambda item: item.get_allergens_list()),
+        'is_deleted': is_deleted,
+    })
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'restaurant_id': self.restaurant_id,
-            'restaurant_name': self.restaurant.name if self.restaurant else None,
-            'name': self.name,
-            'description': self.description,
-            'price': self.price,
-            'category': self.category,
-            'image_url': self.image_url,
-            'is_available': self.is_available,
-            'is_vegetarian': self.is_vegetarian,
-            'is_spicy': self.is_spicy,
-            'preparation_time': self.preparation_time,
-            'calories': self.calories,
-            'allergens': self.get_allergens_list(),
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return MenuItem.serializer.to_dict(self)
     
     def get_allergens_list(self):
-        """Convert allergens string to list"""
-        if self.allergens:
-            try:
-                return eval(self.allergens) if isinstance(self.allergens, str) else self.allergens
-            except:
-                return []
-        return []
+        """Allergen names decoded from allergen_mask"""
+        return allergen_names(self.allergen_mask)
     
     def set_allergens_list(self, allergens_list):
-        """Convert allergens list to string"""
-        if allergens_list:
-            self.allergens = str(allergens_list)
-        else:
-            self.allergens = None
+        """Store allergen names as allergen_mask, registering new names (ValueError on bad input)"""
+        self.allergen_mask = allergen_mask(allergens_list or [], register=True)
+
+# ========== RESTAURANT AGGREGATES ==========
+class RestaurantDailyOrders(db.Model):
+    """Delivered orders per restaurant per day, fed by order.delivered events"""
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+class CountedOrder(db.Model):
+    """Orders already counted in the aggregates (events arrive at least once)"""
+    order_id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    counted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# ========== ALLERGENS ==========
+# Each allergen name gets a row (and so a bit: id - 1) in the allergen table;
+# menu items keep the set as a bitmask, so "contains none of X" is a single
+# bitwise AND in SQL and serialization needs no parsing.
+MAX_ALLERGENS = 63  # Bits in a signed BIGINT
+
+class Allergen(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+_allergen_bits = {}  # name -> bit of committed allergens, loaded from the allergen table
+_allergen_names_by_mask = {}
+
+# Allergens registered in the current transaction are kept in session.info
+# until it commits: a rollback takes the row back, and its id (the bit) may
+# then go to another name, so they must not reach the shared caches before.
+def _new_allergens():
+    return db.session.info.get('new_allergens', {})
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_new_allergens(session):
+    _allergen_bits.update(session.info.pop('new_allergens', {}))
+
+@event.listens_for(db.session, 'after_rollback')
+def _drop_new_allergens(session):
+    session.info.pop('new_allergens', None)
+
+def _load_allergens():
+    new = _new_allergens()
+    bits = {name: id - 1 for id, name in db.session.query(Allergen.id, Allergen.name) if name not in new}
+    _allergen_bits.clear()
+    _allergen_bits.update(bits)
+
+def _normalize_allergens(names):
+    if not isinstance(names, (list, tuple)) or not all(isinstance(n, str) for n in names):
+        raise ValueError("allergens must be a list of strings")
+    return [n.strip().lower() for n in names if n.strip()]
+
+def _register_allergen(name):
+    try:
+        with db.session.begin_nested():
+            allergen = Allergen(name=name)
+            db.session.add(allergen)
+            db.session.flush()
+            if allergen.id > MAX_ALLERGENS:
+                raise ValueError(f"At most {MAX_ALLERGENS} distinct allergens are supported")  # Rolls the row back
+    except IntegrityError:  # Registered concurrently
+        _load_allergens()
+        return _allergen_bits[name]
+    db.session.info.setdefault('new_allergens', {})[name] = allergen.id - 1
+    return allergen.id - 1
+
+def allergen_mask(names, register=False):
+    """Bitmask for allergen names. Unknown names are registered, or ignored
+    when register=False (no item can contain them)."""
+    mask = 0
+    for name in _normalize_allergens(names):
+        bit = _allergen_bits.get(name, _new_allergens().get(name))
+        if bit is None:
+            _load_allergens()
+            bit = _allergen_bits.get(name)
+        if bit is None:
+            if not register:
+                continue
+            bit = _register_allergen(name)
+        mask |= 1 << bit
+    return mask
+
+def allergen_names(mask):
+    """Allergen names for a bitmask, in registration order"""
+    if not mask:
+        return []
+    names = _allergen_names_by_mask.get(mask)
+    if names is not None:
+        return list(names)
+
+    def missing(by_bit):
+        return any(mask >> bit & 1 and bit not in by_bit for bit in range(mask.bit_length()))
+
+    by_bit = {bit: name for name, bit in _allergen_bits.items()}
+    if missing(by_bit):
+        _load_allergens()  # Registered by another process
+        by_bit = {bit: name for name, bit in _allergen_bits.items()}
+    shared = True
+    if missing(by_bit) and _new_allergens():
+        by_bit.update({bit: name for name, bit in _new_allergens().items()})
+        shared = False  # Not committed yet: keep out of the cache
+    names = tuple(by_bit[bit] for bit in range(mask.bit_length()) if mask >> bit & 1 and bit in by_bit)
+    if shared:
+        _allergen_names_by_mask[mask] = names
+    return list(names)
+
+def migrate_allergen_storage():
+    """Convert the legacy str(list) allergens column into allergen_mask"""
+    add_missing_columns(db, MenuItem)
+    if 'allergens' not in {c['name'] for c in inspect(db.engine).get_columns('menu_item')}:
+        return 0
+
+    rows = db.session.execute(text('SELECT id, allergens FROM menu_item WHERE allergens IS NOT NULL')).all()
+    for id, legacy in rows:
+        try:
+            names = ast.literal_eval(legacy)
+        except (ValueError, SyntaxError):
+            names = json.loads(legacy) if legacy.startswith('[') else []
+        if not isinstance(names, (list, tuple)):
+            names = []
+        db.session.execute(text('UPDATE menu_item SET allergen_mask = :mask, allergens = NULL WHERE id = :id'),
+                           {'mask': allergen_mask(list(names), register=True), 'id': id})
+    db.session.commit()
+    return len(rows)
+
+# ========== MENU DOCUMENT CACHE ==========
+# Precomputed per-restaurant menus (MENU_CACHE_MAX_ENTRIES, MENU_CACHE_TTL,
+# MENU_CACHE_PATH for the shared store). Every menu item write invalidates
+# the menus of the restaurants it touches after the commit.
+menu_cache = DocumentCache('menu')
+
+def build_menu_document(restaurant_id, version):
+    """Active menu of a restaurant grouped by category, or None if the restaurant is gone.
+
+    Read from the primary: the document is shared by every worker under
+    `version`, so a lagging replica must not be the one to fill it.
+    """
+    with primary_reads():
+        restaurant = Restaurant.query.get(restaurant_id)
+        if not restaurant or restaurant.deleted_at:
+            return None
+        menu_items = MenuItem.serializer.project(MenuItem.query, None) \
+            .filter_by(restaurant_id=restaurant_id, deleted_at=None).order_by(MenuItem.id).all()
+
+        if not availability.loaded(restaurant_id):
+            availability.load(restaurant_id, {item.id: item.is_available for item in menu_items})
+
+        menu_by_category = {}
+        for item in menu_items:
+            menu_by_category.setdefault(item.category or 'uncategorized', []).append(MenuItem.serializer.to_dict(item))
+        for items in menu_by_category.values():
+            apply_availability(items)  # Toggles not yet written back
+            apply_thumbnails(items)
+        return {
+            "success": True,
+            "restaurant": restaurant.to_dict(),
+            "menu": menu_by_category,
+            "total_items": len(menu_items),
+            "version": version,
+            "availability_version": availability.version(restaurant_id)
+        }
+
+def refresh_menu_availability(restaurant_id, document):
+    """Copy of a cached menu document with the current availability bitmap (no menu query)"""
+    load_availability(restaurant_id)
+    menu = {cat: apply_availability([dict(item) for item in items]) for cat, items in document['menu'].items()}
+    return dict(document, menu=menu, availability_version=availability.version(restaurant_id))
+
+def invalidate_menus(*restaurant_ids):
+    menu_cache.invalidate(*set(restaurant_ids))
+
+def menu_items_changed(ids, *restaurant_ids):
+    """After a committed menu item write: drop the cached menus and re-index the items"""
+    invalidate_menus(*restaurant_ids)
+    availability.forget(ids, restaurant_ids)  # The committed row wins over queued toggles
+    index_menu_items(ids)
+    menu_item_facets.invalidate()
+
+def menu_items_changing(ids):
+    """CrudEngine on_change hook: invalidate menus and search entries after the commit"""
+    restaurant_ids = [r for (r,) in db.session.query(MenuItem.restaurant_id).filter(MenuItem.id.in_(ids)).distinct()]
+    return lambda: menu_items_changed(ids, *restaurant_ids)
+
+# ========== MENU AVAILABILITY ==========
+# Per-restaurant availability bitmaps. Toggles through the availability
+# endpoints only flip a bit; the queued changes are written back in batches
+# (AVAILABILITY_FLUSH_INTERVAL) and menu reads overlay the bitmap, so a
+# toggle neither loads the row nor invalidates the cached menu document.
+# Bitmaps are per worker and reloaded AVAILABILITY_TTL seconds after loading,
+# which is how toggles made by other workers show up.
+def write_availability(changes):
+    """Write-behind target: one UPDATE per value for the queued toggles ({item id: available})"""
+    with app.app_context():
+        now = datetime.utcnow()
+        try:
+            for available in (True, False):
+                ids = [id for id, value in changes.items() if value is available]
+                if ids:
+                    db.session.execute(update(MenuItem).where(MenuItem.id.in_(ids))
+                                       .values(is_available=available, updated_at=now))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+availability = AvailabilityMap(write=write_availability)
+atexit.register(availability.flush)
+
+def load_availability(restaurant_id):
+    """Load a restaurant's bitmap from the database unless it is loaded and fresh (one query)"""
+    if not availability.loaded(restaurant_id):
+        with primary_reads():
+            availability.load(restaurant_id, dict(
+                db.session.query(MenuItem.id, MenuItem.is_available)
+                .filter_by(restaurant_id=restaurant_id, deleted_at=None).order_by(MenuItem.id)
+            ))
+
+def availability_validators(restaurant_id=None):
+    """Validators of the bitmap that item reads overlay (every bitmap without a restaurant)
+
+    Merged into the updated_at validators: a toggle changes the response
+    long before the write-behind flush touches the row.
+    """
+    version = availability.version(restaurant_id) if restaurant_id else availability.latest_version()
+    return version and version_validators('availability', restaurant_id or '*', version)
+
+def apply_availability(items):
+    """Overlay the loaded bitmaps on serialized menu items (dicts with id and is_available)"""
+    for item in items:
+        if 'is_available' in item:
+            available = availability.get(item.get('id'))
+            if available is not None:
+                item['is_available'] = available
+    return items
+
+# ========== IMAGE THUMBNAILS ==========
+# Menu item images are fetched once in a background worker, stored under
+# THUMBNAIL_DIR with content-hash filenames and resized to THUMBNAIL_WIDTHS.
+# Menu responses point image_url at the smallest local variant as soon as it
+# exists (the original stays in image_original_url); until then, or if the
+# image cannot be fetched, the original URL is served unchanged. Item and
+# list ETags include the time of the last new thumbnail. Failed
+# fetches are retried THUMBNAIL_RETRY_SECONDS (default 3600) later. Only
+# public hosts are fetched; THUMBNAIL_ALLOWED_HOSTS (comma separated)
+# narrows that to the listed hosts and their subdomains.
+# URLs are absolute and default to the gateway route at GATEWAY_URL (clients
+# do not reach the service port, and the frontend is served from another
+# origin); set THUMBNAIL_BASE_URL for a CDN or direct access.
+GATEWAY_URL = os.environ.get('GATEWAY_URL', 'http://localhost:5000').rstrip('/')
+THUMBNAIL_BASE_URL = os.environ.get('THUMBNAIL_BASE_URL', f'{GATEWAY_URL}/api/restaurant-service/api/images').rstrip('/')
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+THUMBNAIL_RETRY_SECONDS = int(os.environ.get('THUMBNAIL_RETRY_SECONDS', 3600))
+thumbnail_store = ThumbnailStore(
+    os.environ.get('THUMBNAIL_DIR', os.path.join(app.instance_path, 'thumbnails')),
+    widths=[int(w) for w in os.environ.get('THUMBNAIL_WIDTHS', '320,640').split(',')],
+    local_root=os.environ.get('THUMBNAIL_LOCAL_ROOT'),
+    allowed_hosts=os.environ.get('THUMBNAIL_ALLOWED_HOSTS', '').split(',')
+)
+
+class ImageThumbnail(db.Model):
+    """Thumbnails generated for an image URL (an empty variants map records a failed fetch)"""
+    source_url = db.Column(db.String(500), primary_key=True)
+    content_hash = db.Column(db.String(64))
+    variants = db.Column(db.Text, nullable=False, default='{}')  # JSON {width: filename}
+    error = db.Column(db.String(200))
+    retry_at = db.Column(db.DateTime, nullable=True)  # When a failed fetch may be tried again
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def retry_due(self, now=None):
+        return self.error is not None and (self.retry_at is None or self.retry_at <= (now or datetime.utcnow()))
+
+_thumbnails = {}  # source url -> {width: filename}
+_thumbnail_retry_at = {}  # source url -> when its failed fetch may be retried
+_thumbnail_index_loaded = threading.Event()
+_thumbnail_queue = queue.Queue()
+_thumbnail_queued = set()
+_thumbnail_lock = threading.Lock()
+_thumbnail_worker = None
+_thumbnail_version = None  # microsecond timestamp of the last new thumbnail (item ETags)
+
+def _variants(row):
+    return {int(width): filename for width, filename in json.loads(row.variants).items()}
+
+def _remember_thumbnails(row):
+    global _thumbnail_version
+    variants = _variants(row)
+    if variants != _thumbnails.get(row.source_url, {}):
+        with _thumbnail_lock:
+            _thumbnail_version = max(time.time_ns() // 1000, (_thumbnail_version or 0) + 1)
+    _thumbnails[row.source_url] = variants
+    if row.error is not None:
+        _thumbnail_retry_at[row.source_url] = row.retry_at or datetime.min
+    else:
+        _thumbnail_retry_at.pop(row.source_url, None)
+
+def thumbnail_url(filename):
+    return f"{THUMBNAIL_BASE_URL}/{filename}"
+
+def thumbnail_validators():
+    """Validators of the image_url rewrite on item reads: a new thumbnail changes the response"""
+    version = _thumbnail_version
+    return version and version_validators('thumbnails', '*', version)
+
+def apply_thumbnails(items):
+    """Point image_url of serialized menu items at the local thumbnail, queueing unseen images"""
+    if not thumbnail_store.available:
+        return items
+    for item in items:
+        url = item.get('image_url')
+        if not url:
+            continue
+        if not _thumbnail_index_loaded.is_set():
+            for row in ImageThumbnail.query:
+                _remember_thumbnails(row)
+            _thumbnail_index_loaded.set()
+        variants = _thumbnails.get(url)
+        if variants is None or (not variants and _thumbnail_retry_at.get(url, datetime.max) <= datetime.utcnow()):
+            request_thumbnails(url)
+        elif variants:
+            item['image_original_url'] = url
+            item['image_url'] = thumbnail_url(variants[min(variants)])
+            item['image_variants'] = {str(width): thumbnail_url(filename) for width, filename in sorted(variants.items())}
+    return items
+
+def request_thumbnails(url):
+    """Queue url for the background thumbnail worker (once)"""
+    global _thumbnail_worker
+    with _thumbnail_lock:
+        if url in _thumbnail_queued:
+            return
+        _thumbnail_queued.add(url)
+        if _thumbnail_worker is None:
+            _thumbnail_worker = threading.Thread(target=_thumbnail_worker_loop, name='thumbnailer', daemon=True)
+            _thumbnail_worker.start()
+    _thumbnail_queue.put(url)
+
+def _thumbnail_worker_loop():
+    while True:
+        url = _thumbnail_queue.get()
+        try:
+            generate_thumbnails(url)
+        except Exception as e:
+            app.logger.error(f"Thumbnails for {url} failed: {e}")
+        finally:
+            with _thumbnail_lock:
+                _thumbnail_queued.discard(url)
+            _thumbnail_queue.task_done()
+
+def generate_thumbnails(url):
+    """Fetch url once (again once a failure's retry time has passed), store its
+    thumbnails and refresh the menus that show it"""
+    with app.app_context():
+        row = db.session.get(ImageThumbnail, url)
+        if row is None or row.retry_due():
+            if row is None:
+                row = ImageThumbnail(source_url=url)
+                db.session.add(row)
+            try:
+                row.content_hash, variants = thumbnail_store.ingest(url)
+                row.variants, row.error, row.retry_at = json.dumps(variants), None, None
+            except ThumbnailError as e:
+                row.variants, row.error = '{}', str(e)[:200]
+                row.retry_at = datetime.utcnow() + timedelta(seconds=THUMBNAIL_RETRY_SECONDS)
+            try:
+                db.session.commit()
+            except IntegrityError:  # Generated concurrently by another process
+                db.session.rollback()
+                row = db.session.get(ImageThumbnail, url)
+        _remember_thumbnails(row)
+        invalidate_menus(*[r for (r,) in db.session.query(MenuItem.restaurant_id).filter_by(image_url=url).distinct()])
+
+# ========== SEARCH INDEX ==========
+# In-process inverted index over restaurant name/description and menu item
+# name/category/description. Built from the database on first use, then
+# kept current by the write handlers (soft deleted rows are removed).
+search_index = SearchIndex()
+_search_index_built = threading.Event()
+
+def _restaurant_document(restaurant):
+    return {
+        'name': (restaurant.name, 3),
+        'description': (restaurant.description, 1)
+    }, {
+        'type': 'restaurant', 'id': restaurant.id, 'name': restaurant.name,
+        'address': restaurant.address, 'rating': restaurant.rating
+    }
+
+def _menu_item_document(item):
+    return {
+        'name': (item.name, 3),
+        'category': (item.category, 2),
+        'description': (item.description, 1)
+    }, {
+        'type': 'menu_item', 'id': item.id, 'name': item.name, 'category': item.category,
+        'price': item.price, 'is_available': item.is_available,
+        'restaurant_id': item.restaurant_id, 'restaurant_name': item.restaurant.name if item.restaurant else None
+    }
+
+def build_search_index():
+    """(Re)build the whole index from the database"""
+    with search_index.lock:
+        search_index.clear()
+        for restaurant in Restaurant.query.filter_by(deleted_at=None).yield_per(1000):
+            search_index.add(('restaurant', restaurant.id), *_restaurant_document(restaurant))
+        for item in MenuItem.serializer.project(MenuItem.query, ['name', 'category', 'description', 'price',
+                                                                 'is_available', 'restaurant_name']) \
+                .filter_by(deleted_at=None).yield_per(1000):
+            search_index.add(('menu_item', item.id), *_menu_item_document(item))
+        _search_index_built.set()
+    return len(search_index)
+
+def index_restaurant(restaurant):
+    if not _search_index_built.is_set():
+        return
+    if restaurant.deleted_at:
+        search_index.remove(('restaurant', restaurant.id))
+    else:
+        search_index.add(('restaurant', restaurant.id), *_restaurant_document(restaurant))
+
+def index_menu_items(ids):
+    """Re-index menu items by id; deleted or missing ones are removed"""
+    if not _search_index_built.is_set():
+        return
+    items = {item.id: item for item in MenuItem.serializer.project(MenuItem.query, None).filter(MenuItem.id.in_(ids))}
+    with search_index.lock:
+        for id in ids:
+            item = items.get(id)
+            if item is None or item.deleted_at:
+                search_index.remove(('menu_item', id))
+            else:
+                search_index.add(('menu_item', id), *_menu_item_document(item))
+
+# ========== LEADERBOARDS ==========
+# Restaurants ranked by delivered orders in the last TOP_ORDERS_WINDOW_DAYS and
+# by rating. Built from the aggregate tables (never from orders), then kept
+# sorted by the event consumer and the rating endpoint. Each event and rating
+# reaches only the worker that handled it, so the boards are rebuilt
+# LEADERBOARD_TTL seconds (default 5) after building - and when the window
+# moves to a new day - which is how other workers' updates show up.
+TOP_ORDERS_WINDOW_DAYS = int(os.environ.get('TOP_ORDERS_WINDOW_DAYS', 30))
+LEADERBOARD_TTL = float(os.environ.get('LEADERBOARD_TTL', 5))
+orders_leaderboard = Leaderboard()
+rating_leaderboard = Leaderboard()
+_leaderboards_day = None  # UTC day the boards were built for
+_leaderboards_built_at = None  # time.monotonic() of the last build
+_leaderboards_lock = threading.Lock()
+
+def orders_window_start(today=None):
+    return (today or datetime.utcnow().date()) - timedelta(days=TOP_ORDERS_WINDOW_DAYS - 1)
+
+def build_leaderboards():
+    """Reload both leaderboards from the aggregate tables (two queries on the primary)"""
+    global _leaderboards_day, _leaderboards_built_at
+    today = datetime.utcnow().date()
+    with primary_reads():
+        orders_leaderboard.load(dict(
+            db.session.query(RestaurantDailyOrders.restaurant_id, db.func.sum(RestaurantDailyOrders.order_count))
+            .filter(RestaurantDailyOrders.day >= orders_window_start(today))
+            .group_by(RestaurantDailyOrders.restaurant_id)
+        ))
+        rating_leaderboard.load({
+            id: rating or 0.0
+            for id, rating in db.session.query(Restaurant.id, Restaurant.rating).filter(Restaurant.deleted_at.is_(None))
+        })
+    _leaderboards_day, _leaderboards_built_at = today, time.monotonic()
+
+def _leaderboards_fresh():
+    return _leaderboards_day == datetime.utcnow().date() and \
+        time.monotonic() - _leaderboards_built_at < LEADERBOARD_TTL
+
+def ensure_leaderboards():
+    """Rebuild the leaderboards when they are older than LEADERBOARD_TTL or from another day"""
+    if not _leaderboards_fresh():
+        with _leaderboards_lock:
+            if not _leaderboards_fresh():
+                build_leaderboards()
 
 def create_tables():
     with app.app_context():
         db.create_all()
+        add_missing_columns(db, Restaurant)
+        add_missing_columns(db, ImageThumbnail)
+        migrated = migrate_allergen_storage()
         print(" Database tables created")
+        if migrated:
+            print(f" Migrated allergens of {migrated} menu items")
+        print(f" Search index built ({build_search_index()} documents)")
+        build_leaderboards()
 
 # ========== HEALTH CHECK ==========
 @app.route('/health', methods=['GET'])
@@ -116,19 +616,26 @@ def health_check():
 # ========== RESTAURANT ENDPOINTS ==========
 @app.route('/api/restaurants', methods=['GET'])
 def get_restaurants():
-    """READ ALL - Get all restaurants"""
+    """READ ALL - Get all restaurants (?fields=id,name,rating for a sparse list)"""
     try:
+        try:
+            fields = Restaurant.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {"success": False, "error": str(e)}, 400
         include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
 
-        if include_deleted:
-            restaurants = Restaurant.query.all()
-        else:
-            restaurants = Restaurant.query.filter_by(deleted_at=None).all()
+        query = Restaurant.serializer.project(Restaurant.query, fields)
+        if not include_deleted:
+            query = query.filter_by(deleted_at=None)
+        cached = not_modified(list_validators(query, Restaurant))
+        if cached is not None:
+            return cached
+        restaurants = query.all()
 
         # Return dict directly - Flask will auto-convert to JSON
         return {
             "success": True,
-            "data": [r.to_dict() for r in restaurants],
+            "data": Restaurant.serializer.many(restaurants, fields),
             "count": len(restaurants)
         }, 200
     except Exception as e:
@@ -136,15 +643,22 @@ def get_restaurants():
 
 @app.route('/api/restaurants/<int:id>', methods=['GET'])
 def get_restaurant(id):
-    """READ BY ID - Get single restaurant"""
+    """READ BY ID - Get single restaurant (optional ?fields=)"""
     try:
-        restaurant = Restaurant.query.get(id)
+        try:
+            fields = Restaurant.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        cached = not_modified(entity_validators(Restaurant, id))
+        if cached is not None:
+            return cached
+        restaurant = Restaurant.serializer.project(Restaurant.query, fields).get(id)
         if not restaurant or (restaurant.deleted_at and not request.args.get('include_deleted', 'false').lower() == 'true'):
             return jsonify({"success": False, "error": "Restaurant not found"}), 404
             
         return jsonify({
             "success": True,
-            "data": restaurant.to_dict()
+            "data": Restaurant.serializer(restaurant, fields)
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -166,8 +680,15 @@ def create_restaurant():
             rating=data.get('rating', 0.0),
             is_active=data.get('is_active', True)
         )
+        try:
+            new_restaurant.set_location(data.get('latitude'), data.get('longitude'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         db.session.add(new_restaurant)
         db.session.commit()
+        index_restaurant(new_restaurant)
+        if _leaderboards_day is not None:
+            rating_leaderboard.set(new_restaurant.id, new_restaurant.rating or 0.0)
         
         return jsonify({
             "success": True, 
@@ -178,18 +699,226 @@ def create_restaurant():
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
+RESTAURANT_READ_ONLY_FIELDS = ('id', 'rating', 'rating_count', 'rating_total', 'latitude', 'longitude', 'geohash',
+                               'created_at', 'updated_at', 'deleted_at')
+
+@app.route('/api/restaurants/<int:id>', methods=['PATCH'])
+def patch_restaurant(id):
+    """PARTIAL UPDATE - Update specific fields; latitude/longitude set the location (null/null clears it)"""
+    try:
+        restaurant = db.session.get(Restaurant, id)
+        if not restaurant or restaurant.deleted_at:
+            return jsonify({"success": False, "error": "Restaurant not found"}), 404
+
+        data = request.get_json()
+        if not data:
+            return jsonify({"success": False, "error": "No data provided"}), 400
+        if 'name' in data and not data['name']:
+            return jsonify({"success": False, "error": "Name is required"}), 400
+        previous_name = restaurant.name
+
+        # Update only provided columns; the rating is kept by the ratings endpoint
+        for field, value in data.items():
+            if field in Restaurant.__table__.columns and field not in RESTAURANT_READ_ONLY_FIELDS:
+                setattr(restaurant, field, value)
+        if 'latitude' in data or 'longitude' in data:
+            try:
+                restaurant.set_location(data.get('latitude', restaurant.latitude),
+                                        data.get('longitude', restaurant.longitude))
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({"success": False, "error": str(e)}), 400
+
+        restaurant.updated_at = datetime.utcnow()
+        db.session.commit()
+        index_restaurant(restaurant)
+        invalidate_menus(id)
+        if restaurant.name != previous_name:  # Menu item search hits carry the restaurant name
+            index_menu_items([item_id for (item_id,) in db.session.query(MenuItem.id).filter_by(restaurant_id=id)])
+
+        return jsonify({
+            "success": True,
+            "data": restaurant.to_dict(),
+            "message": "Restaurant updated successfully"
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ========== NEARBY ==========
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 50
+NEARBY_MAX_LIMIT = 100
+
+@app.route('/api/restaurants/nearby', methods=['GET'])
+def nearby_restaurants():
+    """Restaurants within ?radius= km (default 5, max 50) of ?lat=&lng=, nearest first (?limit=, default 20)"""
+    try:
+        try:
+            lat = request.args.get('lat', type=float)
+            lng = request.args.get('lng', type=float)
+            validate_coordinates(lat, lng)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        radius = request.args.get('radius', NEARBY_DEFAULT_RADIUS_KM, type=float)
+        if not 0 < radius <= NEARBY_MAX_RADIUS_KM:
+            return jsonify({"success": False, "error": f"radius must be within (0, {NEARBY_MAX_RADIUS_KM}] km"}), 400
+        limit = max(1, min(request.args.get('limit', 20, type=int), NEARBY_MAX_LIMIT))
+
+        # Geohash prefixes are index range scans; the bounding box and the planar
+        # distance trim the cells' corners. Ordering happens in SQL.
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+        distance_sq = approx_distance_sq(Restaurant.latitude, Restaurant.longitude, lat, lng)
+        restaurants = Restaurant.query.filter(
+            or_(*geohash_prefix_filters(Restaurant.geohash, covering_cells(lat, lng, radius))),
+            Restaurant.latitude.between(min_lat, max_lat),
+            Restaurant.longitude.between(min_lng, max_lng),
+            Restaurant.deleted_at.is_(None),
+            distance_sq <= (radius * 1.01) ** 2
+        ).order_by(distance_sq).limit(limit).all()
+
+        # Exact (haversine) distance only for the page being returned
+        data = []
+        for restaurant in restaurants:
+            distance = calculate_distance(lat, lng, restaurant.latitude, restaurant.longitude)
+            if distance <= radius:
+                data.append(dict(restaurant.to_dict(), distance_km=round(distance, 3)))
+        return jsonify({
+            "success": True,
+            "data": data,
+            "count": len(data),
+            "center": {"lat": lat, "lng": lng},
+            "radius_km": radius
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ========== TOP RESTAURANTS ==========
+TOP_BY = ('orders', 'rating')
+TOP_MAX_LIMIT = 100
+
+@app.route('/api/restaurants/top', methods=['GET'])
+def top_restaurants():
+    """Top restaurants ?by=orders (delivered orders, last TOP_ORDERS_WINDOW_DAYS days) or ?by=rating, ?limit= (default 10)"""
+    try:
+        by = request.args.get('by', 'orders')
+        if by not in TOP_BY:
+            return jsonify({"success": False, "error": f"by must be one of {', '.join(TOP_BY)}"}), 400
+        limit = max(1, min(request.args.get('limit', 10, type=int), TOP_MAX_LIMIT))
+
+        ensure_leaderboards()
+        ranked = (orders_leaderboard if by == 'orders' else rating_leaderboard).top(limit)
+        restaurants = {r.id: r for r in Restaurant.query.filter(Restaurant.id.in_([id for id, _ in ranked]),
+                                                                 Restaurant.deleted_at.is_(None))}
+        ranked = [(id, score) for id, score in ranked if id in restaurants]
+        data = [dict(restaurants[id].to_dict(), rank=rank, score=score) for rank, (id, score) in enumerate(ranked, 1)]
+        return jsonify({
+            "success": True,
+            "by": by,
+            "window_days": TOP_ORDERS_WINDOW_DAYS if by == 'orders' else None,
+            "data": data,
+            "count": len(data)
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/restaurants/<int:id>/ratings', methods=['POST'])
+def rate_restaurant(id):
+    """RATE - Add a 1-5 rating; Restaurant.rating becomes the running average"""
+    try:
+        data = request.get_json() or {}
+        rating = data.get('rating')
+        if isinstance(rating, bool) or not isinstance(rating, (int, float)) or not 1 <= rating <= 5:
+            return jsonify({"success": False, "error": "rating must be a number from 1 to 5"}), 400
+
+        # Increment in SQL so concurrent ratings are not lost
+        result = db.session.execute(
+            db.update(Restaurant).filter_by(id=id, deleted_at=None).values(
+                rating_count=Restaurant.rating_count + 1,
+                rating_total=Restaurant.rating_total + rating,
+                rating=(Restaurant.rating_total + rating) / (Restaurant.rating_count + 1),
+                updated_at=datetime.utcnow()
+            )
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            return jsonify({"success": False, "error": "Restaurant not found"}), 404
+        db.session.commit()
+
+        restaurant = db.session.get(Restaurant, id)
+        if _leaderboards_day is not None:
+            rating_leaderboard.set(id, restaurant.rating)
+        index_restaurant(restaurant)
+        invalidate_menus(id)
+        return jsonify({
+            "success": True,
+            "data": {"id": id, "rating": restaurant.rating, "rating_count": restaurant.rating_count},
+            "message": "Rating added successfully"
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ========== SEARCH ==========
+SEARCH_TYPES = ('restaurant', 'menu_item')
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """SEARCH - Full-text search over restaurants and menu items
+
+    ?q= (last word may be partial), ?type=restaurant|menu_item, ?limit= (default 20, max 100)
+    """
+    try:
+        q = request.args.get('q', '').strip()
+        if not q:
+            return jsonify({"success": False, "error": "q is required"}), 400
+        kind = request.args.get('type')
+        if kind and kind not in SEARCH_TYPES:
+            return jsonify({"success": False, "error": f"type must be one of: {', '.join(SEARCH_TYPES)}"}), 400
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+
+        if not _search_index_built.is_set():
+            with search_index.lock:
+                if not _search_index_built.is_set():
+                    build_search_index()
+
+        results = search_index.search(q, limit=limit, kinds={kind} if kind else None)
+        return jsonify({
+            "success": True,
+            "query": q,
+            "data": apply_availability([dict(payload, score=round(score, 4)) for score, key, payload in results]),
+            "count": len(results)
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ========== IMAGES ==========
+@app.route('/api/images/<filename>', methods=['GET'])
+def get_image(filename):
+    """Locally stored thumbnail / original; content-addressed, so cached for a year"""
+    if not THUMBNAIL_FILENAME_RE.match(filename):
+        return jsonify({"success": False, "error": "Image not found"}), 404
+    response = send_from_directory(thumbnail_store.root, filename, max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 # ========== MENU ITEM ENDPOINTS (FULL CRUD) ==========
 
 # ===== READ OPERATIONS =====
 @app.route('/api/menu-items', methods=['GET'])
 def get_menu_items():
-    """READ ALL - Get all menu items with filtering"""
+    """READ ALL - Get all menu items with filtering (?fields=id,name,price for a sparse list)"""
     try:
+        try:
+            fields = MenuItem.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         restaurant_id = request.args.get('restaurant_id', type=int)
         category = request.args.get('category')
         include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
         
-        query = MenuItem.query
+        query = MenuItem.serializer.project(MenuItem.query, fields)
         
         # Filter by restaurant
         if restaurant_id:
@@ -203,11 +932,15 @@ def get_menu_items():
         if not include_deleted:
             query = query.filter_by(deleted_at=None)
             
+        cached = not_modified(merge_validators(list_validators(query, MenuItem), availability_validators(restaurant_id),
+                                               thumbnail_validators()))
+        if cached is not None:
+            return cached
         menu_items = query.all()
         
         return jsonify({
             "success": True,
-            "data": [item.to_dict() for item in menu_items],
+            "data": apply_thumbnails(apply_availability(MenuItem.serializer.many(menu_items, fields))),
             "count": len(menu_items),
             "filters": {
                 "restaurant_id": restaurant_id,
@@ -220,37 +953,65 @@ def get_menu_items():
 
 @app.route('/api/menu-items/<int:id>', methods=['GET'])
 def get_menu_item(id):
-    """READ BY ID - Get single menu item"""
+    """READ BY ID - Get single menu item (optional ?fields=)"""
     try:
-        menu_item = MenuItem.query.get(id)
+        try:
+            fields = MenuItem.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        validators = entity_validators(MenuItem, id)
+        group = availability.group_of(id)
+        cached = not_modified(validators and merge_validators(
+            validators, availability_validators(group) if group is not None else None, thumbnail_validators()))
+        if cached is not None:
+            return cached
+        menu_item = MenuItem.serializer.project(MenuItem.query, fields).get(id)
         if not menu_item or (menu_item.deleted_at and not request.args.get('include_deleted', 'false').lower() == 'true'):
             return jsonify({"success": False, "error": "Menu item not found"}), 404
             
+        data = MenuItem.serializer(menu_item, fields)
+        if 'is_available' in data and availability.get(id) is not None:
+            data['is_available'] = availability.get(id)
+        apply_thumbnails([data])
         return jsonify({
             "success": True,
-            "data": menu_item.to_dict()
+            "data": data
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/menu-items/restaurant/<int:restaurant_id>', methods=['GET'])
 def get_restaurant_menu(restaurant_id):
-    """READ BY RESTAURANT - Get menu for specific restaurant"""
+    """READ BY RESTAURANT - Get menu for specific restaurant (?fields= selects menu item fields)
+
+    Active menus come from the menu document cache; ?include_deleted=true
+    reads straight from the database.
+    """
     try:
-        restaurant = Restaurant.query.get(restaurant_id)
-        if not restaurant or (restaurant.deleted_at and not request.args.get('include_deleted', 'false').lower() == 'true'):
-            return jsonify({"success": False, "error": "Restaurant not found"}), 404
-            
+        try:
+            fields = MenuItem.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         category = request.args.get('category')
         include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
+        if not include_deleted:
+            return cached_restaurant_menu(restaurant_id, fields, category)
+
+        restaurant = Restaurant.query.get(restaurant_id)
+        if not restaurant:
+            return jsonify({"success": False, "error": "Restaurant not found"}), 404
         
-        query = MenuItem.query.filter_by(restaurant_id=restaurant_id)
+        # Grouping reads category, so keep it in the projection
+        query = MenuItem.serializer.project(MenuItem.query, fields and fields + ['category']) \
+            .filter_by(restaurant_id=restaurant_id)
         
         if category:
             query = query.filter_by(category=category)
-        if not include_deleted:
-            query = query.filter_by(deleted_at=None)
             
+        cached = not_modified(merge_validators(entity_validators(Restaurant, restaurant_id),
+                                               list_validators(query, MenuItem)))
+        if cached is not None:
+            return cached
         menu_items = query.all()
         
         # Group by category
@@ -259,7 +1020,7 @@ def get_restaurant_menu(restaurant_id):
             cat = item.category or 'uncategorized'
             if cat not in menu_by_category:
                 menu_by_category[cat] = []
-            menu_by_category[cat].append(item.to_dict())
+            menu_by_category[cat].append(MenuItem.serializer(item, fields))
         
         return jsonify({
             "success": True,
@@ -270,6 +1031,58 @@ def get_restaurant_menu(restaurant_id):
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def menu_document(restaurant_id, version=None):
+    """Cache entry of a restaurant's menu with current availability (built on a miss), or None if it is gone"""
+    if version is None:
+        version = menu_cache.version(restaurant_id)
+    entry = menu_cache.get(restaurant_id, version)
+    if entry is None:
+        document = build_menu_document(restaurant_id, version)
+        if document is None:
+            return None
+        entry = menu_cache.put(restaurant_id, version, document)
+    elif entry.document.get('availability_version') != availability.version(restaurant_id) \
+            or not availability.loaded(restaurant_id):
+        # Items were toggled since the document was cached: re-render it, same menu version.
+        # Bitmaps are per worker, so the re-rendered copy stays out of the shared store
+        entry = menu_cache.put(restaurant_id, version, refresh_menu_availability(restaurant_id, entry.document),
+                               local_only=True)
+    return entry
+
+def cached_restaurant_menu(restaurant_id, fields, category):
+    """Menu served from the document cache; ?category= and ?fields= are applied to the cached document"""
+    version = menu_cache.version(restaurant_id)
+    if availability.version(restaurant_id) is not None:
+        load_availability(restaurant_id)  # A stale bitmap must not answer 304
+    availability_version = availability.version(restaurant_id)
+    cached = not_modified(merge_validators(
+        version_validators('menu', restaurant_id, version),
+        availability_version and version_validators('availability', restaurant_id, availability_version)
+    ))
+    if cached is not None:
+        return cached
+
+    entry = menu_document(restaurant_id, version)
+    if entry is None:
+        return jsonify({"success": False, "error": "Restaurant not found"}), 404
+
+    if not fields and not category:
+        return Response(entry.body, mimetype='application/json')  # Pre-encoded, no serialization
+
+    menu = entry.document['menu']
+    if category:
+        menu = {category: menu[category]} if category in menu else {}
+    if fields:
+        menu = {cat: [{f: item[f] for f in fields} for item in items] for cat, items in menu.items()}
+    return jsonify({
+        "success": True,
+        "restaurant": entry.document['restaurant'],
+        "menu": menu,
+        "total_items": sum(len(items) for items in menu.values()),
+        "version": version,
+        "availability_version": entry.document.get('availability_version')
+    })
+
 # ===== CREATE OPERATIONS =====
 @app.route('/api/menu-items', methods=['POST'])
 def create_menu_item():
@@ -296,22 +1109,22 @@ def create_menu_item():
             is_spicy=data.get('is_spicy', False),
             preparation_time=data.get('preparation_time'),
             calories=data.get('calories'),
-            allergens=data.get('allergens', []),
             is_active=data.get('is_active', True)
         )
-        
-        # Set allergens
-        if data.get('allergens'):
-            menu_item.set_allergens_list(data.get('allergens'))
+        menu_item.set_allergens_list(data.get('allergens'))
         
         db.session.add(menu_item)
         db.session.commit()
+        menu_items_changed([menu_item.id], menu_item.restaurant_id)
         
         return jsonify({
             "success": True, 
             "data": menu_item.to_dict(),
             "message": "Menu item created successfully"
         }), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
@@ -324,6 +1137,7 @@ def update_menu_item(id):
         menu_item = MenuItem.query.get(id)
         if not menu_item or menu_item.deleted_at:
             return jsonify({"success": False, "error": "Menu item not found"}), 404
+        previous_restaurant_id = menu_item.restaurant_id
             
         data = request.get_json()
         if not data:
@@ -363,12 +1177,16 @@ def update_menu_item(id):
             
         menu_item.updated_at = datetime.utcnow()
         db.session.commit()
+        menu_items_changed([menu_item.id], previous_restaurant_id, menu_item.restaurant_id)
         
         return jsonify({
             "success": True, 
             "data": menu_item.to_dict(),
             "message": "Menu item updated successfully"
         })
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
@@ -380,6 +1198,7 @@ def partial_update_menu_item(id):
         menu_item = MenuItem.query.get(id)
         if not menu_item or menu_item.deleted_at:
             return jsonify({"success": False, "error": "Menu item not found"}), 404
+        previous_restaurant_id = menu_item.restaurant_id
             
         data = request.get_json()
         if not data:
@@ -387,161 +1206,372 @@ def partial_update_menu_item(id):
         
         # Update only provided fields
         for field, value in data.items():
-            if hasattr(menu_item, field) and field not in ['id', 'created_at', 'updated_at']:
-                if field == 'allergens':
-                    menu_item.set_allergens_list(value)
-                else:
-                    setattr(menu_item, field, value)
+            if field == 'allergens':
+                menu_item.set_allergens_list(value)
+            elif hasattr(menu_item, field) and field not in ['id', 'created_at', 'updated_at', 'allergen_mask']:
+                setattr(menu_item, field, value)
                     
         menu_item.updated_at = datetime.utcnow()
         db.session.commit()
+        menu_items_changed([menu_item.id], previous_restaurant_id, menu_item.restaurant_id)
         
         return jsonify({
             "success": True, 
             "data": menu_item.to_dict(),
             "message": "Menu item updated successfully"
         })
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
-# ===== DELETE OPERATIONS =====
-@app.route('/api/menu-items/<int:id>/soft-delete', methods=['DELETE'])
-def soft_delete_menu_item(id):
-    """SOFT DELETE - Mark as deleted without removing from database"""
+# ===== DELETE / RESTORE / BULK OPERATIONS =====
+# Soft delete, hard delete, restore and set-based bulk delete / restore
+menu_item_crud = CrudEngine(db, MenuItem, label='Menu item', on_change=menu_items_changing)
+app.register_blueprint(menu_item_crud.blueprint('/api/menu-items', routes=(
+    'soft_delete', 'hard_delete', 'restore', 'bulk_delete', 'bulk_restore')))
+
+# ===== BATCH LOOKUP =====
+LOOKUP_MAX_IDS = 500
+LOOKUP_FIELDS = ('id', 'restaurant_id', 'name', 'price', 'is_available', 'is_active')
+
+@app.route('/api/menu-items/lookup', methods=['POST'])
+def lookup_menu_items():
+    """BATCH LOOKUP - Price and availability of many menu items: {"ids": [1, 2, 3]}
+
+    Served from the cached menu documents and availability bitmaps (no
+    query once a restaurant's menu is cached). Used by order-service to
+    price orders. Soft deleted or unknown ids are listed in not_found.
+    """
     try:
-        menu_item = MenuItem.query.get(id)
-        if not menu_item:
-            return jsonify({"success": False, "error": "Menu item not found"}), 404
-            
-        if menu_item.deleted_at:
-            return jsonify({"success": False, "error": "Menu item already deleted"}), 400
-            
-        menu_item.deleted_at = datetime.utcnow()
-        menu_item.is_active = False
-        menu_item.updated_at = datetime.utcnow()
-        db.session.commit()
-        
+        ids = (request.get_json(silent=True) or {}).get('ids')
+        if not isinstance(ids, list) or not ids or not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            return jsonify({"success": False, "error": "ids must be a non-empty list of integers"}), 400
+        if len(ids) > LOOKUP_MAX_IDS:
+            return jsonify({"success": False, "error": f"At most {LOOKUP_MAX_IDS} ids per lookup"}), 400
+        ids = list(dict.fromkeys(ids))
+
+        restaurant_of = {id: availability.group_of(id) for id in ids}
+        unknown = [id for id, restaurant_id in restaurant_of.items() if restaurant_id is None]
+        if unknown:
+            restaurant_of.update(db.session.query(MenuItem.id, MenuItem.restaurant_id)
+                                 .filter(MenuItem.id.in_(unknown), MenuItem.deleted_at.is_(None)))
+
+        found = {}
+        for restaurant_id in {r for r in restaurant_of.values() if r is not None}:
+            entry = menu_document(restaurant_id)
+            if entry is None:
+                continue
+            for items in entry.document['menu'].values():
+                for item in items:
+                    if restaurant_of.get(item['id']) == restaurant_id:
+                        found[item['id']] = {field: item[field] for field in LOOKUP_FIELDS}
+
         return jsonify({
             "success": True,
-            "data": menu_item.to_dict(),
-            "message": "Menu item soft deleted successfully"
+            "data": [found[id] for id in ids if id in found],
+            "not_found": [id for id in ids if id not in found]
         })
     except Exception as e:
-        db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/menu-items/<int:id>', methods=['DELETE'])
-def hard_delete_menu_item(id):
-    """HARD DELETE - Permanently remove from database"""
+# ===== AVAILABILITY (HOT TOGGLE) =====
+def _availability_value(data, key='is_available'):
+    value = (data or {}).get(key)
+    if not isinstance(value, bool):
+        raise ValueError(f"{key} must be true or false")
+    return value
+
+@app.route('/api/menu-items/<int:id>/availability', methods=['PUT'])
+def set_menu_item_availability(id):
+    """AVAILABILITY - Mark one menu item (un)available; written back in batches"""
     try:
-        menu_item = MenuItem.query.get(id)
-        if not menu_item:
-            return jsonify({"success": False, "error": "Menu item not found"}), 404
-            
-        db.session.delete(menu_item)
-        db.session.commit()
-        
+        try:
+            available = _availability_value(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        restaurant_id = availability.group_of(id)
+        if restaurant_id is None:
+            row = db.session.query(MenuItem.restaurant_id).filter_by(id=id, deleted_at=None).first()
+            if row is None:
+                return jsonify({"success": False, "error": "Menu item not found"}), 404
+            restaurant_id = row[0]
+        load_availability(restaurant_id)  # Reloads a stale bitmap so `changed` is accurate
+        changed = availability.set(id, available)
         return jsonify({
             "success": True,
-            "message": "Menu item permanently deleted"
+            "data": {"id": id, "restaurant_id": restaurant_id, "is_available": available},
+            "changed": changed
         })
     except Exception as e:
-        db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/menu-items/<int:id>/restore', methods=['POST'])
-def restore_menu_item(id):
-    """RESTORE - Restore soft deleted menu item"""
+@app.route('/api/restaurants/<int:id>/availability', methods=['GET'])
+def get_restaurant_availability(id):
+    """AVAILABILITY - Available and unavailable menu item ids of a restaurant"""
     try:
-        menu_item = MenuItem.query.get(id)
-        if not menu_item:
-            return jsonify({"success": False, "error": "Menu item not found"}), 404
-            
-        if not menu_item.deleted_at:
-            return jsonify({"success": False, "error": "Menu item is not deleted"}), 400
-            
-        menu_item.deleted_at = None
-        menu_item.is_active = True
-        menu_item.updated_at = datetime.utcnow()
-        db.session.commit()
-        
+        if not availability.loaded(id) and not db.session.get(Restaurant, id):
+            return jsonify({"success": False, "error": "Restaurant not found"}), 404
+        load_availability(id)
+        states = availability.states(id)
         return jsonify({
             "success": True,
-            "data": menu_item.to_dict(),
-            "message": "Menu item restored successfully"
+            "data": {
+                "available": [item for item, available in states.items() if available],
+                "unavailable": [item for item, available in states.items() if not available]
+            },
+            "version": availability.version(id)
         })
     except Exception as e:
-        db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
-# ===== BULK OPERATIONS =====
-@app.route('/api/menu-items/bulk-delete', methods=['DELETE'])
-def bulk_soft_delete_menu_items():
-    """BULK SOFT DELETE - Delete multiple menu items"""
+@app.route('/api/restaurants/<int:id>/availability', methods=['PUT'])
+def set_restaurant_availability(id):
+    """AVAILABILITY - Toggle many items of a restaurant: {"items": {"<item id>": true|false}}"""
     try:
-        data = request.get_json()
-        if not data or not data.get('ids'):
-            return jsonify({"success": False, "error": "IDs array is required"}), 400
-            
-        ids = data['ids']
-        menu_items = MenuItem.query.filter(MenuItem.id.in_(ids)).all()
-        
-        deleted_count = 0
-        for item in menu_items:
-            if not item.deleted_at:
-                item.deleted_at = datetime.utcnow()
-                item.is_active = False
-                item.updated_at = datetime.utcnow()
-                deleted_count += 1
-                
-        db.session.commit()
-        
+        items = (request.get_json(silent=True) or {}).get('items')
+        if not isinstance(items, dict) or not items:
+            return jsonify({"success": False, "error": "items must be an object of {menu item id: true|false}"}), 400
+        try:
+            changes = {int(item): _availability_value(items, item) for item in items}
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        if not availability.loaded(id) and not db.session.get(Restaurant, id):
+            return jsonify({"success": False, "error": "Restaurant not found"}), 404
+        load_availability(id)
+
+        changed, not_found = 0, []
+        for item, available in changes.items():
+            if availability.group_of(item) != id:
+                not_found.append(item)
+            elif availability.set(item, available):
+                changed += 1
         return jsonify({
             "success": True,
-            "message": f"{deleted_count} menu items soft deleted successfully",
-            "deleted_count": deleted_count
+            "changed": changed,
+            "not_found": not_found,
+            "version": availability.version(id)
         })
     except Exception as e:
-        db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/menu-items/bulk-restore', methods=['POST'])
-def bulk_restore_menu_items():
-    """BULK RESTORE - Restore multiple soft deleted menu items"""
+# ===== BULK IMPORT (UPSERT) =====
+BULK_CHUNK_SIZE = 500  # Rows per INSERT/UPDATE batch and commit
+
+def _import_bool(value):
+    if isinstance(value, bool):
+        return value
+    text_value = str(value).strip().lower()
+    if text_value in ('true', '1', 'yes', 'y'):
+        return True
+    if text_value in ('false', '0', 'no', 'n'):
+        return False
+    raise ValueError("must be true or false")
+
+def _import_allergens(value):
+    if isinstance(value, str):  # CSV cell: "nuts;dairy"
+        value = re.split(r'[;,]', value)
+    return _normalize_allergens(value)
+
+def _import_text(value):
+    return str(value).strip()
+
+# Import field -> (column, parser). Strings from CSV are parsed like JSON values.
+# Allergens stay names until import_menu_chunk turns them into allergen_mask.
+MENU_ITEM_IMPORT_FIELDS = {
+    'restaurant_id': ('restaurant_id', int),
+    'name': ('name', _import_text),
+    'description': ('description', _import_text),
+    'price': ('price', float),
+    'category': ('category', _import_text),
+    'image_url': ('image_url', _import_text),
+    'is_available': ('is_available', _import_bool),
+    'is_vegetarian': ('is_vegetarian', _import_bool),
+    'is_spicy': ('is_spicy', _import_bool),
+    'preparation_time': ('preparation_time', int),
+    'calories': ('calories', int),
+    'allergens': ('allergens', _import_allergens),
+    'is_active': ('is_active', _import_bool),
+}
+# Same defaults as POST /api/menu-items, so every INSERT in a batch has the same columns
+MENU_ITEM_INSERT_DEFAULTS = {
+    'description': '', 'category': None, 'image_url': None, 'is_available': True, 'is_vegetarian': False,
+    'is_spicy': False, 'preparation_time': None, 'calories': None, 'allergen_mask': 0, 'is_active': True,
+}
+
+def menu_item_import_values(record, default_restaurant_id=None):
+    """Column values of one import row (ValueError naming the bad field)"""
+    values = {}
+    for field, (column, parse) in MENU_ITEM_IMPORT_FIELDS.items():
+        if record.get(field) is None:
+            continue
+        try:
+            values[column] = parse(record[field])
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{field}: {e}")
+    values.setdefault('restaurant_id', default_restaurant_id)
+    if not values.get('name') or values['restaurant_id'] is None:
+        raise ValueError("Name and restaurant_id are required")
+    return values
+
+def import_menu_chunk(rows, restaurants):
+    """Upsert one batch of (row number, values) keyed on (restaurant_id, name).
+
+    restaurants caches {restaurant_id: exists} across the batches of a request.
+    Returns the per-row results.
+    """
+    unknown = {values['restaurant_id'] for _, values in rows} - restaurants.keys()
+    if unknown:
+        found = {id for (id,) in db.session.query(Restaurant.id).filter(Restaurant.id.in_(unknown))}
+        restaurants.update({id: id in found for id in unknown})
+
+    results, valid = [], []
+    for row, values in rows:
+        if restaurants[values['restaurant_id']]:
+            valid.append((row, values))
+        else:
+            results.append({"row": row, "status": "error", "error": "Restaurant not found"})
+    if not valid:
+        return results
+
+    keys = {(values['restaurant_id'], values['name']) for _, values in valid}
+    existing = {}
+    for id, restaurant_id, name in db.session.query(MenuItem.id, MenuItem.restaurant_id, MenuItem.name) \
+            .filter(tuple_(MenuItem.restaurant_id, MenuItem.name).in_(keys), MenuItem.deleted_at.is_(None)) \
+            .order_by(MenuItem.id.desc()):
+        existing[(restaurant_id, name)] = id  # Oldest row wins if duplicates already exist
+
+    now = datetime.utcnow()
+    inserts, updates = [], []
+    for row, values in valid:
+        id = existing.get((values['restaurant_id'], values['name']))
+        if id is None and 'price' not in values:
+            results.append({"row": row, "status": "error", "error": "price is required for a new menu item"})
+            continue
+        if 'allergens' in values:
+            # Registered in the transaction that writes the rows: a failed commit
+            # rolls the new allergens back together with the masks using them
+            values = dict(values)
+            try:
+                values['allergen_mask'] = allergen_mask(values.pop('allergens'), register=True)
+            except ValueError as e:
+                results.append({"row": row, "status": "error", "error": f"allergens: {e}"})
+                continue
+        if id is not None:
+            updates.append((row, dict(values, id=id, updated_at=now)))
+        else:
+            inserts.append((row, dict(MENU_ITEM_INSERT_DEFAULTS, **values, created_at=now, updated_at=now)))
+
     try:
-        data = request.get_json()
-        if not data or not data.get('ids'):
-            return jsonify({"success": False, "error": "IDs array is required"}), 400
-            
-        ids = data['ids']
-        menu_items = MenuItem.query.filter(MenuItem.id.in_(ids)).all()
-        
-        restored_count = 0
-        for item in menu_items:
-            if item.deleted_at:
-                item.deleted_at = None
-                item.is_active = True
-                item.updated_at = datetime.utcnow()
-                restored_count += 1
-                
+        if updates:
+            db.session.execute(update(MenuItem), [values for _, values in updates])
+        new_ids = {}
+        if inserts:
+            # Keys are unique within a batch, so RETURNING the key maps ids back to rows
+            # without forcing row-by-row ordered inserts
+            new_ids = {(restaurant_id, name): id for id, restaurant_id, name in db.session.execute(
+                insert(MenuItem).returning(MenuItem.id, MenuItem.restaurant_id, MenuItem.name),
+                [values for _, values in inserts])}
         db.session.commit()
-        
+    except Exception as e:
+        db.session.rollback()
+        return results + [{"row": row, "status": "error", "error": str(e)} for row, _ in updates + inserts]
+
+    results += [{"row": row, "status": "updated", "id": values['id']} for row, values in updates]
+    results += [{"row": row, "status": "created", "id": new_ids[(values['restaurant_id'], values['name'])]}
+                for row, values in inserts]
+    menu_items_changed([values['id'] for _, values in updates] + list(new_ids.values()),
+                       *{values['restaurant_id'] for _, values in updates + inserts})
+    return results
+
+@app.route('/api/menu-items/bulk', methods=['POST'])
+def bulk_import_menu_items():
+    """BULK UPSERT - Create or update menu items keyed on (restaurant_id, name).
+
+    Body: NDJSON or CSV (streamed, one item per line/row) or a JSON list.
+    ?restaurant_id= applies to rows without one; ?report=errors lists only failed rows.
+    """
+    try:
+        default_restaurant_id = request.args.get('restaurant_id', type=int)
+        errors_only = request.args.get('report') == 'errors'
+        try:
+            records = iter_records(request)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 415 if 'Content-Type' in str(e) else 400
+
+        results, restaurants = [], {}
+        summary = {"rows": 0, "created": 0, "updated": 0, "failed": 0}
+        pending, pending_keys = [], set()
+
+        def flush():
+            for result in import_menu_chunk(pending, restaurants):
+                summary['failed' if result['status'] == 'error' else result['status']] += 1
+                if not errors_only or result['status'] == 'error':
+                    results.append(result)
+            pending.clear()
+            pending_keys.clear()
+
+        for row, record, error in records:
+            summary["rows"] += 1
+            if error is None:
+                try:
+                    values = menu_item_import_values(record, default_restaurant_id)
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                summary["failed"] += 1
+                results.append({"row": row, "status": "error", "error": error})
+                continue
+            key = (values['restaurant_id'], values['name'])
+            if key in pending_keys or len(pending) >= BULK_CHUNK_SIZE:
+                flush()  # A repeated key in one batch becomes an update of the row just written
+            pending.append((row, values))
+            pending_keys.add(key)
+        if pending:
+            flush()
+
+        results.sort(key=lambda result: result['row'])
         return jsonify({
             "success": True,
-            "message": f"{restored_count} menu items restored successfully",
-            "restored_count": restored_count
+            "summary": summary,
+            "results": results,
+            "message": f"Imported {summary['created'] + summary['updated']} of {summary['rows']} menu items"
         })
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
 # ===== ADVANCED QUERIES =====
+FILTER_KEYS = ('restaurant_ids', 'categories', 'price_min', 'price_max', 'is_vegetarian', 'is_spicy',
+               'exclude_allergens', 'include_deleted')
+PRICE_BUCKETS = [20000, 50000, 100000]  # Facet edges in IDR: <20k, 20k-50k, 50k-100k, 100k+
+
+# Facet counts of the filtered set, cached per filter signature until a menu item changes
+menu_item_facets = FacetCounter(
+    group_by=('category', MenuItem.category),
+    flags={'is_vegetarian': MenuItem.is_vegetarian, 'is_spicy': MenuItem.is_spicy},
+    ranges={'price': (MenuItem.price, PRICE_BUCKETS)}
+)
+
 @app.route('/api/menu-items/filter', methods=['POST'])
 def filter_menu_items():
-    """ADVANCED FILTER - Filter menu items by multiple criteria"""
+    """ADVANCED FILTER - Filter menu items by multiple criteria (optional ?fields=)
+
+    Body options besides the filters:
+    - facets (default true): counts per category, is_vegetarian, is_spicy
+      and price bucket, computed in one aggregate query that also gives the
+      exact total
+    - exact_total (default true): with facets off, false skips counting and
+      derives has_next from fetching one extra row
+    """
     try:
         data = request.get_json() or {}
+        try:
+            fields = MenuItem.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
         
         query = MenuItem.query
         
@@ -558,35 +1588,90 @@ def filter_menu_items():
             query = query.filter(MenuItem.is_vegetarian == data['is_vegetarian'])
         if data.get('is_spicy') is not None:
             query = query.filter(MenuItem.is_spicy == data['is_spicy'])
+        if data.get('exclude_allergens'):
+            # Items containing none of the listed allergens - one bitwise AND in SQL
+            try:
+                excluded = allergen_mask(data['exclude_allergens'])
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+            if excluded:
+                query = query.filter(MenuItem.allergen_mask.bitwise_and(excluded) == 0)
         if data.get('include_deleted') is False:
             query = query.filter(MenuItem.deleted_at == None)
             
         # Pagination
-        page = data.get('page', 1)
-        per_page = data.get('per_page', 20)
-        
-        menu_items = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        try:
+            page = max(int(data.get('page', 1)), 1)
+            per_page = min(max(int(data.get('per_page', 20)), 1), 500)
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "error": "page and per_page must be integers"}), 400
+        want_facets = data.get('facets', True) is not False
+        exact_total = want_facets or data.get('exact_total', True) is not False
+
+        facets = None
+        if exact_total:
+            signature = json.dumps({k: data[k] for k in FILTER_KEYS if k in data}, sort_keys=True, default=str)
+            facets = menu_item_facets.counts(query, signature)
+
+        # One extra row tells whether there is a next page without counting
+        rows = MenuItem.serializer.project(query, fields).order_by(MenuItem.id) \
+            .limit(per_page + 1).offset((page - 1) * per_page).all()
+        menu_items = rows[:per_page]
+        total = facets["total"] if facets else None
         
-        return jsonify({
+        response = {
             "success": True,
-            "data": [item.to_dict() for item in menu_items.items],
+            "data": apply_thumbnails(apply_availability(MenuItem.serializer.many(menu_items, fields))),
             "pagination": {
                 "page": page,
                 "per_page": per_page,
-                "total": menu_items.total,
-                "pages": menu_items.pages,
-                "has_next": menu_items.has_next,
-                "has_prev": menu_items.has_prev
+                "total": total,
+                "pages": -(-total // per_page) if total is not None else None,
+                "has_next": len(rows) > per_page,
+                "has_prev": page > 1
             },
             "filters": data
-        })
+        }
+        if want_facets:
+            response["facets"] = {k: v for k, v in facets.items() if k != "total"}
+        return jsonify(response)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+# ========== EVENT BUS CONSUMERS ==========
+def handle_order_delivered(payload):
+    """order.delivered -> count the order in the restaurant's daily aggregates (idempotent)"""
+    with app.app_context():
+        restaurant_id = payload['restaurant_id']
+        delivered_at = payload.get('actual_delivery_time')
+        day = datetime.fromisoformat(delivered_at).date() if delivered_at else datetime.utcnow().date()
+        try:
+            db.session.add(CountedOrder(order_id=payload['order_id'], restaurant_id=restaurant_id))
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return  # Redelivered event
+
+        result = db.session.execute(
+            db.update(RestaurantDailyOrders).filter_by(restaurant_id=restaurant_id, day=day).values(
+                order_count=RestaurantDailyOrders.order_count + 1,
+                revenue=RestaurantDailyOrders.revenue + (payload.get('total_amount') or 0.0)
+            )
+        )
+        if result.rowcount == 0:
+            db.session.add(RestaurantDailyOrders(restaurant_id=restaurant_id, day=day, order_count=1,
+                                                 revenue=payload.get('total_amount') or 0.0))
+        db.session.commit()
+
+        if _leaderboards_day is not None and day >= orders_window_start(_leaderboards_day):
+            orders_leaderboard.increment(restaurant_id, 1)
+
+def start_event_workers():
+    """Consume order events from the event bus"""
+    EventBus().start_consumer('restaurant-service', {'order.delivered': handle_order_delivered})
+
+ensure_event_workers = start_workers_once(app, start_event_workers)
+
 if __name__ == '__main__':
     create_tables()
     PORT = 5002  # Restaurant Service
@@ -595,18 +1680,32 @@ if __name__ == '__main__':
     print(f"   Restaurants:")
     print(f"     GET  /api/restaurants              - Read all restaurants")
     print(f"     GET  /api/restaurants/<id>         - Read restaurant by ID")
-    print(f"     POST /api/restaurants              - Create restaurant")
+    print(f"     POST /api/restaurants              - Create restaurant (optional latitude/longitude)")
+    print(f"     PATCH /api/restaurants/<id>        - Update restaurant fields / set latitude+longitude")
+    print(f"     GET  /api/restaurants/nearby?lat=&lng=&radius= - Restaurants near a point, nearest first")
+    print(f"     GET  /api/restaurants/top?by=orders|rating - Top restaurants (maintained leaderboard)")
+    print(f"     POST /api/restaurants/<id>/ratings - Rate a restaurant (1-5)")
+    print(f"     GET/PUT /api/restaurants/<id>/availability - Menu availability bitmap (bulk toggle)")
+    print(f"   Images:")
+    print(f"     GET  /api/images/<file>            - Menu image thumbnails (immutable, cached 1 year)")
+    print(f"   Search:")
+    print(f"     GET  /api/search?q=                - Search restaurants & menu items")
     print(f"   Menu Items (Full CRUD):")
     print(f"     GET  /api/menu-items               - Read all menu items")
     print(f"     GET  /api/menu-items/<id>          - Read menu item by ID")
-    print(f"     GET  /api/menu-items/restaurant/<id> - Get restaurant menu")
+    print(f"     GET  /api/menu-items/restaurant/<id> - Get restaurant menu (cached, versioned)")
     print(f"     POST /api/menu-items               - Create menu item")
     print(f"     PUT  /api/menu-items/<id>          - Full update menu item")
     print(f"     PATCH/api/menu-items/<id>          - Partial update menu item")
+    print(f"     PUT  /api/menu-items/<id>/availability - Toggle availability (write-behind)")
     print(f"     DELETE /api/menu-items/<id>/soft-delete - Soft delete")
     print(f"     DELETE /api/menu-items/<id>        - Hard delete")
     print(f"     POST /api/menu-items/<id>/restore  - Restore")
     print(f"     DELETE /api/menu-items/bulk-delete - Bulk soft delete")
     print(f"     POST /api/menu-items/bulk-restore  - Bulk restore")
-    print(f"     POST /api/menu-items/filter        - Advanced filtering")
+    print(f"     POST /api/menu-items/bulk          - Bulk upsert (JSON, NDJSON or CSV)")
+    print(f"     POST /api/menu-items/lookup        - Batched price/availability lookup (cached)")
+    print(f"     POST /api/menu-items/filter        - Advanced filtering with facet counts")
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':  # Start now in the reloader's serving process
+        ensure_event_workers()
     app.run(host='127.0.0.1', port=PORT, debug=True)
\ No newline at end of file
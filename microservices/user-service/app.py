@@ -6,13 +6,22 @@ from datetime import datetime, timedelta
 import os
 import hashlib
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.db_config import configure_database
+from common.read_replica import RoutingSession, init_read_replica
+from common.serialization import FastJSONProvider, ModelSerializer, is_deleted
+from common.conditional import entity_validators, list_validators, not_modified
+from common.crud import CrudEngine
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///user_service.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_database(app, 'user_service')  # URI & pool options from env, SQLite WAL pragmas
+app.json = FastJSONProvider(app)  # orjson-backed jsonify
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'food-delivery-secret-key-change-in-production')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+init_read_replica(app, db, 'user_service')  # GET requests read from the replica
 
 # Initialize JWT Manager
 jwt = JWTManager(app)
@@ -66,21 +75,10 @@ class User(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)  # Soft delete timestamp
 
+    serializer = ModelSerializer(exclude=['password_hash'], extra={'is_deleted': is_deleted})
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'full_name': self.full_name,
-            'phone': self.phone,
-            'address': self.address,
-            'user_type': self.user_type,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return User.serializer.to_dict(self)
 
 class UserProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -93,19 +91,10 @@ class UserProfile(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)
 
+    serializer = ModelSerializer(extra={'is_deleted': is_deleted})
+
     def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'bio': self.bio,
-            'date_of_birth': self.date_of_birth.isoformat() if self.date_of_birth else None,
-            'preferences': self.preferences,
-            'avatar_url': self.avatar_url,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None,
-            'is_deleted': self.deleted_at is not None
-        }
+        return UserProfile.serializer.to_dict(self)
 
 def create_tables():
     with app.app_context():
@@ -261,12 +250,20 @@ def login():
 # ========== USER PROFILE ENDPOINTS ==========
 @app.route('/api/profiles', methods=['GET'])
 def get_all_profiles():
-    """READ ALL - Get all user profiles"""
+    """READ ALL - Get all user profiles (optional ?fields=)"""
     try:
-        profiles = UserProfile.query.filter_by(deleted_at=None).all()
+        try:
+            fields = UserProfile.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        query = UserProfile.serializer.project(UserProfile.query, fields).filter_by(deleted_at=None)
+        cached = not_modified(list_validators(query, UserProfile))
+        if cached is not None:
+            return cached
+        profiles = query.all()
         return jsonify({
             "success": True,
-            "data": [p.to_dict() for p in profiles],
+            "data": UserProfile.serializer.many(profiles, fields),
             "count": len(profiles)
         })
     except Exception as e:
@@ -274,15 +271,22 @@ def get_all_profiles():
 
 @app.route('/api/profiles/<int:id>', methods=['GET'])
 def get_profile(id):
-    """READ PROFILE - Get single user profile"""
+    """READ PROFILE - Get single user profile (optional ?fields=)"""
     try:
-        profile = UserProfile.query.get(id)
+        try:
+            fields = UserProfile.serializer.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        cached = not_modified(entity_validators(UserProfile, id))
+        if cached is not None:
+            return cached
+        profile = UserProfile.serializer.project(UserProfile.query, fields).get(id)
         if not profile or profile.deleted_at:
             return jsonify({"success": False, "error": "Profile not found"}), 404
             
         return jsonify({
             "success": True,
-            "data": profile.to_dict()
+            "data": UserProfile.serializer(profile, fields)
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -325,21 +329,28 @@ def create_profile():
 
 @ns.route('/')
 class UserList(Resource):
-    @ns.doc('list_users')
+    @ns.doc('list_users', params={'fields': 'Comma-separated fields to return, e.g. id,username,email'})
     def get(self):
         """READ ALL - Get all users"""
         try:
+            try:
+                fields = User.serializer.parse_fields(request.args.get('fields'))
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
             include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
 
-            if include_deleted:
-                users = User.query.all()
-            else:
-                users = User.query.filter_by(deleted_at=None).all()
+            query = User.serializer.project(User.query, fields)
+            if not include_deleted:
+                query = query.filter_by(deleted_at=None)
+            cached = not_modified(list_validators(query, User))
+            if cached is not None:
+                return cached
+            users = query.all()
 
             # Return proper JSON response with serialized data
             return jsonify({
                 "success": True,
-                "data": [u.to_dict() for u in users],
+                "data": User.serializer.many(users, fields),
                 "count": len(users)
             })
         except Exception as e:
@@ -388,11 +399,18 @@ class UserList(Resource):
 
 @ns.route('/<int:id>')
 class UserDetail(Resource):
-    @ns.doc('get_user')
+    @ns.doc('get_user', params={'fields': 'Comma-separated fields to return'})
     def get(self, id):
         """READ BY ID - Get single user"""
         try:
-            user = User.query.get(id)
+            try:
+                fields = User.serializer.parse_fields(request.args.get('fields'))
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+            cached = not_modified(entity_validators(User, id))
+            if cached is not None:
+                return cached
+            user = User.serializer.project(User.query, fields).get(id)
             if not user:
                 return jsonify({"success": False, "error": f"User {id} not found"}), 404
 
@@ -401,7 +419,7 @@ class UserDetail(Resource):
 
             return jsonify({
                 "success": True,
-                "data": user.to_dict()
+                "data": User.serializer(user, fields)
             })
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
@@ -515,6 +533,9 @@ class UserRestore(Resource):
             db.session.rollback()
             api.abort(500, f"Error restoring user: {str(e)}")
 
+# Set-based bulk soft delete / restore from common.crud
+user_crud = CrudEngine(db, User, label='User')
+
 @ns.route('/bulk-delete')
 class UserBulkDelete(Resource):
     @ns.doc('bulk_soft_delete_users')
@@ -525,17 +546,7 @@ class UserBulkDelete(Resource):
             if not data or not data.get('ids'):
                 api.abort(400, "IDs array is required")
 
-            ids = data['ids']
-            users = User.query.filter(User.id.in_(ids)).all()
-
-            deleted_count = 0
-            for user in users:
-                if not user.deleted_at:
-                    user.deleted_at = datetime.utcnow()
-                    user.is_active = False
-                    user.updated_at = datetime.utcnow()
-                    deleted_count += 1
-
+            deleted_count = user_crud.bulk_soft_delete(data['ids'])  # Single UPDATE
             db.session.commit()
 
             return {
@@ -556,17 +567,7 @@ class UserBulkRestore(Resource):
             if not data or not data.get('ids'):
                 api.abort(400, "IDs array is required")
 
-            ids = data['ids']
-            users = User.query.filter(User.id.in_(ids)).all()
-
-            restored_count = 0
-            for user in users:
-                if user.deleted_at:
-                    user.deleted_at = None
-                    user.is_active = True
-                    user.updated_at = datetime.utcnow()
-                    restored_count += 1
-
+            restored_count = user_crud.bulk_restore(data['ids'])  # Single UPDATE
             db.session.commit()
 
             return {
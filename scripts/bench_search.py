@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GET /api/search restaurant-service (100k menu item)
+
+Mengisi katalog sintetis, membangun search index, lalu mengukur latensi
+p50/p99 SearchIndex.search() (tanpa cache hasil) dan endpoint
+/api/search (dengan cache hasil) untuk campuran query kata utuh, prefix
+dan multi-kata.
+
+Usage: python scripts/bench_search.py [--items 100000] [--restaurants 500] [--repeat 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIR = os.path.join(ROOT, 'microservices', 'restaurant-service')
+
+WORDS = ['nasi', 'goreng', 'ayam', 'bakar', 'sate', 'soto', 'mie', 'bakso', 'rendang', 'gado', 'es', 'teh',
+         'jeruk', 'kopi', 'susu', 'coklat', 'keju', 'pedas', 'manis', 'spesial', 'sapi', 'kambing', 'ikan',
+         'udang', 'cumi', 'tahu', 'tempe', 'sayur', 'bebek', 'kerupuk', 'chicken', 'cheese', 'burger', 'pizza',
+         'pasta', 'salad', 'soup', 'rice', 'noodle', 'beef', 'fish', 'shrimp', 'spicy', 'sweet', 'grilled']
+CATEGORIES = ['main', 'drink', 'dessert', 'appetizer', 'snack']
+QUERIES = ['nasi', 'nasi goreng', 'nasi gor', 'ay', 'ayam ba', 'es teh', 'sate kambing', 'ch', 'chicken cheese',
+           'mie bakso pedas', 'rendang', 'kop', 'spesial', 'warung', 'zzz']
+
+
+def load_restaurant_service(workdir):
+    os.environ['RESTAURANT_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['EVENT_BUS_PATH'] = os.path.join(workdir, 'bus.db')
+    os.environ['DB_READ_REPLICA'] = 'false'
+    sys.path.insert(0, SERVICE_DIR)
+    import app as restaurant_service
+    return restaurant_service
+
+
+def seed(restaurant_service, items, restaurants):
+    Restaurant, MenuItem, db = restaurant_service.Restaurant, restaurant_service.MenuItem, restaurant_service.db
+    rng = random.Random(42)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnoprstu') for _ in range(rng.randint(4, 9))) for _ in range(20000)]
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(Restaurant, [{
+        'name': f"Warung {' '.join(rng.sample(WORDS, 2)).title()} {i}",
+        'description': ' '.join(rng.choices(WORDS + vocabulary, k=8)),
+        'created_at': now, 'updated_at': now
+    } for i in range(restaurants)])
+    db.session.bulk_insert_mappings(MenuItem, [{
+        'restaurant_id': i % restaurants + 1,
+        'name': f"{' '.join(rng.sample(WORDS, 3)).title()} {rng.choice(vocabulary)}",
+        'description': ' '.join(rng.choices(WORDS * 20 + vocabulary, k=10)),
+        'category': rng.choice(CATEGORIES),
+        'price': 10000.0 + i % 100 * 500,
+        'created_at': now, 'updated_at': now
+    } for i in range(items)])
+    db.session.commit()
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--restaurants', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-search-')
+    restaurant_service = load_restaurant_service(workdir)
+    app, index = restaurant_service.app, restaurant_service.search_index
+
+    with app.app_context():
+        restaurant_service.db.create_all()
+        seed(restaurant_service, args.items, args.restaurants)
+        start = time.perf_counter()
+        documents = restaurant_service.build_search_index()
+        print(f"Indexed {documents} documents ({len(index.terms)} terms) in {time.perf_counter() - start:.1f} s")
+
+    uncached = []
+    print(f"{'query':20s} {'hits':>5s} {'p50 ms':>8s} {'p99 ms':>8s}")
+    for query in QUERIES:
+        index.search(query)  # Warm the per-term ranking cache
+        timings = []
+        for _ in range(args.repeat):
+            index.generation += 1  # Defeat the result cache
+            start = time.perf_counter()
+            hits = index.search(query)
+            timings.append(time.perf_counter() - start)
+        uncached += timings
+        p50, p99 = percentiles(timings)
+        print(f"{query:20s} {len(hits):5d} {p50:8.2f} {p99:8.2f}")
+
+    client = app.test_client()
+    endpoint = []
+    for query in QUERIES * args.repeat:
+        start = time.perf_counter()
+        client.get('/api/search', query_string={'q': query})
+        endpoint.append(time.perf_counter() - start)
+
+    print("SearchIndex.search (uncached)  p50 %.2f ms  p99 %.2f ms" % percentiles(uncached))
+    print("GET /api/search (result cache) p50 %.2f ms  p99 %.2f ms" % percentiles(endpoint))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serialisasi list endpoint (10k orders)
+
+Membandingkan jalur lama (Order.to_dict() per row + json stdlib Flask)
+dengan jalur baru (ModelSerializer + FastJSONProvider/orjson), dan
+memastikan hasil JSON keduanya identik.
+
+Usage: python scripts/bench_serialization.py [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIR = os.path.join(ROOT, 'microservices', 'order-service')
+
+
+def legacy_order_to_dict(order):
+    """Order.to_dict() as it was before common.serialization"""
+    return {
+        'id': order.id,
+        'user_id': order.user_id,
+        'restaurant_id': order.restaurant_id,
+        'order_number': order.order_number,
+        'status': order.status,
+        'total_amount': order.total_amount,
+        'delivery_address': order.delivery_address,
+        'delivery_fee': order.delivery_fee,
+        'special_instructions': order.special_instructions,
+        'estimated_delivery_time': order.estimated_delivery_time.isoformat() if order.estimated_delivery_time else None,
+        'actual_delivery_time': order.actual_delivery_time.isoformat() if order.actual_delivery_time else None,
+        'is_active': order.is_active,
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+        'deleted_at': order.deleted_at.isoformat() if order.deleted_at else None,
+        'is_deleted': order.deleted_at is not None
+    }
+
+
+def load_order_service(workdir):
+    os.environ['ORDER_SERVICE_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['EVENT_BUS_PATH'] = os.path.join(workdir, 'bus.db')
+    os.environ['DB_READ_REPLICA'] = 'false'
+    sys.path.insert(0, SERVICE_DIR)
+    import app as order_service
+    return order_service
+
+
+def seed(order_service, rows):
+    Order, db = order_service.Order, order_service.db
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(Order, [{
+        'user_id': i % 100 + 1,
+        'restaurant_id': i % 20 + 1,
+        'order_number': f'BENCH-{i:06d}',
+        'status': 'delivered' if i % 3 else 'pending',
+        'total_amount': 25000.0 + i,
+        'delivery_address': f'Jl. Benchmark No. {i}',
+        'delivery_fee': 5000.0,
+        'special_instructions': None,
+        'estimated_delivery_time': now + timedelta(minutes=30),
+        'actual_delivery_time': now + timedelta(minutes=35) if i % 3 else None,
+        'created_at': now - timedelta(minutes=i),
+        'updated_at': now,
+    } for i in range(rows)])
+    db.session.commit()
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-serialization-')
+    order_service = load_order_service(workdir)
+    app, Order = order_service.app, order_service.Order
+    from flask.json.provider import DefaultJSONProvider
+    from common import serialization
+
+    with app.app_context():
+        order_service.db.create_all()
+        seed(order_service, args.rows)
+        orders = Order.query.order_by(Order.id).all()
+
+        legacy_json = DefaultJSONProvider(app)
+        fast_json = app.json
+
+        paths = {
+            'legacy   to_dict + stdlib json': lambda: legacy_json.dumps({"data": [legacy_order_to_dict(o) for o in orders]}),
+            'new      to_dict + stdlib json': lambda: legacy_json.dumps({"data": [o.to_dict() for o in orders]}),
+            'new      serializer.many + jsonify': lambda: fast_json.dumps({"data": Order.serializer.many(orders)}),
+        }
+
+        print(f"Serializing {len(orders)} orders, best of {args.repeat} "
+              f"(orjson {'available' if serialization.orjson else 'NOT installed - stdlib fallback'})")
+        results, baseline = {}, None
+        for name, fn in paths.items():
+            seconds, body = best_of(args.repeat, fn)
+            results[name] = body
+            baseline = baseline or seconds
+            print(f"  {name:36s} {seconds * 1000:8.1f} ms  {len(orders) / seconds:>10,.0f} rows/s  x{baseline / seconds:.2f}")
+
+        decoded = [json.loads(body) for body in results.values()]
+        if any(d != decoded[0] for d in decoded[1:]):
+            print("❌ Output differs between serialization paths")
+            return 1
+        print("✅ All paths produce identical JSON documents")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Query budget check: restaurant-service menu endpoints
+
+Mengisi 500 menu item dari 50 restoran lalu memastikan setiap endpoint
+list menu dijalankan dengan jumlah query SQL yang tetap (tanpa N+1
+lazy load restaurant per item).
+
+Usage: python scripts/check_query_counts.py [--items 500] [--restaurants 50]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIR = os.path.join(ROOT, 'microservices', 'restaurant-service')
+
+# (method, url, json body, max queries)
+BUDGETS = [
+    ('GET', '/api/menu-items', None, 2),
+    ('GET', '/api/menu-items?fields=name,restaurant_name', None, 2),
+    ('GET', '/api/menu-items?restaurant_id=1', None, 2),
+    ('POST', '/api/menu-items/filter', {'per_page': 500}, 2),
+    ('POST', '/api/menu-items/filter?fields=restaurant_name', {'per_page': 500, 'price_max': 50000}, 2),
+    ('POST', '/api/menu-items/filter', {'per_page': 50, 'facets': False, 'exact_total': False}, 1),
+    ('GET', '/api/menu-items/restaurant/1?include_deleted=true', None, 4),
+    ('GET', '/api/menu-items/restaurant/2', None, 2),
+]
+
+
+def load_restaurant_service(workdir):
+    os.environ['RESTAURANT_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'check.db')}"
+    os.environ['EVENT_BUS_PATH'] = os.path.join(workdir, 'bus.db')
+    os.environ['DB_READ_REPLICA'] = 'false'
+    os.environ['EVENT_WORKERS'] = 'false'
+    sys.path.insert(0, SERVICE_DIR)
+    import app as restaurant_service
+    return restaurant_service
+
+
+def seed(restaurant_service, items, restaurants):
+    Restaurant, MenuItem, db = restaurant_service.Restaurant, restaurant_service.MenuItem, restaurant_service.db
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(Restaurant, [{
+        'name': f'Restaurant {i}', 'rating': 4.0, 'created_at': now, 'updated_at': now
+    } for i in range(restaurants)])
+    db.session.bulk_insert_mappings(MenuItem, [{
+        'restaurant_id': i % restaurants + 1,
+        'name': f'Menu {i}',
+        'price': 10000.0 + i * 100,
+        'category': ('main', 'drink', 'dessert')[i % 3],
+        'created_at': now,
+        'updated_at': now,
+    } for i in range(items)])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--restaurants', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='check-query-counts-')
+    restaurant_service = load_restaurant_service(workdir)
+    from common.query_counter import count_queries
+
+    app, db = restaurant_service.app, restaurant_service.db
+    with app.app_context():
+        db.create_all()
+        seed(restaurant_service, args.items, args.restaurants)
+        engine = db.engine
+
+    client = app.test_client()
+    failed = 0
+    for method, url, body, limit in BUDGETS:
+        with count_queries(engine) as queries:
+            response = client.open(url, method=method, json=body)
+        ok = response.status_code == 200 and len(queries) <= limit
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {method:4s} {url:60s} {len(queries):3d} queries (max {limit})  HTTP {response.status_code}")
+        if not ok:
+            print(queries)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())